@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""Replay an IMU capture through the ``mpu9250`` extension and measure the orientation updates
+
+The extension answers the sensor reads from a capture file instead of the I2C bus, so the driver and the Mahony filter
+of ``mpu9250.getData`` run as on the Raspberry, anywhere. The sensor times are the recorded ones, so the orientation
+after a given number of updates is the same on every run, and its checksum tells a change of the results apart from a
+change of the speed.
+
+The capture is recorded on the Raspberry with ``--record``, or synthesized: a sensor turning slowly about every axis,
+with noise. The capture format is described in ``Position/MPU9250/ReplayBus.h``.
+
+Example:
+    python3 Benchmarks/imu_replay_benchmark.py --record imu.capture --seconds 60  # On the Raspberry
+    python3 Benchmarks/imu_replay_benchmark.py --input imu.capture --samples 100000
+"""
+
+import os
+import sys
+import math
+import time
+import random
+import struct
+import hashlib
+import argparse
+import tempfile
+
+_CAPTURE_HEADER = struct.Struct('<4sHH')  # Magic, version and reserved
+_CAPTURE_RECORD = struct.Struct('<QBBBB')  # Nanoseconds, kind, device, register and count
+_CAPTURE_VERSION = 1
+_READ = 0
+
+# Addresses and registers read by the driver, from MPU9250.h and MPU9250_Constants.h
+_MPU9250 = 0x68
+_AK8963 = 0x0C
+_GYRO_CONFIG = 0x1B
+_ACCEL_CONFIG = 0x1C
+_ACCEL_CONFIG2 = 0x1D
+_INT_STATUS = 0x3A
+_ACCEL_XOUT_H = 0x3B
+_AK8963_ST1 = 0x02
+_AK8963_ASAX = 0x10
+
+_ACCEL_LSB = 16384.0  # Counts per g at 2 g
+_GYRO_LSB = 131.0  # Counts per degree/s at 250 degrees/s
+_MAG_LSB = 32760.0 / 49120.0  # Counts per milliGauss at 16 bits
+
+
+def _counts(value: float):
+    return max(-32768, min(32767, int(round(value))))
+
+
+def synthesize_capture(path: str, seconds: float, rate: float = 200.0, seed: int = 1):
+    """Write the capture of a sensor initialized and then read by ``getData`` at a fixed rate
+
+    Returns:
+        int: The number of ``getData`` updates in the capture
+    """
+    rng = random.Random(seed)
+    count = int(seconds * rate)
+    with open(path, 'wb') as capture:
+        capture.write(_CAPTURE_HEADER.pack(b'MPUC', _CAPTURE_VERSION, 0))
+
+        def read(nanoseconds, device, register, data):
+            capture.write(_CAPTURE_RECORD.pack(nanoseconds, _READ, device, register, len(data)) + data)
+
+        # Reads of initMPU9250 and initAK8963, the full scales at their lowest and no sensitivity adjustment
+        for register in (_GYRO_CONFIG, _ACCEL_CONFIG, _ACCEL_CONFIG2):
+            read(0, _MPU9250, register, b'\x00')
+        read(0, _AK8963, _AK8963_ASAX, b'\x80\x80\x80')
+
+        for index in range(count):
+            nanoseconds = int(index * 1e9 / rate)
+            angle = 2.0 * math.pi * index / (rate * 20.0)  # A turn every 20 seconds
+            accel = (0.05 * math.sin(angle), 0.05 * math.cos(angle), 1.0)
+            gyro = (17.0 * math.cos(angle), -17.0 * math.sin(angle), 6.0)
+            mag = (200.0 * math.cos(angle), 200.0 * math.sin(angle), -400.0)
+            motion = [_counts((value + rng.gauss(0.0, 0.01)) * _ACCEL_LSB) for value in accel]
+            motion.append(_counts(rng.gauss(0.0, 50.0)))  # Temperature
+            motion += [_counts((value + rng.gauss(0.0, 1.0)) * _GYRO_LSB) for value in gyro]
+            magnetic = [_counts((value + rng.gauss(0.0, 5.0)) * _MAG_LSB) for value in mag]
+
+            read(nanoseconds, _MPU9250, _INT_STATUS, b'\x01')  # Data ready
+            read(nanoseconds, _MPU9250, _ACCEL_XOUT_H, struct.pack('>7h', *motion))
+            read(nanoseconds, _AK8963, _AK8963_ST1, struct.pack('<B3hB', 0x01, *magnetic, 0x10))
+    return count
+
+
+def record(mpu9250, path: str, seconds: float):
+    """Record a session of the sensor: its initialization and ``getData`` for the given time"""
+    mpu9250.startRecording(path)
+    try:
+        _initialize(mpu9250)
+        updates = 0
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            mpu9250.getData()
+            updates += 1
+    finally:
+        transfers = mpu9250.stopRecording()
+    print("Recorded %d updates, %d transfers, into %s" % (updates, transfers, path))
+
+
+def _initialize(mpu9250):
+    mpu9250.initMPU9250()
+    mpu9250.initAK8963()
+    mpu9250.getAres()
+    mpu9250.getGres()
+    mpu9250.getMres()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IMU capture replay benchmark")
+    parser.add_argument("--input", help="Capture to replay, instead of a synthetic one")
+    parser.add_argument("--record", help="Record a capture from the sensor into this file, then exit")
+    parser.add_argument("--seconds", type=float, default=60.0, help="Length of the recorded or synthetic capture")
+    parser.add_argument("--samples", type=int, default=50000, help="Number of getData updates to replay")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="Replay at this multiple of the recorded pace, 0 for as fast as possible")
+    args = parser.parse_args()
+
+    try:
+        import mpu9250
+    except ImportError:
+        sys.exit("The mpu9250 extension is not built, see Position/setup.py")
+
+    if args.record:
+        record(mpu9250, args.record, args.seconds)
+        return
+
+    path = args.input
+    if path is None:
+        temp_dir = tempfile.TemporaryDirectory()
+        path = os.path.join(temp_dir.name, "synthetic.capture")
+        updates = synthesize_capture(path, args.seconds)
+        print("Synthetic capture of %d updates, %d bytes" % (updates, os.path.getsize(path)))
+
+    mpu9250.openReplay(path, args.speed, True)  # Looped, so any number of updates can be replayed
+    try:
+        _initialize(mpu9250)
+        checksum = hashlib.sha1()
+        start = time.perf_counter()
+        for _ in range(args.samples):
+            checksum.update(struct.pack('<13d', *mpu9250.getData()))
+        elapsed = time.perf_counter() - start
+        orientation = mpu9250.getData()[:3]
+        _, reads, loops = mpu9250.captureStats()
+    finally:
+        mpu9250.closeReplay()
+
+    print("getData   %12.0f updates/s %9.3f us/update" % (args.samples / elapsed, elapsed * 1e6 / args.samples))
+    print("Replayed %d reads, %d loops of the capture" % (reads, loops))
+    print("Final yaw %.4f, pitch %.4f, roll %.4f, checksum %s" % (orientation + (checksum.hexdigest()[:16],)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""Measure the throughput of the Madgwick and Mahony filter implementations
+
+Runs every available implementation over the same IMU stream and prints the samples per second and the largest
+difference of the quaternions from the pure Python reference, which should be zero:
+
+- ``python``: :class:`Position.QuaternionFilters.QuaternionFilter`, one call per sample
+- ``numpy``: :class:`Position.QuaternionFilters.FilterArray`, many filters updated together
+- ``c-module``: the module functions of the ``quaternion`` extension, one call per sample
+- ``c-filter``: ``quaternion.Filter.update``, one call per sample
+- ``c-batch``: ``quaternion.Filter.updateBatch``, one call for the whole stream
+
+The stream is synthetic, or read from a CSV file with the columns of the ``mpu9250`` sample buffers: timestamp,
+ax, ay, az, gx, gy, gz in degrees per second, mx, my, mz and temperature. The recorded samples are fed to the filters
+the way ``mpu9250.getData`` does.
+
+Example:
+    python3 Benchmarks/quaternion_benchmark.py --method madgwick --samples 50000
+"""
+
+import os
+import sys
+import csv
+import math
+import time
+import array
+import random
+import argparse
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # noqa
+
+# pylint: disable=wrong-import-position
+
+from Position import QuaternionFilters
+
+# pylint: disable=wrong-import-position
+
+_DEG_TO_RAD = 0.0174532925  # The constant of the mpu9250 extension
+
+
+def synthetic_stream(count: int, rate: float = 200.0, seed: int = 1):
+    """A sensor turning slowly about every axis, with noise
+
+    Returns:
+        tuple: List of the samples, as lists of ax, ay, az, gx, gy, gz, mx, my, mz, and list of the intervals
+    """
+    rng = random.Random(seed)
+    samples = []
+    for index in range(count):
+        angle = 2.0 * math.pi * index / (rate * 20.0)  # A turn every 20 seconds
+        samples.append([
+            0.05 * math.sin(angle) + rng.gauss(0.0, 0.01),
+            0.05 * math.cos(angle) + rng.gauss(0.0, 0.01),
+            1.0 + rng.gauss(0.0, 0.01),
+            0.3 * math.cos(angle) + rng.gauss(0.0, 0.02),
+            -0.3 * math.sin(angle) + rng.gauss(0.0, 0.02),
+            0.1 + rng.gauss(0.0, 0.02),
+            200.0 * math.cos(angle) + rng.gauss(0.0, 5.0),
+            200.0 * math.sin(angle) + rng.gauss(0.0, 5.0),
+            -400.0 + rng.gauss(0.0, 5.0),
+        ])
+    return samples, [1.0 / rate] * count
+
+
+def recorded_stream(path: str, count: int):
+    """Samples of a CSV file, converted as ``mpu9250.getData`` converts them
+
+    Returns:
+        tuple: List of the samples and list of the intervals, at most count of them
+    """
+    samples = []
+    intervals = []
+    last = None
+    with open(path, newline='') as csv_file:
+        for row in csv.reader(csv_file):
+            try:
+                values = [float(value) for value in row]
+            except ValueError:
+                continue  # Header or comment
+            if len(values) < 10:
+                continue
+            timestamp, ax, ay, az, gx, gy, gz, mx, my, mz = values[:10]
+            if last is not None:
+                samples.append([ax, ay, az, gx * _DEG_TO_RAD, gy * _DEG_TO_RAD, gz * _DEG_TO_RAD, my, mx, mz])
+                intervals.append(timestamp - last)
+                if len(samples) == count:
+                    break
+            last = timestamp
+    return samples, intervals
+
+
+def _measure(name: str, count: int, run, reference):
+    """Time a run and compare its last quaternions with the reference ones"""
+    start = time.perf_counter()
+    result = run()
+    elapsed = time.perf_counter() - start
+    deviation = max(abs(value - expected) for quaternion, expected_quaternion in zip(result, reference)
+                    for value, expected in zip(quaternion, expected_quaternion))
+    print("%-9s %12.0f samples/s %9.3f us/sample  max deviation %.3g" % (name, count / elapsed,
+                                                                          elapsed * 1e6 / count, deviation))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Madgwick and Mahony filter throughput benchmark")
+    parser.add_argument("--method", choices=QuaternionFilters.METHODS, default="mahony", help="Filter method")
+    parser.add_argument("--samples", type=int, default=20000, help="Number of samples in the stream")
+    parser.add_argument("--filters", type=int, default=64, help="Number of filters updated together by NumPy")
+    parser.add_argument("--input", help="CSV file of recorded samples, instead of the synthetic stream")
+    args = parser.parse_args()
+
+    if args.input:
+        samples, intervals = recorded_stream(args.input, args.samples)
+    else:
+        samples, intervals = synthetic_stream(args.samples)
+    count = len(samples)
+    tail = slice(max(0, count - 10), count)  # Quaternions compared with the reference
+    print("%s filter, %d samples" % (args.method, count))
+
+    reference_filter = QuaternionFilters.QuaternionFilter(args.method)
+    reference = [reference_filter.update(*sample, deltat) for sample, deltat in zip(samples, intervals)][tail]
+
+    def python():
+        python_filter = QuaternionFilters.QuaternionFilter(args.method)
+        return [python_filter.update(*sample, deltat) for sample, deltat in zip(samples, intervals)][tail]
+    _measure("python", count, python, reference)
+
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+        print("numpy     skipped, NumPy is not installed")
+    if numpy is not None:
+        stacked = numpy.repeat(numpy.asarray(samples)[:, None, :], args.filters, axis=1)  # The same stream per filter
+
+        def numpy_filters():
+            filter_array = QuaternionFilters.FilterArray(args.filters, args.method)
+            results = [filter_array.update(stacked[index], deltat)[-1] for index, deltat in enumerate(intervals)]
+            return results[tail]
+        _measure("numpy", count * args.filters, numpy_filters, reference)
+
+    try:
+        import quaternion
+    except ImportError:
+        print("c-*       skipped, the quaternion extension is not built")
+        return
+
+    def c_module():
+        # The module functions share one state, which starts at the initial quaternion, so they are only run once
+        update = quaternion.madgwickQuaternion if args.method == "madgwick" else quaternion.mahonyQuaternion
+        return [update(*sample, deltat) for sample, deltat in zip(samples, intervals)][tail]
+    _measure("c-module", count, c_module, reference)
+
+    def c_filter():
+        c_object = quaternion.Filter(args.method)
+        return [c_object.update(*sample, deltat) for sample, deltat in zip(samples, intervals)][tail]
+    _measure("c-filter", count, c_filter, reference)
+
+    # The batch takes 2 dimensional arrays, so the flat arrays are viewed as N x 9 and N x 4
+    sample_values = array.array('d', (value for sample in samples for value in sample))
+    flat = memoryview(sample_values).cast('B').cast('d', (count, 9))
+    dt = array.array('d', intervals)
+    out_values = array.array('d', bytes(8 * 4 * count))
+    out = memoryview(out_values).cast('B').cast('d', (count, 4))
+
+    def c_batch():
+        quaternion.Filter(args.method).updateBatch(flat, dt, out)
+        return [tuple(out_values[4 * index:4 * index + 4]) for index in range(tail.start, tail.stop)]
+    _measure("c-batch", count, c_batch, reference)
+
+
+if __name__ == '__main__':
+    main()
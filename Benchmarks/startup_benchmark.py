@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""Measure the startup time of the controller with the simulated GPIO backend
+
+Starts the controller in a temporary directory with default settings, apart from the simulated GPIO backend and a
+free local port, and measures from the process start:
+
+- the time to listen, until the server accepts a connection
+- the time to ready, until ``STARTUP_STATUS`` reports every startup stage finished
+
+Each run starts a new process, so the results include the interpreter start and the imports, as after a power cut.
+
+Example:
+    python3 Benchmarks/startup_benchmark.py --runtime asyncio --runs 10
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import tempfile
+import subprocess
+import statistics
+_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(_ROOT)  # noqa
+
+# pylint: disable=wrong-import-position
+
+from Core.Configuration import DefaultData
+
+# pylint: disable=wrong-import-position
+
+_LOG_CONFIG = """[loggers]
+keys=root
+
+[handlers]
+keys=file
+
+[formatters]
+keys=plain
+
+[logger_root]
+level=INFO
+handlers=file
+
+[handler_file]
+class=FileHandler
+level=INFO
+formatter=plain
+args=('logs/startup_benchmark.log',)
+
+[formatter_plain]
+format=%(asctime)s %(levelname)s %(name)s - %(message)s
+"""
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _prepare(directory: str, port: int):
+    """Write the settings and the logging configuration of a run"""
+    os.makedirs(os.path.join(directory, "Settings"), exist_ok=True)
+    settings = DefaultData.SETTINGS_XML_STR
+    settings = settings.replace("<host>remote</host>", "<host>localhost</host>")
+    settings = settings.replace("<port>10001</port>", "<port>%d</port>" % port)
+    settings = settings.replace("<host>10.42.0.1</host>", "<host>127.0.0.1</host>")
+    settings = settings.replace("<port>10003</port>", "<port>%d</port>" % _free_port())  # Nobody listens there
+    settings = settings.replace("<gpio_backend>rpi</gpio_backend>", "<gpio_backend>sim</gpio_backend>")
+    with open(os.path.join(directory, "Settings", "settings_pi.xml"), "w") as settings_file:
+        settings_file.write(settings)
+    with open(os.path.join(directory, "Settings", "log_config.ini"), "w") as log_file:
+        log_file.write(_LOG_CONFIG)
+
+
+def _status(sock, reader):
+    sock.sendall(b"STARTUP_STATUS\n")
+    return reader.readline().decode('utf-8').rstrip('\n')
+
+
+def run_once(runtime: str, timeout: float):
+    """Start the controller once and measure its startup
+
+    Returns:
+        tuple: Seconds to listen, seconds to ready and the last status line
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        port = _free_port()
+        _prepare(directory, port)
+        env = dict(os.environ, PYTHONPATH=_ROOT)
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, os.path.join(_ROOT, "Core", "RadioTelescopeRPi.py"),
+                                    "--runtime", runtime], cwd=directory, env=env, stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.DEVNULL)
+        try:
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError("The controller exited with status %d" % process.returncode)
+                if time.perf_counter() - start > timeout:
+                    raise RuntimeError("The controller did not listen within %.1f s" % timeout)
+                try:
+                    sock = socket.create_connection(("127.0.0.1", port), timeout=timeout)
+                    break
+                except OSError:
+                    time.sleep(0.001)
+            listen = time.perf_counter() - start
+
+            with sock, sock.makefile('rb') as reader:
+                status = _status(sock, reader)
+                while "_READY_1_" not in status:
+                    if time.perf_counter() - start > timeout:
+                        raise RuntimeError("The controller was not ready within %.1f s: %s" % (timeout, status))
+                    time.sleep(0.001)
+                    status = _status(sock, reader)
+                ready = time.perf_counter() - start
+        finally:
+            process.terminate()
+            process.wait()
+    return listen, ready, status
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Controller startup benchmark with the simulated GPIO backend")
+    parser.add_argument("--runtime", choices=("qt", "asyncio"), default="qt", help="Runtime of the controller")
+    parser.add_argument("--runs", type=int, default=5, help="Number of process starts to measure")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds to wait for each run")
+    args = parser.parse_args()
+
+    listen_times = []
+    ready_times = []
+    for run in range(args.runs):
+        listen, ready, status = run_once(args.runtime, args.timeout)
+        listen_times.append(listen)
+        ready_times.append(ready)
+        print("Run %d: listen %.1f ms, ready %.1f ms, %s" % (run + 1, listen * 1000.0, ready * 1000.0, status))
+
+    print("Time to listen (ms): median=%.1f, min=%.1f, max=%.1f" % (statistics.median(listen_times) * 1000.0,
+                                                                   min(listen_times) * 1000.0,
+                                                                   max(listen_times) * 1000.0))
+    print("Time to ready (ms): median=%.1f, min=%.1f, max=%.1f" % (statistics.median(ready_times) * 1000.0,
+                                                                  min(ready_times) * 1000.0,
+                                                                  max(ready_times) * 1000.0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Measure the stepping timing performance with the simulated GPIO backend
+
+Runs the stepping engine against the edge-recording backend and prints the achieved step frequency, the lateness
+percentiles and the missed deadlines. Busy threads can be added to see how the stepping behaves under load.
+
+The engine waits for the interpreter lock after every deadline, so the busy threads delay the steps by up to the
+switch interval of the interpreter. 400 steps of each axis at 200 Hz, with 2 busy threads on a single core:
+
+    switch interval     p50 lateness    p99 lateness    missed deadlines (over 0.5 ms, of 800)
+    5 ms (default)      3.1-3.8 ms      5.1-6.8 ms      506-524
+    0.1 ms (engine)     8-10 us         0.8-1.3 ms      10-22
+
+The engine lowers the switch interval only for schedules faster than 50 Hz, see ``StepEngine.SWITCH_THRESHOLD_NS``, so
+below that frequency both runs use the default one.
+
+Example:
+    python3 Benchmarks/stepping_benchmark.py --frequency 200 --steps 400 --load 2
+    python3 Benchmarks/stepping_benchmark.py --frequency 200 --steps 400 --load 2 --switch-interval 0
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))  # noqa
+
+# pylint: disable=wrong-import-position
+
+from Core.Handlers import StepEngine, GPIOBackend
+
+# pylint: disable=wrong-import-position
+
+_PINS = ((11, 13), (15, 16))  # Coil pins of the RA and DEC motors, as in the motor driver
+
+
+def _busy_work(stop: threading.Event):
+    """Keep the interpreter busy, to simulate network and logging work"""
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def run(frequency: float, steps: int, load: int, switch_interval: float = StepEngine.SWITCH_INTERVAL):
+    backend = GPIOBackend.SimulatedBackend()
+    backend.setup_outputs(_PINS[0] + _PINS[1], 0)
+    steppers = tuple(StepEngine.AxisStepper(lambda c_1, c_2, pins=pins: backend.output_pair(pins[0], pins[1], c_1,
+                                                                                            c_2)) for pins in _PINS)
+    finished = threading.Event()
+    remaining = [2]
+
+    def done(axis):
+        remaining[0] -= 1
+        if remaining[0] == 0:
+            finished.set()
+
+    engine = StepEngine.StepEngine(lambda axis, direction: steppers[axis].step(direction), done,
+                                   backend.set_deadline, switch_interval=switch_interval or None)
+    engine.start()
+
+    stop = threading.Event()
+    workers = [threading.Thread(target=_busy_work, args=(stop,), daemon=True) for _ in range(load)]
+    for worker in workers:
+        worker.start()
+
+    start = time.perf_counter()
+    engine.add_job(StepEngine.RA_AXIS, 1, StepEngine.constant_schedule(frequency, steps))
+    engine.add_job(StepEngine.DEC_AXIS, -1, StepEngine.constant_schedule(frequency, steps))
+    finished.wait()
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    engine.close()
+    return elapsed, backend.report()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stepping engine benchmark with the simulated GPIO backend")
+    parser.add_argument("--frequency", type=float, default=200.0, help="Stepping frequency of both axes in Hz")
+    parser.add_argument("--steps", type=int, default=1000, help="Number of steps of each axis")
+    parser.add_argument("--load", type=int, default=0, help="Number of busy threads running alongside")
+    parser.add_argument("--switch-interval", type=float, default=StepEngine.SWITCH_INTERVAL,
+                        help="Switch interval of the interpreter in seconds while moving, 0 to keep the default one")
+    args = parser.parse_args()
+
+    elapsed, report = run(args.frequency, args.steps, args.load, args.switch_interval)
+    print("Elapsed time: %.3f s, expected %.3f s" % (elapsed, args.steps / args.frequency))
+    print("Steps: %d, edges: %d" % (report["steps"], report["edges"]))
+    for pin, frequency in sorted(report["frequency"].items()):
+        print("Achieved frequency on pin %d pair: %.3f Hz" % (pin, frequency))
+    print("Lateness (us): " + ", ".join("%s=%.1f" % item for item in sorted(report["lateness_us"].items())))
+    print("Missed deadlines: %d" % report["missed"])
+
+
+if __name__ == '__main__':
+    main()
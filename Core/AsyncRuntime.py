@@ -0,0 +1,106 @@
+"""Runtime of the controller on an asyncio event loop, without Qt
+
+The request handling, motion and position logic is the same as in the Qt runtime. Only the objects holding it are
+different: the signals are :class:`Core.Handlers.Signal.Signal` objects, the server and client use asyncio streams and
+the position telemetry is sampled by a task instead of a timer. The steps are still timed by the stepping engine
+thread, whose signals are queued to the event loop.
+"""
+
+import asyncio
+import logging
+from Core.Handlers import MotionPlanner
+from Core.Handlers.Signal import Signal
+from Core.Handlers.MotionCore import MotorControl, MotionCore
+from Core.Handlers.RequestCore import RequestCore
+from Core.Networking.AsyncServer import AsyncServer
+from Core.Networking.AsyncClient import AsyncClient
+from Position.PositionModel import PositionCore
+
+
+class AsyncMotor(MotorControl):
+    def __init__(self, backend=None):
+        self._setup_motor(backend)
+
+
+class AsyncMotion(MotionCore):
+    def __init__(self, init_ra, init_dec, motor, limits=None, profile=MotionPlanner.TRAPEZOIDAL):
+        self.moveMotSig = Signal()  # Move the motors, same string format as the Qt stepping object
+        self.motStepSig = Signal()  # Motor type and step count
+        self.updtStepSig = Signal()  # Total step counts
+        self.motStopSig = Signal()  # Motors finished their move
+        self.motHaltSig = Signal()  # Motors were stopped by a request
+        self.motStartSig = Signal()  # Motors started moving
+        self.trackStatSig = Signal()  # Tracking status
+        self._setup_motion(init_ra, init_dec, motor, limits, profile)
+
+
+class AsyncPosition(PositionCore):
+    """Position object, which also takes the place of the position thread: starting it starts the sampling task"""
+
+    def __init__(self, tcpClient, cfg_data):
+        self.posUpdateSig = Signal()  # Hour angle, declination, steps and timestamp
+        self._setup_position(tcpClient, cfg_data)
+        self._task = None
+
+    def start(self):
+        if self.rate > 0.0 and (self._task is None or self._task.done()):
+            self._task = asyncio.ensure_future(self._run())
+
+    def quit(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        """Sample at the telemetry rate. The deadlines are absolute, so a late tick does not delay the next ones."""
+        loop = asyncio.get_running_loop()
+        interval = 1.0 / self.rate
+        deadline = loop.time()
+        while True:
+            deadline += interval
+            await asyncio.sleep(max(0.0, deadline - loop.time()))
+            self._sample()
+
+
+class AsyncRequestHandle(RequestCore):
+    def __init__(self, cfg_data, server, client, pos_obj):
+        self.gpioReadySig = Signal()  # The GPIO backend, initialized in the background
+        self._setup_requests(cfg_data, server, client, pos_obj, pos_obj)
+
+    async def start(self):
+        self.server.requestProcess.connect(self.process)
+        self.server.requestTokens.connect(self.process_tokens)  # Requests of the binary protocol, already decoded
+        await self.server.start()
+        self.client.start()
+        self.position_thread.start()
+
+        self.gpioReadySig.connect(self._gpio_ready)  # Queued to the event loop from the initialization thread
+        self._start_hardware()
+
+    def _create_motion(self, backend, init_ra, init_dec, limits, profile):
+        self.motor = AsyncMotor(backend)
+        self.motor_move = AsyncMotion(init_ra, init_dec, self.motor, limits, profile)
+
+
+async def _main(cfg):
+    Signal.set_loop(asyncio.get_running_loop())  # The stepping engine thread emits through the loop
+
+    server = AsyncServer(cfg)
+    client = AsyncClient(cfg)
+    pos_obj = AsyncPosition(client, cfg)
+    request_handle = AsyncRequestHandle(cfg, server, client, pos_obj)
+    await request_handle.start()
+    try:
+        await server.serve_forever()
+    finally:
+        server.close()
+
+
+def run(cfg):
+    """Run the controller on an asyncio event loop, until the program is stopped
+
+    Args:
+        cfg: Configuration data object
+    """
+    logging.getLogger(__name__).info("Starting the asyncio runtime")
+    asyncio.run(_main(cfg))
@@ -1,5 +1,94 @@
 import xml.etree.ElementTree as etree
 import logging
+import os
+import threading
+from types import MappingProxyType
+from Core.Configuration.StepJournal import StepJournal
+from Core.Handlers import MotionPlanner
+
+WATCH_INTERVAL = 2.0  # Seconds between the checks for changes of the settings file
+
+
+def _parse_value(text):
+    """Convert the text of a setting to an int or a float, if it represents a number
+
+    Args:
+        text (str): The text of an XML element or attribute
+
+    Returns:
+        The parsed int or float, or the stripped text if it is not a number
+    """
+    text = (text or "").strip()
+    for kind in (int, float):
+        try:
+            return kind(text)
+        except ValueError:
+            continue
+    return text
+
+
+def _add_setting(values, name, value, section):
+    """Add a setting to a section being built, keeping the first one of a duplicate name like ``find`` does"""
+    if name in values:
+        logging.getLogger(__name__).warning("Duplicate setting %s in section %s of the settings file, using the first "
+                                            "one" % (name, section))
+        return
+    values[name] = value
+
+
+class FrozenNamespace:
+    """Read-only namespace, with the attributes held in a mapping proxy
+
+    The names are reachable with ``getattr`` even when they are not valid identifiers. Setting or deleting an attribute
+    raises :class:`AttributeError`.
+    """
+    __slots__ = ('_values',)
+
+    def __init__(self, values):
+        object.__setattr__(self, '_values', MappingProxyType(dict(values)))
+
+    def __getattr__(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        raise AttributeError("The settings snapshot is read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError("The settings snapshot is read-only")
+
+    def __repr__(self):
+        return "FrozenNamespace(%s)" % ", ".join("%s=%r" % item for item in self._values.items())
+
+
+def build_snapshot(root):
+    """Build read-only views of the parsed settings
+
+    Every section of the settings file becomes an attribute of the returned objects and every child element or
+    attribute of a section becomes an attribute of the section. The names are the XML tags as they are, so they are
+    also reachable with ``getattr`` when they are not valid identifiers. The snapshots cannot be changed once built, a
+    changed file gives new ones.
+
+    Args:
+        root: Root element of the parsed XML settings file
+
+    Returns:
+        tuple: The settings with the numbers already parsed, and the settings as the stripped text written in the
+        file, both as :class:`FrozenNamespace`
+    """
+    sections = {}
+    for section in root:
+        texts = {}
+        for item in section:
+            _add_setting(texts, item.tag, (item.text or "").strip(), section.tag)
+        for name, value in section.attrib.items():
+            _add_setting(texts, name, value.strip(), section.tag)
+        _add_setting(sections, section.tag, texts, root.tag)
+    parsed = {tag: FrozenNamespace({name: _parse_value(text) for name, text in texts.items()})
+              for tag, texts in sections.items()}
+    return FrozenNamespace(parsed), FrozenNamespace({tag: FrozenNamespace(texts) for tag, texts in sections.items()})
 
 
 class ConfDataPi:
@@ -28,11 +117,75 @@ class ConfDataPi:
         try:
             self.tree = etree.parse(self.filename)
             self.root = self.tree.getroot()
+            # Typed settings and their text, each replaced as a whole when the file changes
+            self.settings, self.texts = build_snapshot(self.root)
+            self._mtime = os.stat(self.filename).st_mtime_ns
         except Exception:
             self.log_data.exception("An exception occurred while parsing the XML settings file. See the traceback "
                                     "below.")
             exit(1)  # Exit the program since the settings file is important
 
+        self.journal = self._open_step_journal()  # The step counts are kept in the journal, not in the XML file
+
+        # Watch the settings file for changes, to reload them while running
+        self._write_lock = threading.Lock()
+        self._stop_watch = threading.Event()
+        self._watcher = threading.Thread(target=self._watch, name="SettingsWatcher", daemon=True)
+        self._watcher.start()
+
+    def _open_step_journal(self):
+        """Open the step journal, seeding it from the XML settings file if it holds no saved state
+
+        Returns:
+            StepJournal: The opened journal
+        """
+        path = self.get_text("StepJournal", "filename", "steps.journal")
+        if not os.path.isabs(path):
+            path = os.path.join(os.path.dirname(self.filename), path)  # Keep it next to the settings file
+
+        journal = StepJournal(path, float(self.get_config("StepJournal", "flush_interval", 5.0)))
+        if not journal.recovered:
+            # First start with the journal, so continue from the steps saved by the older versions
+            journal.update(int(self.get_config("Steps", "RA", 0)), int(self.get_config("Steps", "DEC", 0)),
+                           int(self.get_config("Steps", "home_calib", 0)))
+            journal.flush()
+        return journal
+
+    def _watch(self):
+        """Poll the modification time of the settings file and reload it when it changes"""
+        while not self._stop_watch.wait(WATCH_INTERVAL):
+            with self._write_lock:  # Not while set_config writes the file and takes its new time
+                try:
+                    mtime = os.stat(self.filename).st_mtime_ns
+                except OSError:
+                    continue
+                changed = mtime != self._mtime
+                self._mtime = mtime
+            if changed:
+                self.reload()
+
+    def reload(self):
+        """Parse the settings file again and swap in the new snapshot
+
+        If the file cannot be parsed, for example because it is being written by an editor, the current settings are
+        kept.
+
+        Returns:
+            bool: True if the new settings were loaded
+        """
+        try:
+            tree = etree.parse(self.filename)
+            settings, texts = build_snapshot(tree.getroot())
+        except Exception:
+            self.log_data.exception("Could not reload the changed settings file. Keeping the current settings.")
+            return False
+        with self._write_lock:
+            self.tree, self.root = tree, tree.getroot()
+            # Reference assignments, so every getter sees either the old or the new snapshot it reads
+            self.settings, self.texts = settings, texts
+        self.log_data.info("Settings file changed, reloaded the settings")
+        return True
+
     def parse(self):
         """Parses the XML settings file, or a general XML file
 
@@ -53,99 +206,138 @@ class ConfDataPi:
         try:
             self.tree = etree.parse(self.filename)
             self.root = self.tree.getroot()
+            self.settings, self.texts = build_snapshot(self.root)
         except Exception:
             self.log_data.exception("An exception occurred trying parse the XML settings file. See the traceback "
                                     "below.")
             exit(1)  # Exit the program since the settings file is important
 
-    def get_config(self, child, subchild):
-        """Get the desired configuration from the parsed XML file
+    def get_config(self, child, subchild, default=""):
+        """Get the desired configuration from the settings snapshot
 
-        This method tries to find the provided configuration in the parsed XML file. A parsed XML file is assumed.
+        This is an attribute lookup on the current snapshot, so the XML tree is not searched.
 
-        Todo:
-            Check whether an exception catch is required during the search process
+        Args:
+            child (str): Provide the section to be found
+            subchild (str): Element or attribute of the section
+            default: Value returned if the section or the setting is missing, like in settings files of older versions
 
-        Todo:
-            Check where this function is used and accommodate for the empty string return on error
+        Returns:
+            The setting as an int, a float or a string, depending on its contents
+        """
+        return getattr(getattr(self.settings, child, None), subchild, default)
+
+    def get_text(self, child, subchild, default=""):
+        """Get the desired configuration as the text written in the settings file, without parsing the numbers
 
         Args:
-            child (str): Provide the child element to be found
-            subchild (str): Sub-child attribute
+            child (str): Provide the section to be found
+            subchild (str): Element or attribute of the section
+            default (str): Value returned if the section or the setting is missing
 
         Returns:
-
+            str: The stripped text of the setting
         """
-        children = list(self.root.find(child))
-        for item in children:
-            if item.tag == subchild:
-                return item.text
-        return ""  # Empty string if o element found
+        return getattr(getattr(self.texts, child, None), subchild, default)
 
     def set_config(self, element, child, value):
-        """
+        """Change a setting, save it to the settings file and update the snapshot
 
         Args:
-            element:
-            child:
-            value:
+            element (str): The section of the setting
+            child (str): The setting element in the section
+            value: New value of the setting
 
         Returns:
-
+            Does not return anything
         """
-        elm = self.root.find(element)  # Get the required element from the tree
-        children = list(elm)  # List the children of the element
-        for item in children:
-            if item.tag == child:
-                item.text = str(value)  # Make the value into a string before appending it on the settings file
-                # elm.set("updated", "yes")
-                self.tree.write(self.filename)
-                break
-            else:
-                continue
+        with self._write_lock:
+            elm = self.root.find(element)  # Get the required element from the tree
+            if elm is None:
+                return
+            children = list(elm)  # List the children of the element
+            for item in children:
+                if item.tag == child:
+                    item.text = str(value)  # Make the value into a string before appending it on the settings file
+                    # elm.set("updated", "yes")
+                    self.tree.write(self.filename)
+                    self.settings, self.texts = build_snapshot(self.root)
+                    self._mtime = os.stat(self.filename).st_mtime_ns  # Our own change, so no reload is needed
+                    break
+                else:
+                    continue
 
     def get_steps(self):
-        """
+        """Get the current step counts of the motors
 
-        Returns:
+        The values are read from the in-memory state of the step journal, so no file access takes place.
 
+        Returns:
+            list: RA steps, DEC steps and the home calibration flag as a string
         """
-        elm = self.root.find("Steps")
-        return [float(self.get_config("Steps", "RA")), float(self.get_config("Steps", "DEC")), elm.get("home_calib")]
+        ra_steps, dec_steps, calib = self.journal.get()
+        return [float(ra_steps), float(dec_steps), str(calib)]
 
     # Make it as direct as possible to save time
     def set_steps(self, m_steps, calib=""):
-        """
+        """Update the step counts of the motors
+
+        The journal is written in the background at its flush interval. A change of the home calibration flag is
+        written immediately.
 
         Args:
-            m_steps:
-            calib:
+            m_steps (list): Which motor to update, ``RA``, ``DEC`` or ``BOTH``, followed by the RA and DEC steps
+            calib: Home calibration flag, empty to leave it unchanged
 
         Returns:
-
+            Does not return anything
         """
-        elm = self.root.find("Steps")  # Get the required element from the tree
         if m_steps[0] == "RA":
-            elm[0].text = str(m_steps[1])  # Set the RA element on XML
+            self.journal.update(ra=int(float(m_steps[1])))
         elif m_steps[0] == "DEC":
-            elm[1].text = str(m_steps[2])  # Set the DEC element on XML
+            self.journal.update(dec=int(float(m_steps[2])))
         elif m_steps[0] == "BOTH":
-            elm[0].text = str(m_steps[1])  # Set the RA element on XML
-            elm[1].text = str(m_steps[2])  # Set the DEC element on XML
+            self.journal.update(ra=int(float(m_steps[1])), dec=int(float(m_steps[2])))
 
         if calib != "":
-            elm = self.root.find("Steps")
-            elm.set("home_calib", str(calib))
-        self.tree.write(self.filename)  # Write the data to the XML file
+            self.journal.update(calib=int(calib))
+            self.journal.flush()
+
+    def flush_steps(self):
+        """Write any pending step count change to the journal now, like when the motors stop"""
+        self.journal.flush()
+
+    def close(self):
+        """Stop watching the settings file and write the pending step counts to the journal"""
+        self._stop_watch.set()
+        self.journal.close()
+
+    def _get_positive(self, child, subchild, default: float):
+        """Get a setting that must be a positive number, like a motor limit
+
+        Args:
+            child (str): Provide the section to be found
+            subchild (str): Element or attribute of the section
+            default (float): Value returned if the setting is missing or is not a positive number
+
+        Returns:
+            float: The setting, or the default with a warning in the log if it is not valid
+        """
+        value = self.get_config(child, subchild, default)
+        if isinstance(value, (int, float)) and 0.0 < value < float("inf"):
+            return float(value)
+        self.log_data.warning("Setting %s of section %s must be a positive number, got '%s'. Using %s instead."
+                              % (subchild, child, value, default))
+        return float(default)
 
     # Server data
     def get_host(self):
         """
 
         Returns:
-
+            str: The address the server listens on, as written in the settings file
         """
-        return self.get_config("TCPServer", "host")
+        return self.get_text("TCPServer", "host")
 
     def set_host(self, host):
         """
@@ -162,9 +354,9 @@ class ConfDataPi:
         """
 
         Returns:
-
+            str: The port of the server, as written in the settings file
         """
-        return self.get_config("TCPServer", "port")
+        return self.get_text("TCPServer", "port")
 
     def set_port(self, port):
         """
@@ -182,9 +374,9 @@ class ConfDataPi:
         """
 
         Returns:
-
+            str: The address of the client connection, as written in the settings file
         """
-        return self.get_config("TCPClient", "host")
+        return self.get_text("TCPClient", "host")
 
     def set_client_host(self, host):
         """
@@ -201,9 +393,9 @@ class ConfDataPi:
         """
 
         Returns:
-
+            str: The port of the client connection, as written in the settings file
         """
-        return self.get_config("TCPClient", "port")
+        return self.get_text("TCPClient", "port")
 
     def set_client_port(self, port):
         """
@@ -215,3 +407,100 @@ class ConfDataPi:
 
         """
         self.set_config("TCPClient", "port", str(port))
+
+    # Motor data
+    def get_gpio_backend(self):
+        """Get the name of the GPIO backend used for the motors
+
+        Returns:
+            str: The backend name, ``rpi`` if it is not specified in the settings file
+        """
+        return self.get_text("Motors", "gpio_backend", "rpi")
+
+    def get_motion_profile(self):
+        """Get the velocity profile used for the slews
+
+        Returns:
+            str: ``trapezoidal`` or ``s-curve``, ``trapezoidal`` if it is not specified or not known
+        """
+        profile = self.get_text("Motors", "profile", MotionPlanner.TRAPEZOIDAL)
+        if profile not in (MotionPlanner.TRAPEZOIDAL, MotionPlanner.S_CURVE):
+            self.log_data.warning("Unknown motion profile '%s' in the settings file. Using %s instead."
+                                  % (profile, MotionPlanner.TRAPEZOIDAL))
+            return MotionPlanner.TRAPEZOIDAL
+        return profile
+
+    def get_max_speed(self, axis):
+        """Get the maximum stepping frequency of a motor
+
+        Args:
+            axis (str): ``RA`` or ``DEC``
+
+        Returns:
+            float: The maximum frequency in steps/s, 200 if it is not specified or not positive
+        """
+        return self._get_positive("Motors", "%s_max_speed" % axis.lower(), 200.0)
+
+    def get_acceleration(self, axis):
+        """Get the acceleration of a motor during the slews
+
+        Args:
+            axis (str): ``RA`` or ``DEC``
+
+        Returns:
+            float: The acceleration in steps/s^2, 400 if it is not specified or not positive
+        """
+        return self._get_positive("Motors", "%s_acceleration" % axis.lower(), 400.0)
+
+    # Telemetry data
+    def get_imu_enabled(self):
+        """Get whether the MPU9250 sensor is initialized at startup
+
+        Returns:
+            bool: True if it is enabled, False if it is not specified in the settings file
+        """
+        return self.get_text("IMU", "enabled", "no").lower() in ("yes", "true", "1")
+
+    def get_imu_calibration_cache(self):
+        """Get the path of the IMU calibration cache
+
+        Returns:
+            str: The path, next to the settings file if it is relative. ``imu_calibration.json`` if it is not
+            specified in the settings file
+        """
+        path = self.get_text("IMU", "calibration_cache", "imu_calibration.json")
+        if not os.path.isabs(path):
+            path = os.path.join(os.path.dirname(self.filename), path)
+        return path
+
+    def get_imu_calibration_max_age(self):
+        """Get the age after which the saved gyroscope and accelerometer biases are measured again
+
+        Returns:
+            float: Age in days, 30 if it is not specified in the settings file
+        """
+        return float(self.get_config("IMU", "calibration_max_age", 30.0))
+
+    def get_telemetry_rate(self):
+        """Get the rate of the position updates
+
+        Returns:
+            float: Updates per second, 10 if it is not specified in the settings file
+        """
+        return float(self.get_config("Telemetry", "rate", 10.0))
+
+    def get_telemetry_threshold(self):
+        """Get the change of the step count needed to publish a position update before the heartbeat
+
+        Returns:
+            int: Minimum change in steps of either motor, 1 if it is not specified in the settings file
+        """
+        return int(self.get_config("Telemetry", "step_threshold", 1))
+
+    def get_telemetry_heartbeat(self):
+        """Get the maximum time between two position updates, sent even if the position has not changed
+
+        Returns:
+            float: The time in seconds, 1 if it is not specified in the settings file
+        """
+        return float(self.get_config("Telemetry", "heartbeat", 1.0))
@@ -62,5 +62,27 @@ SETTINGS_XML_STR = """<settings>
         <RA>0</RA>
         <DEC>0</DEC>
     </Steps>
+    <StepJournal>
+        <filename>steps.journal</filename>
+        <flush_interval>5</flush_interval>
+    </StepJournal>
+    <Motors>
+        <gpio_backend>rpi</gpio_backend>
+        <profile>trapezoidal</profile>
+        <ra_max_speed>200</ra_max_speed>
+        <ra_acceleration>400</ra_acceleration>
+        <dec_max_speed>200</dec_max_speed>
+        <dec_acceleration>400</dec_acceleration>
+    </Motors>
+    <Telemetry>
+        <rate>10</rate>
+        <step_threshold>1</step_threshold>
+        <heartbeat>1</heartbeat>
+    </Telemetry>
+    <IMU>
+        <enabled>no</enabled>
+        <calibration_cache>imu_calibration.json</calibration_cache>
+        <calibration_max_age>30</calibration_max_age>
+    </IMU>
 </settings>
 """
@@ -0,0 +1,181 @@
+import os
+import zlib
+import struct
+import logging
+import threading
+
+JOURNAL_MAGIC = b"RTSJ"  # Identifies a step journal file
+JOURNAL_VERSION = 1
+MAX_RECORDS = 1024  # The journal is compacted to a single record when it reaches this size
+MIN_FLUSH_INTERVAL = 0.1  # Shortest seconds between the background writes, so the flushing thread never busy-loops
+
+_HEADER = struct.Struct('<4sH')  # Magic and version
+_RECORD = struct.Struct('<QqqB')  # Sequence number, RA steps, DEC steps and home calibration flag
+_CRC = struct.Struct('<I')  # CRC32 of the record, appended after it
+RECORD_SIZE = _RECORD.size + _CRC.size
+
+
+class StepJournal:
+    """Write-behind, append-only journal of the motor step counts
+
+    The step counts are updated in memory and a background thread appends them to the journal file at a fixed
+    interval, only if they changed. Every record carries a CRC32, so on start-up the last intact record is recovered
+    and any torn record at the end, left by a power loss during a write, is cut off. When the journal grows to
+    :data:`MAX_RECORDS` records, it is compacted by atomically replacing it with a file holding only the latest state.
+    """
+
+    def __init__(self, path, flush_interval=5.0, max_records=MAX_RECORDS):
+        """Class constructor
+
+        Opens the journal and recovers the last saved state. The background flushing starts immediately.
+
+        Args:
+            path (str): Path of the journal file, created if it does not exist
+            flush_interval (float): Seconds between the writes of the changed state to the file, at least
+                :data:`MIN_FLUSH_INTERVAL`
+            max_records (int): Number of records that triggers a compaction
+        """
+        self.log_data = logging.getLogger(__name__)
+        self.path = path
+        self.flush_interval = max(float(flush_interval), MIN_FLUSH_INTERVAL)
+        self.max_records = max_records
+
+        self._lock = threading.Lock()
+        self._state = (0, 0, 0)  # RA steps, DEC steps and home calibration flag
+        self._sequence = 0
+        self._records = 0
+        self._dirty = False
+        self._file = None
+        self.recovered = self._recover()  # True if a saved state was found
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._flusher, name="StepJournal", daemon=True)
+        self._thread.start()
+
+    def get(self):
+        """Get the current state
+
+        Returns:
+            tuple: RA steps, DEC steps and the home calibration flag
+        """
+        return self._state
+
+    def update(self, ra=None, dec=None, calib=None):
+        """Change the state in memory. The file is updated by the next flush.
+
+        Args:
+            ra (int): New RA step count, or None to keep the current value
+            dec (int): New DEC step count, or None to keep the current value
+            calib (int): New home calibration flag, or None to keep the current value
+        """
+        with self._lock:
+            cur_ra, cur_dec, cur_calib = self._state
+            self._state = (cur_ra if ra is None else int(ra), cur_dec if dec is None else int(dec),
+                           cur_calib if calib is None else int(calib))
+            self._dirty = True
+
+    def flush(self):
+        """Write the state to the journal now, if it has changed since the last write. Does nothing once closed."""
+        with self._lock:
+            if not self._dirty or self._file is None:
+                return
+            self._dirty = False
+            self._sequence += 1
+            try:
+                if self._records >= self.max_records:
+                    self._compact()
+                else:
+                    self._file.write(self._encode(self._sequence, self._state))
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                    self._records += 1
+            except OSError:
+                self._dirty = True  # Try again on the next flush
+                self.log_data.exception("Problem writing the step journal. See traceback.")
+
+    def close(self):
+        """Stop the background flushing and write any pending state"""
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _flusher(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    @staticmethod
+    def _encode(sequence, state):
+        record = _RECORD.pack(sequence, state[0], state[1], state[2])
+        return record + _CRC.pack(zlib.crc32(record))
+
+    def _recover(self):
+        """Read the journal, keep its last intact record and cut off anything after it
+
+        Returns:
+            bool: True if a valid state was recovered
+        """
+        valid_end = _HEADER.size
+        recovered = False
+        try:
+            with open(self.path, "rb") as journal:
+                data = journal.read()
+        except FileNotFoundError:
+            data = b""
+
+        if len(data) < _HEADER.size or _HEADER.unpack_from(data) != (JOURNAL_MAGIC, JOURNAL_VERSION):
+            if data:
+                self.log_data.warning("Step journal %s is not valid. Starting a new one." % self.path)
+            self._write_new()
+            return False
+
+        for offset in range(_HEADER.size, len(data) - RECORD_SIZE + 1, RECORD_SIZE):
+            record = data[offset:offset + _RECORD.size]
+            crc, = _CRC.unpack_from(data, offset + _RECORD.size)
+            if zlib.crc32(record) != crc:
+                break  # Torn or corrupted write, everything after it is discarded
+            sequence, ra, dec, calib = _RECORD.unpack(record)
+            self._sequence = sequence
+            self._state = (ra, dec, calib)
+            self._records += 1
+            valid_end = offset + RECORD_SIZE
+            recovered = True
+
+        if valid_end != len(data):
+            self.log_data.warning("Discarded %d corrupted bytes at the end of the step journal."
+                                  % (len(data) - valid_end))
+        self._file = open(self.path, "r+b")
+        self._file.truncate(valid_end)
+        self._file.seek(valid_end)
+        return recovered
+
+    def _write_new(self, state=None):
+        """Atomically replace the journal with a new file, holding only the provided state if given"""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as journal:
+            journal.write(_HEADER.pack(JOURNAL_MAGIC, JOURNAL_VERSION))
+            if state is not None:
+                journal.write(self._encode(self._sequence, state))
+            journal.flush()
+            os.fsync(journal.fileno())
+        os.replace(temp_path, self.path)
+        try:
+            # Make the rename itself durable
+            dir_fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        except OSError:
+            pass
+
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.path, "ab")
+        self._records = 0 if state is None else 1
+
+    def _compact(self):
+        self._write_new(self._state)
@@ -0,0 +1,166 @@
+import re
+import time
+import logging
+from collections import namedtuple
+
+UNKNOWN_RESPONSE = "Unrecognizable request\n"  # Response for requests that match no command
+HISTOGRAM_BUCKETS = 32  # Latency buckets, bucket n counts the calls lasting less than 2^n microseconds
+
+NUMBER = r'([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)'  # Regular expression group of a decimal number
+INTEGER = r'([-+]?\d+)'  # Regular expression group of an integer
+
+Command = namedtuple('Command', 'name handler pattern schema')
+
+
+def labelled_fields(prefix: str, count: int):
+    """Build the pattern of a request made of a prefix and labelled numbers, like ``TRNST_RA_<n>_DEC_<n>``
+
+    The labels are not checked, as they have never been by the request handler.
+
+    Args:
+        prefix (str): The command name at the start of the request
+        count (int): Number of labelled numbers following the prefix
+
+    Returns:
+        tuple: The pattern and the schema to register the command with
+    """
+    pattern = re.escape(prefix) + "".join(r'_[^_]*_' + NUMBER for _ in range(count))
+    schema = tuple((2 * (index + 1), float) for index in range(count))
+    return pattern, schema
+
+
+class CommandStats:
+    """Call count, error count and latency histogram of a command"""
+    __slots__ = ('calls', 'errors', 'histogram')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.histogram = [0] * HISTOGRAM_BUCKETS
+
+    def record(self, duration_ns: int, failed: bool):
+        self.calls += 1
+        if failed:
+            self.errors += 1
+        self.histogram[min((duration_ns // 1000).bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+
+    def percentile(self, fraction: float):
+        """Upper bound of the latency bucket holding the given fraction of the calls, in microseconds"""
+        target = fraction * self.calls
+        total = 0
+        for bucket, count in enumerate(self.histogram):
+            total += count
+            if count and total >= target:
+                return 1 << bucket
+        return 0
+
+
+class CommandRegistry:
+    """Maps the requests to their handlers
+
+    A request is looked up first by its full text, for the commands without arguments, and then by the text before
+    its first underscore, for the commands with arguments. Both are single dictionary lookups, so the cost does not
+    depend on the number of commands.
+
+    The arguments of a command are extracted and validated with a precompiled regular expression, whose groups are
+    converted by the command schema. Requests of the binary protocol arrive as token lists with the values already
+    typed, so only the schema is applied to them. Every dispatch is timed and recorded in the statistics of the command.
+    """
+
+    def __init__(self):
+        self.log_data = logging.getLogger(__name__)
+        self._commands = {}
+        self.stats = {}
+
+    def register(self, name: str, handler, pattern=None, schema=()):
+        """Register the handler of a command
+
+        Args:
+            name (str): The full request for commands without arguments, or the text before the first underscore
+            handler: Called with the converted arguments. Returns the response string, or None for no response
+            pattern (str): Regular expression that the full request must match. Its groups are the arguments. If it
+                is None, the request must be exactly the name and the handler gets no arguments, unless the schema is
+                also None, where the handler gets the request token list as it is
+            schema (tuple): ``(token index, converter)`` for each argument. The token index is the position of the
+                argument in the request token list and the converter is applied to the matched text or the token
+        """
+        self._commands[name] = Command(name, handler, re.compile(pattern + "$") if pattern is not None else None,
+                                       schema)
+        self.stats[name] = CommandStats()
+
+    def find(self, request: str):
+        """Look up the command of a request
+
+        Args:
+            request (str): The request as received, or the message name for the binary protocol
+
+        Returns:
+            Command: The registered command, or None if the request matches no command
+        """
+        command = self._commands.get(request)
+        if command is None:
+            command = self._commands.get(request.partition("_")[0])
+        return command
+
+    def dispatch(self, request: str, tokens=None):
+        """Find the command of a request, run its handler and record the statistics
+
+        Args:
+            request (str): The request as received, or the message name for the binary protocol
+            tokens (list): The request token list, if the request arrived already split
+
+        Returns:
+            str: The response to send, or None if there is nothing to send
+        """
+        command = self.find(request)
+        if command is None:
+            return UNKNOWN_RESPONSE
+
+        start = time.perf_counter_ns()
+        failed = True
+        try:
+            args = self._parse(command, request, tokens)
+            if args is None:
+                return "ERROR_MALFORMED_%s\n" % command.name
+            response = command.handler(*args)
+            failed = False
+            return response
+        except Exception:
+            self.log_data.exception("Problem executing the %s command. See traceback." % command.name)
+            return "ERROR_FAILED_%s\n" % command.name
+        finally:
+            self.stats[command.name].record(time.perf_counter_ns() - start, failed)
+
+    @staticmethod
+    def _parse(command: Command, request: str, tokens):
+        """Extract and convert the arguments of a request
+
+        Returns:
+            tuple: The arguments, or None if the request does not match the command format
+        """
+        if command.schema is None:
+            return (tokens if tokens is not None else request.split("_"),)
+        if tokens is not None:
+            if len(tokens) <= max((index for index, _ in command.schema), default=-1):
+                return None
+            return tuple(convert(tokens[index]) for index, convert in command.schema)
+        if command.pattern is None:
+            return () if request == command.name else None
+        match = command.pattern.match(request)
+        if match is None:
+            return None
+        return tuple(convert(value) for value, (_, convert) in zip(match.groups(), command.schema))
+
+    def format_stats(self):
+        """Build the statistics response
+
+        Returns:
+            str: ``CMDSTATS`` followed by the name, calls, errors, median and 99th percentile latency in microseconds of
+            every command that has been called
+        """
+        fields = ["CMDSTATS"]
+        for name, stats in sorted(self.stats.items()):
+            if stats.calls:
+                fields.append("%s_%d_%d_%d_%d" % (name, stats.calls, stats.errors, stats.percentile(0.5),
+                                                  stats.percentile(0.99)))
+        return "_".join(fields) + "\n"
@@ -0,0 +1,239 @@
+import time
+import logging
+
+# Broadcom GPIO numbers of the Raspberry Pi header pins, needed by the character device which is not aware of the
+# board numbering used in the rest of the program
+BOARD_TO_BCM = {3: 2, 5: 3, 7: 4, 8: 14, 10: 15, 11: 17, 12: 18, 13: 27, 15: 22, 16: 23, 18: 24, 19: 10, 21: 9,
+                22: 25, 23: 11, 24: 8, 26: 7, 29: 5, 31: 6, 32: 12, 33: 13, 35: 19, 36: 16, 37: 26, 38: 20, 40: 21}
+
+MISSED_DEADLINE_NS = 500000  # A step later than this from its deadline is counted as missed
+
+
+class GPIOBackend:
+    """Interface for the GPIO access of the motor driver
+
+    The pins are always given in the board numbering. The implementations should keep :meth:`output_pair` as cheap as
+    possible, since it is called for every motor step.
+    """
+
+    def setup_outputs(self, pins, value=0):
+        """Configure the provided pins as outputs
+
+        Args:
+            pins (tuple): Board numbers of the pins
+            value (int): Initial value of the pins
+        """
+        raise NotImplementedError
+
+    def output(self, pin, value):
+        """Set the value of a single output pin"""
+        raise NotImplementedError
+
+    def output_pair(self, pin_1, pin_2, value_1, value_2):
+        """Set the values of two output pins with a single operation
+
+        Used to set both coil pins of a motor at once.
+        """
+        raise NotImplementedError
+
+    def input(self, pin):
+        """Get the value of a pin"""
+        raise NotImplementedError
+
+    def cleanup(self):
+        """Release the pins"""
+        raise NotImplementedError
+
+    def set_deadline(self, deadline_ns):
+        """Inform the backend of the scheduled time of the next write
+
+        Only the backends measuring the timing performance need it, so it does nothing by default.
+
+        Args:
+            deadline_ns (int): Monotonic time of the next step in nanoseconds
+        """
+        pass
+
+
+class RPiGPIOBackend(GPIOBackend):
+    """Backend using the RPi.GPIO library"""
+
+    def __init__(self):
+        import RPi.GPIO as GPIO  # Imported here, so the other backends work on any machine
+        self.gpio = GPIO
+        self.gpio.setmode(GPIO.BOARD)  # Set the pin numbering mode
+
+    def setup_outputs(self, pins, value=0):
+        for pin in pins:
+            self.gpio.setup(pin, self.gpio.OUT, initial=value)
+
+    def output(self, pin, value):
+        self.gpio.output(pin, value)
+
+    def output_pair(self, pin_1, pin_2, value_1, value_2):
+        self.gpio.output((pin_1, pin_2), (value_1, value_2))
+
+    def input(self, pin):
+        return self.gpio.input(pin)
+
+    def cleanup(self):
+        self.gpio.cleanup()
+
+
+class GpiodBackend(GPIOBackend):
+    """Backend using the Linux GPIO character device through the libgpiod bindings
+
+    All the output pins are requested as one bulk, so each write, including :meth:`output_pair`, is a single ioctl
+    call setting all the lines.
+    """
+
+    def __init__(self, chip="gpiochip0", consumer="RadioTelescope"):
+        import gpiod  # Imported here, since the bindings are only available where libgpiod is installed
+        self.gpiod = gpiod
+        self.chip = gpiod.Chip(chip)
+        self.consumer = consumer
+        self.lines = None  # Bulk of the requested output lines
+        self.index = {}  # Position of each pin in the bulk
+        self.values = []  # Last values written to the lines
+
+    def setup_outputs(self, pins, value=0):
+        if self.lines is not None:
+            self.lines.release()  # Request again, including the new pins
+
+        for pin in pins:
+            if pin not in self.index:
+                self.index[pin] = len(self.values)
+                self.values.append(value)
+            else:
+                self.values[self.index[pin]] = value
+
+        offsets = [BOARD_TO_BCM[pin] for pin in sorted(self.index, key=self.index.get)]
+        self.lines = self.chip.get_lines(offsets)
+        self.lines.request(consumer=self.consumer, type=self.gpiod.LINE_REQ_DIR_OUT, default_vals=self.values)
+
+    def output(self, pin, value):
+        self.values[self.index[pin]] = value
+        self.lines.set_values(self.values)
+
+    def output_pair(self, pin_1, pin_2, value_1, value_2):
+        self.values[self.index[pin_1]] = value_1
+        self.values[self.index[pin_2]] = value_2
+        self.lines.set_values(self.values)
+
+    def input(self, pin):
+        return self.values[self.index[pin]]  # Only outputs are requested, so the written value is the pin state
+
+    def cleanup(self):
+        if self.lines is not None:
+            self.lines.release()
+            self.lines = None
+        self.chip.close()
+
+
+class SimulatedBackend(GPIOBackend):
+    """Backend without hardware, recording every pin edge
+
+    Each change of a pin value is stored with a :func:`time.perf_counter_ns` timestamp. When the stepping engine
+    provides the deadlines of the steps, the lateness of every :meth:`output_pair` call is recorded as well, so the
+    timing performance of the stepping can be measured on any Linux machine.
+    """
+
+    def __init__(self):
+        self.log_data = logging.getLogger(__name__)
+        self.values = {}  # Current value of each pin
+        self.edges = []  # Recorded edges as (timestamp, pin, value) tuples
+        self.steps = {}  # Timestamps of the pair writes, keyed by the first pin of the pair
+        self.lateness = []  # Lateness of each pair write from its deadline, in nanoseconds
+        self._deadline = None
+
+    def setup_outputs(self, pins, value=0):
+        for pin in pins:
+            self.values[pin] = value
+
+    def output(self, pin, value):
+        if self.values.get(pin) != value:
+            self.values[pin] = value
+            self.edges.append((time.perf_counter_ns(), pin, value))
+
+    def output_pair(self, pin_1, pin_2, value_1, value_2):
+        now = time.perf_counter_ns()
+        if self._deadline is not None:
+            self.lateness.append(time.monotonic_ns() - self._deadline)
+            self._deadline = None
+        self.steps.setdefault(pin_1, []).append(now)
+        if self.values.get(pin_1) != value_1:
+            self.values[pin_1] = value_1
+            self.edges.append((now, pin_1, value_1))
+        if self.values.get(pin_2) != value_2:
+            self.values[pin_2] = value_2
+            self.edges.append((now, pin_2, value_2))
+
+    def input(self, pin):
+        return self.values.get(pin, 0)
+
+    def cleanup(self):
+        self.values.clear()
+
+    def set_deadline(self, deadline_ns):
+        self._deadline = deadline_ns
+
+    def reset(self):
+        """Discard all the recorded data, keeping the current pin values"""
+        self.edges = []
+        self.steps = {}
+        self.lateness = []
+
+    def report(self, missed_ns=MISSED_DEADLINE_NS):
+        """Summarize the recorded stepping performance
+
+        Args:
+            missed_ns (int): Lateness in nanoseconds above which a step counts as a missed deadline
+
+        Returns:
+            dict: The number of edges, the achieved step frequency of each pin pair, the lateness percentiles in
+            microseconds and the number of missed deadlines
+        """
+        frequency = {}
+        for pin, stamps in self.steps.items():
+            if len(stamps) > 1:
+                frequency[pin] = (len(stamps) - 1) * 1e9 / (stamps[-1] - stamps[0])
+
+        lateness = sorted(self.lateness)
+        percentiles = {}
+        if lateness:
+            for percent in (50, 90, 99, 100):
+                index = min(len(lateness) - 1, int(len(lateness) * percent / 100))
+                percentiles["p%d" % percent] = lateness[index] / 1e3
+
+        return {
+            "edges": len(self.edges),
+            "steps": sum(len(stamps) for stamps in self.steps.values()),
+            "frequency": frequency,
+            "lateness_us": percentiles,
+            "missed": sum(1 for value in lateness if value > missed_ns),
+        }
+
+
+BACKENDS = {
+    "rpi": RPiGPIOBackend,
+    "gpiod": GpiodBackend,
+    "sim": SimulatedBackend,
+}
+
+
+def create_backend(name="rpi"):
+    """Create the GPIO backend with the provided name
+
+    Args:
+        name (str): One of the keys of :data:`BACKENDS`
+
+    Returns:
+        GPIOBackend: The backend object
+
+    Raises:
+        ValueError: If there is no backend with that name
+    """
+    backend = BACKENDS.get(name)
+    if backend is None:
+        raise ValueError("Unknown GPIO backend '%s'. Available: %s" % (name, ", ".join(sorted(BACKENDS))))
+    return backend()
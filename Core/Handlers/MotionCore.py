@@ -0,0 +1,206 @@
+from functools import partial
+from Core.Handlers import StepEngine, GPIOBackend, MotionPlanner
+
+# Set the pin numbers where the output is going to be
+_RA1_PIN = 11
+_RA2_PIN = 13
+_DEC1_PIN = 15
+_DEC2_PIN = 16
+_MOTORS_ENABLE_PIN = 7
+
+# TODO add the values to the settings file and retrieve them when needed. This will be done to avoid problems
+RA_STEPS_PER_DEGREE = 43200.0 / 15.0
+DEC_STEPS_PER_DEGREE = 10000
+
+
+def init_pins(backend):
+    """Setup the output pins and set them to LOW, with the motors disabled
+
+    Args:
+        backend: The GPIO backend
+    """
+    backend.setup_outputs((_RA1_PIN, _RA2_PIN, _DEC1_PIN, _DEC2_PIN, _MOTORS_ENABLE_PIN), 0)
+    backend.output(_MOTORS_ENABLE_PIN, 1)  # Set to HIGH as needed by the switch
+
+
+class MotorControl:
+    """Motor pin handling, shared by the Qt and the asyncio runtimes"""
+
+    def _setup_motor(self, backend=None):
+        # All the pin access goes through the backend, which defaults to the RPi.GPIO library
+        self.backend = backend if backend is not None else GPIOBackend.create_backend()
+
+    # TODO see how the initialization and setting will be implemented for the GPIO (partially complete)
+    def gpio_init(self):
+        init_pins(self.backend)
+
+    def clean_io(self):
+        self.backend.cleanup()
+
+    def set_step(self, c_1, c_2, ra_motor):
+        # Both coil pins are written with a single call
+        if ra_motor:  # If RA_motor is True, then we are talking about the RA motor
+            self.backend.output_pair(_RA1_PIN, _RA2_PIN, c_1, c_2)
+        else:
+            self.backend.output_pair(_DEC1_PIN, _DEC2_PIN, c_1, c_2)
+
+    def enabler(self, enable: bool):
+        if enable:
+            self.backend.output(_MOTORS_ENABLE_PIN, 0)  # Set to LOW to change the relay switch
+        else:
+            self.backend.output(_MOTORS_ENABLE_PIN, 1)  # Set to high to let switch fall to default position
+
+    def motor_status(self):
+        return not self.backend.input(_MOTORS_ENABLE_PIN)  # We have inverted logic in enabling/disabling
+
+
+class MotionCore:
+    """Motion logic of the motors, shared by the Qt and the asyncio runtimes
+
+    The class using it provides the ``moveMotSig``, ``motStepSig``, ``updtStepSig``, ``motStopSig``, ``motHaltSig``,
+    ``motStartSig`` and ``trackStatSig`` signals, either as Qt signals or as :class:`Core.Handlers.Signal.Signal`
+    objects.
+    """
+
+    def _setup_motion(self, init_ra, init_dec, motor, limits=None, profile=MotionPlanner.TRAPEZOIDAL):
+        self.moveMotSig.connect(self.start)
+        self.motor = motor  # Share the motor object to share the GPIO backend
+
+        # Acceleration limits of each axis and the velocity profile for the slews
+        if limits is None:
+            limits = (MotionPlanner.AxisLimits(200.0, 400.0), MotionPlanner.AxisLimits(200.0, 400.0))
+        self.limits = limits
+        self.profile = profile
+
+        # Each axis keeps its own coil phase and total step count
+        self.steppers = (StepEngine.AxisStepper(partial(self.motor.set_step, ra_motor=True), init_ra),
+                         StepEngine.AxisStepper(partial(self.motor.set_step, ra_motor=False), init_dec))
+        self.ra_step = 0
+        self.dec_step = 0
+
+        self.ra_moving = False
+        self.dec_moving = False
+        self.tracking = False  # Tracking indicator
+
+        # The steps are timed by a dedicated thread, away from the event loop
+        self.engine = StepEngine.StepEngine(self.step, self._engine_done, self.motor.backend.set_deadline)
+        self.engine.start()
+
+    def start(self, command: str):
+        if self.motor.motor_status() is True:
+            string = command.split("_")  # String format: FRQRA_FRQDEC_STEPRA_STEPDEC[_MODE]
+            frq_ra = float(string[0])
+            frq_dec = float(string[1])
+            mode = string[4] if len(string) > 4 else ""  # TRK for tracking, SLEW/LINE for a move with acceleration
+            self.tracking = mode == "TRK"  # Indicate if this is a tracking session
+
+            # Send the saved steps initially
+            self.motStepSig.emit("RASTEPS", self.steppers[StepEngine.RA_AXIS].position)
+            self.motStepSig.emit("DECSTEPS", self.steppers[StepEngine.DEC_AXIS].position)
+
+            if frq_ra < 0.0 or frq_dec < 0.0:
+                self.engine.halt()  # Returns after any step in progress is done
+                self.ra_moving = False
+                self.dec_moving = False
+                ra_count = self.steppers[StepEngine.RA_AXIS].position
+                dec_count = self.steppers[StepEngine.DEC_AXIS].position
+                self.motStepSig.emit("RASTEPS", ra_count)  # Send the necessary step updates on stop
+                self.motStepSig.emit("DECSTEPS", dec_count)
+                self.updtStepSig.emit(["BOTH", ra_count, dec_count])  # Send the total steps
+                self.motHaltSig.emit()  # Notify the client that we stopped
+
+                if self.tracking is True:
+                    self.trackStatSig.emit("STOPPED")  # Indicate that any tracking has stopped
+            else:
+                ra_step = int(string[2])
+                dec_step = int(string[3])
+                if mode == "LINE" and not self.ra_moving and not self.dec_moving and ra_step != 0 and dec_step != 0 \
+                        and frq_ra > 0.0 and frq_dec > 0.0:
+                    # Drive both axes from one schedule, so they arrive together
+                    self.ra_step = ra_step
+                    self.dec_step = dec_step
+                    self.ra_moving = True
+                    self.dec_moving = True
+                    schedule = MotionPlanner.plan_line((ra_step, dec_step), self.limits, (frq_ra, frq_dec),
+                                                       self.profile)
+                    self.engine.add_line_job((1 if ra_step > 0 else -1, 1 if dec_step > 0 else -1),
+                                             (abs(ra_step), abs(dec_step)), schedule)
+                    self.motStartSig.emit()
+                    return
+
+                if not self.ra_moving:
+                    self.ra_step = ra_step  # Get the sent RA steps
+                    if self.ra_step != 0 and frq_ra > 0.0:
+                        self.ra_moving = True  # Indicate that the motor is moving
+                        self.engine.add_job(StepEngine.RA_AXIS, 1 if self.ra_step > 0 else -1,
+                                            self._schedule(StepEngine.RA_AXIS, frq_ra, self.ra_step, mode))
+                        self.motStartSig.emit()
+                        if self.tracking is True:
+                            self.trackStatSig.emit("STARTED")  # Indicate that tracking has started
+
+                if not self.dec_moving:
+                    self.dec_step = dec_step  # Get the DEC steps
+                    if self.dec_step != 0 and frq_dec > 0.0:
+                        self.dec_moving = True
+                        self.engine.add_job(StepEngine.DEC_AXIS, 1 if self.dec_step > 0 else -1,
+                                            self._schedule(StepEngine.DEC_AXIS, frq_dec, self.dec_step, mode))
+                        self.motStartSig.emit()
+                        if self.tracking is True:
+                            self.trackStatSig.emit("STARTED")  # Indicate that tracking has started
+
+    def _schedule(self, axis: int, frequency: float, steps: int, mode: str):
+        """Create the step schedule of an axis for the requested move
+
+        Args:
+            axis (int): :data:`StepEngine.RA_AXIS` or :data:`StepEngine.DEC_AXIS`
+            frequency (float): Stepping frequency, or the maximum frequency for a slew
+            steps (int): Number of steps, the sign is ignored
+            mode (str): The move mode, as sent in the command
+
+        Returns:
+            array: Step intervals in nanoseconds
+        """
+        if mode in ("SLEW", "LINE"):  # A line move of a single axis is a slew
+            limits = self.limits[axis]
+            return MotionPlanner.plan(steps, min(frequency, limits.max_velocity), limits.acceleration, self.profile)
+        return StepEngine.constant_schedule(frequency, abs(steps))
+
+    def step(self, axis: int, direction: int):
+        """Do one step on the given axis. Called by the stepping engine thread for every step that is due.
+
+        Args:
+            axis (int): :data:`StepEngine.RA_AXIS` or :data:`StepEngine.DEC_AXIS`
+            direction (int): 1 for forward and -1 for backward
+        """
+        self.steppers[axis].step(direction)
+
+    def positions(self):
+        """Get the current step count of both axes. Safe to call from any thread while the motors move.
+
+        Returns:
+            tuple: RA and DEC steps from home
+        """
+        return self.steppers[StepEngine.RA_AXIS].position, self.steppers[StepEngine.DEC_AXIS].position
+
+    def _report_steps(self, axis: int):
+        """Send the total step count of an axis"""
+        count = self.steppers[axis].position
+        if axis == StepEngine.RA_AXIS:
+            self.motStepSig.emit("RASTEPS", count)
+            self.updtStepSig.emit(["RA", count, "0"])
+        else:
+            self.motStepSig.emit("DECSTEPS", count)
+            self.updtStepSig.emit(["DEC", "0", count])
+
+    def _engine_done(self, axis: int):
+        """Called by the stepping engine thread when an axis has completed its schedule"""
+        if axis == StepEngine.RA_AXIS:
+            self.ra_moving = False  # Indicate that the motor has now stopped
+        else:
+            self.dec_moving = False
+        self._report_steps(axis)
+
+        if not self.ra_moving and not self.dec_moving:
+            self.motStopSig.emit()  # Notify for stopping, if both motors have stopped
+            if self.tracking is True:
+                self.trackStatSig.emit("STOPPED")  # Indicate that tracking has stopped
@@ -0,0 +1,143 @@
+import math
+from array import array
+from collections import namedtuple
+from Core.Handlers import StepEngine
+
+TRAPEZOIDAL = "trapezoidal"  # Constant acceleration ramps
+S_CURVE = "s-curve"  # Sinusoidal velocity ramps, where the acceleration is zero at both ends of the ramp
+
+AxisLimits = namedtuple('AxisLimits', 'max_velocity acceleration')  # Velocity in steps/s, acceleration in steps/s^2
+
+
+def _trapezoidal_ramp(velocity: float, acceleration: float, max_steps: int):
+    """Times of the steps while accelerating from rest with a constant acceleration
+
+    Args:
+        velocity (float): Velocity to reach in steps/s
+        acceleration (float): Acceleration in steps/s^2
+        max_steps (int): Maximum number of steps in the ramp
+
+    Returns:
+        list: Time of each step from the start of the ramp, in seconds
+    """
+    ramp_steps = min(int(velocity * velocity / (2.0 * acceleration)), max_steps)
+    return [math.sqrt(2.0 * step / acceleration) for step in range(1, ramp_steps + 1)]
+
+
+def _s_curve_ramp(velocity: float, acceleration: float, max_steps: int):
+    """Times of the steps while accelerating from rest with a sinusoidal velocity profile
+
+    The velocity is ``v/2 * (1 - cos(pi * t / T))``, with the ramp duration ``T`` chosen so the peak acceleration
+    equals the provided acceleration. The position is inverted for every step with a bracketed Newton iteration.
+
+    Args:
+        velocity (float): Velocity to reach in steps/s
+        acceleration (float): Peak acceleration in steps/s^2
+        max_steps (int): Maximum number of steps in the ramp
+
+    Returns:
+        list: Time of each step from the start of the ramp, in seconds
+    """
+    duration = math.pi * velocity / (2.0 * acceleration)
+    omega = math.pi / duration
+    ramp_steps = min(int(velocity * duration / 2.0), max_steps)
+
+    times = []
+    previous = 0.0
+    for step in range(1, ramp_steps + 1):
+        low, high = previous, duration
+        # Small time approximation of the position, used as the first guess
+        time = min(high, max(low, (12.0 * duration * duration * step / (velocity * math.pi * math.pi)) ** (1.0 / 3)))
+        for _ in range(60):
+            error = velocity / 2.0 * (time - math.sin(omega * time) / omega) - step
+            if abs(error) < 1e-9:
+                break
+            if error > 0.0:
+                high = time
+            else:
+                low = time
+            slope = velocity / 2.0 * (1.0 - math.cos(omega * time))
+            candidate = time - error / slope if slope > 0.0 else low
+            time = candidate if low < candidate < high else (low + high) / 2.0
+        times.append(time)
+        previous = time
+    return times
+
+
+_RAMPS = {
+    TRAPEZOIDAL: _trapezoidal_ramp,
+    S_CURVE: _s_curve_ramp,
+}
+
+
+def plan(steps: int, max_velocity: float, acceleration: float, profile=TRAPEZOIDAL):
+    """Build the step schedule of a move that starts and ends at rest
+
+    The acceleration ramp is computed once and mirrored for the deceleration. Moves too short to reach the maximum
+    velocity get a triangular profile.
+
+    Args:
+        steps (int): Number of steps to do, the sign is ignored
+        max_velocity (float): Maximum stepping frequency in steps/s
+        acceleration (float): Acceleration in steps/s^2. With a value of zero or less the move is done at a constant
+            velocity
+        profile (str): :data:`TRAPEZOIDAL` or :data:`S_CURVE`
+
+    Returns:
+        array: Intervals between successive steps in nanoseconds, as played back by the stepping engine
+    """
+    steps = abs(int(steps))
+    if steps == 0:
+        return array('q')
+    if acceleration <= 0.0:
+        return StepEngine.constant_schedule(max_velocity, steps)
+    if max_velocity <= 0.0:
+        raise ValueError("Maximum velocity must be positive, got %s" % max_velocity)
+
+    try:
+        ramp = _RAMPS[profile](max_velocity, acceleration, steps // 2)
+    except KeyError:
+        raise ValueError("Unknown motion profile '%s'" % profile)
+
+    ramp_ns = array('q', (int(round((time - previous) * 1e9)) for previous, time in zip([0.0] + ramp[:-1], ramp)))
+    cruise_steps = steps - 2 * len(ramp_ns)
+    if ramp_ns and cruise_steps <= 1:
+        cruise_interval = ramp_ns[-1]  # Maximum velocity not reached, so keep the peak velocity of the ramp
+    else:
+        cruise_interval = int(round(1e9 / max_velocity))
+
+    intervals = array('q', ramp_ns)
+    intervals.extend(array('q', [cruise_interval]) * cruise_steps)
+    ramp_ns.reverse()
+    intervals.extend(ramp_ns)
+    return intervals
+
+
+def plan_line(steps, limits, velocities, profile=TRAPEZOIDAL):
+    """Build the schedule of a coordinated move of both axes
+
+    The schedule is the one of the axis with the most steps, the major axis. The other axis follows it in a fixed
+    ratio, so the limits of the major axis are reduced until the other axis stays within its own limits too.
+
+    Args:
+        steps (tuple): Number of steps of each axis, indexed by the :mod:`StepEngine` axis identifiers
+        limits (tuple): :class:`AxisLimits` of each axis
+        velocities (tuple): Requested maximum velocity of each axis in steps/s
+        profile (str): :data:`TRAPEZOIDAL` or :data:`S_CURVE`
+
+    Returns:
+        array: Intervals between the steps of the major axis in nanoseconds
+    """
+    steps = (abs(int(steps[StepEngine.RA_AXIS])), abs(int(steps[StepEngine.DEC_AXIS])))
+    major = StepEngine.RA_AXIS if steps[StepEngine.RA_AXIS] >= steps[StepEngine.DEC_AXIS] else StepEngine.DEC_AXIS
+    minor = StepEngine.DEC_AXIS if major == StepEngine.RA_AXIS else StepEngine.RA_AXIS
+    if steps[major] == 0:
+        return array('q')
+
+    velocity = min(velocities[major], limits[major].max_velocity)
+    acceleration = limits[major].acceleration
+    ratio = steps[minor] / steps[major]  # Steps of the minor axis per step of the major axis
+    if ratio > 0.0:
+        velocity = min(velocity, min(velocities[minor], limits[minor].max_velocity) / ratio)
+        acceleration = min(acceleration, limits[minor].acceleration / ratio)
+    return plan(steps[major], velocity, acceleration, profile)
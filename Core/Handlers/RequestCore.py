@@ -0,0 +1,365 @@
+import sys
+import logging
+from functools import partial
+from collections import namedtuple
+from Core import Startup
+from Core.Handlers import MotionCore, MotionPlanner, GPIOBackend, CommandRegistry
+from Core.Networking import BinaryProtocol
+
+STEPS_FROM_ZERO = 0  # Number of steps from true south and home position
+STEPS_PER_DEGREE_RA = 2880  # Enter the number of steps per degree for the RA motor (43200 steps/h or 2880 steps/deg)
+STEPS_PER_DEGREE_DEC = 10000  # Enter the number of steps per degree for the DEC motor (10000 steps/deg)
+
+# Commands that need the motors, answered with an error until the GPIO is initialized
+HARDWARE_COMMANDS = frozenset(("MANCONT", "MANCONT_STOP", "ENABLE_MOTORS", "DISABLE_MOTORS", "REPORT_MOTOR_STATUS",
+                               "RETURN_HOME", "TRNST", "TRK", "SKY-SCAN", "SKY-SCAN-MAP"))
+
+
+class RequestCore:
+    """Request handling logic, shared by the Qt and the asyncio runtimes
+
+    The server, client, position and motion objects are used only through their signals and methods, so the same
+    logic runs with the Qt objects and with their asyncio counterparts. The class using it provides the
+    ``gpioReadySig`` signal and the :meth:`_create_motion` method.
+    """
+
+    def _setup_requests(self, cfg_data, server, client, pos_obj, position_thread):
+        self.log_data = logging.getLogger(__name__)  # Get the logging object
+        self.cfg_data = cfg_data
+        self.server = server
+        self.client = client
+        self.position_thread = position_thread
+        self.pos_obj = pos_obj  # Dish position object
+        self.motor = None  # Motor objects, created once the GPIO is initialized in the background
+        self.motor_move = None
+
+        self.tracking_command = False  # Indicator if we need tracking or not
+        self.sky_scanning_command = False  # Sky scanning indicator
+        self.integrate = False  # Sky scanning integration indicator
+        self.point_count = 0  # Count the current point number in the sky scanner
+        self.client_id = 0  # Client of the request being processed
+
+        # Keep the tracking speeds sent by the user
+        self.trk_speed_ra = 0
+        self.trk_speed_dec = 0
+        self.trk_time = 0.0  # Total tracking time in minutes
+
+        # Stores the scanning parameters in a named tuple
+        self.scan_parameters = namedtuple('Scan_Parameters', 'Point1 MotSpeeds IntTime')
+        self.scan_params = ()  # Save the scanning parameters in a tuple
+        self.scanning_map = ()  # Tuple to save the map points
+
+        self.commands = CommandRegistry.CommandRegistry()  # Handlers of the requests
+        self._register_commands()
+
+    def _start_hardware(self):
+        """Initialize the GPIO and the IMU in the background, so the requests are served meanwhile"""
+        Startup.status.run_background("GPIO", self._init_gpio, self.gpioReadySig.emit)
+        if self.cfg_data.get_imu_enabled():
+            Startup.status.run_background("IMU", self.pos_obj.init_imu)
+        else:
+            Startup.status.skip("IMU")
+
+    def _init_gpio(self):
+        """Create the GPIO backend and set up the motor pins. Runs in a background thread.
+
+        Returns:
+            GPIOBackend.GPIOBackend: The initialized backend
+        """
+        backend = GPIOBackend.create_backend(self.cfg_data.get_gpio_backend())
+        MotionCore.init_pins(backend)  # Initialize the GPIO pins on the Raspberry
+        return backend
+
+    def _gpio_ready(self, backend):
+        """Create the motor objects on the initialized backend, in the thread of the handler"""
+        cur_steps = self.cfg_data.get_steps()  # Get the current steps from home to add them initially
+        self._create_motion(backend, cur_steps[0], cur_steps[1], self._motion_limits(),
+                            self.cfg_data.get_motion_profile())
+        self._connect_motion()
+        Startup.status.mark("GPIO")
+
+    def _motion_limits(self):
+        """Acceleration limits of the RA and DEC axes, from the settings"""
+        return (MotionPlanner.AxisLimits(self.cfg_data.get_max_speed("RA"), self.cfg_data.get_acceleration("RA")),
+                MotionPlanner.AxisLimits(self.cfg_data.get_max_speed("DEC"), self.cfg_data.get_acceleration("DEC")))
+
+    def _connect_motion(self):
+        """Connect the signals of the motors, once the motor objects are created"""
+        self.motor_move.motStepSig.connect(self.pos_obj.dataSend)
+        self.pos_obj.set_step_source(self.motor_move.positions)  # Sampled by the telemetry publisher
+        self.pos_obj.posUpdateSig.connect(partial(self.server.publish.emit, "POSITION", "DISHPOS"))
+        self.pos_obj.posUpdateSig.connect(self.position_update)  # Keep the step journal current while moving
+        self.motor_move.updtStepSig.connect(self.step_update)
+        self.motor_move.motHaltSig.connect(self.steps_flush)  # Save the steps right away when the motors stop
+        self.motor_move.motStopSig.connect(self.steps_flush)
+        self.motor_move.motHaltSig.connect(partial(self.server.sendDataClient.emit, "STOPPED_MOVING\n"))
+        self.motor_move.motHaltSig.connect(self.action_reseter)  # Reset the tracking and scanning indicators on halt
+        self.motor_move.motStopSig.connect(self.tracker)  # Send the tracking command if the user requested it
+        self.motor_move.motStopSig.connect(self.sky_scanner)  # Act appropriately when motors are stopped
+        self.motor_move.motStartSig.connect(partial(self.server.sendDataClient.emit, "STARTED_MOVING\n"))
+        self.motor_move.motStartSig.connect(partial(self.server.publish.emit, "MOTOR", "MOTORSTATE", [1]))
+        self.motor_move.motStopSig.connect(partial(self.server.publish.emit, "MOTOR", "MOTORSTATE", [0]))
+        self.motor_move.motHaltSig.connect(partial(self.server.publish.emit, "MOTOR", "MOTORSTATE", [0]))
+        self.motor_move.trackStatSig.connect(self.tracking_status)  # Send the appropriate message to client
+
+        self.server.clientDisconnected.connect(partial(self.motor.enabler, False))  # Disable motors, nobody is left
+
+    def _register_commands(self):
+        """Register the handler of every request with its argument format"""
+        cmd = self.commands
+        cmd.register("CONNECT_CLIENT", self._connect_client)
+        cmd.register("START_SENDING_POS", self._start_sending_pos)
+        cmd.register("STOP_POS_SEND", self._stop_pos_send)
+        cmd.register("SEND_POS_UPDATE", self._send_pos_update)
+        cmd.register("STOP", self._stop)
+        cmd.register("MANCONT", self._manual_move,
+                     r'MANCONT_(MOVRA|MOVDEC|MOVE)_%s_%s_%s' % (CommandRegistry.NUMBER, CommandRegistry.INTEGER,
+                                                                CommandRegistry.INTEGER),
+                     ((1, str), (2, float), (3, int), (4, int)))
+        cmd.register("MANCONT_STOP", self._manual_stop)
+        cmd.register("Test", lambda: "OK\n")  # Just send a response to confirm communication
+        cmd.register("Terminate", self._terminate)
+        cmd.register("Quit", lambda: "Server closing\n")  # TODO implement a server closure
+
+        # Motor control section
+        cmd.register("ENABLE_MOTORS", self._enable_motors)
+        cmd.register("DISABLE_MOTORS", self._disable_motors)
+        cmd.register("REPORT_MOTOR_STATUS", self._motor_status)
+        # TODO make a function to get the current tracking status based on the moving of the motors
+        cmd.register("TRKNGSTAT", lambda: "NO\n")  # Value until full functionality is provided
+        # TODO send the steps per degree for the motors, may be removed in later release
+        cmd.register("SCALE", lambda: "SCALEVALS_RA_%d_DEC_%d\n" % (STEPS_PER_DEGREE_RA, STEPS_PER_DEGREE_DEC))
+        cmd.register("SEND_HOME_STEPS", self._send_home_steps)
+        cmd.register("RETURN_HOME", self._return_home)
+        cmd.register("TRNST", self._transit, *CommandRegistry.labelled_fields("TRNST", 2))
+        cmd.register("TRK", self._track, *CommandRegistry.labelled_fields("TRK", 5))
+        cmd.register("SKY-SCAN", self._sky_scan, *CommandRegistry.labelled_fields("SKY-SCAN", 5))
+        cmd.register("SKY-SCAN-MAP", self._sky_scan_map, schema=None)
+        cmd.register("COMMAND_STATS", self.commands.format_stats)  # Call counts and latencies of the commands
+        cmd.register("STARTUP_STATUS", Startup.status.format)  # Progress of the background initialization
+        cmd.register("MAGCAL", self._calibrate_mag, r'MAGCAL_%s' % CommandRegistry.NUMBER, ((1, float),))
+        cmd.register("MAGCAL_STATUS", self.pos_obj.mag_calibration_status)
+
+    def process(self, client_id: int, request: str, split_request=None):
+        self.log_data.debug("Process handler called, handle msg: %s" % request)  # Used for debugging purposes
+        self.client_id = client_id  # The client the handlers respond to
+        if self.motor_move is None:
+            command = self.commands.find(request)
+            if command is not None and command.name in HARDWARE_COMMANDS:
+                self.server.sendResponse.emit(client_id, "ERROR_NOT_READY_%s\n" % command.name)
+                return
+        response = self.commands.dispatch(request, split_request)
+        if response is not None:
+            self.server.sendResponse.emit(client_id, response)  # Send the response to the requesting client
+
+    def process_tokens(self, client_id: int, request: str, tokens: list):
+        """Process a request of the binary protocol, which arrives already split in its tokens"""
+        self.process(client_id, request, tokens)
+
+    def _connect_client(self):
+        self.client.reConnectSigC.emit()  # Attempt a client reconnection since the server should be running
+        return "Client notified to start\n"
+
+    def _start_sending_pos(self):
+        self.position_thread.start()  # Start the position report thread
+        return "STARTED_SENDING_POS\n"
+
+    def _stop_pos_send(self):
+        self.position_thread.quit()
+        return "POSITION_REPORTING_HALTED\n"
+
+    def _send_pos_update(self):
+        cur_pos = self.pos_obj.getPosition()  # Send an update of the current position
+        self.client.sendData.emit(BinaryProtocol.format_ascii("POSUPDATE", float(cur_pos[0]), float(cur_pos[1])))
+        return "POS_UPDT_SENT\n"
+
+    def _stop(self):  # TODO implement the stop request in a better way
+        if self.motor is not None:
+            self.motor.clean_io()  # Clean-up GPIO before exit
+        self.cfg_data.close()  # Write the pending step counts to the journal
+        sys.exit()  # Exit from the application as per request
+
+    def _manual_move(self, mode: str, freq: float, step_ra: int, step_dec: int):
+        # TODO implement the manual control in a better way
+        if mode == "MOVRA":
+            # TODO make the string more intuitive by including field names
+            self.motor_move.moveMotSig.emit("%s_%s_%d_%d" % (freq, freq, step_ra, 0))
+        elif mode == "MOVDEC":
+            self.motor_move.moveMotSig.emit("%s_%s_%d_%d" % (freq, freq, 0, step_dec))
+        elif mode == "MOVE":
+            self.motor_move.moveMotSig.emit("%s_%s_%d_%d" % (freq, freq, step_ra, step_dec))
+
+        if step_ra > step_dec:
+            return "MAX-STEPS-TO-DO_RA_%d" % step_ra
+        return "MAX-STEPS-TO-DO_DEC_%d" % step_dec
+
+    def _manual_stop(self):
+        self.motor_move.moveMotSig.emit("-1_-1_0_0")  # Send a negative frequency to indicate stopping
+
+    def _terminate(self):  # Send the required response for the successful termination
+        # TODO should we only do logging?
+        self.log_data.info("Client requested connection termination.")
+        self.server.sendResponse.emit(self.client_id, "Bye\n")
+        self.server.releaseClientSig.emit(self.client_id)  # Queued after the response, so it is sent before closing
+
+    def _calibrate_mag(self, duration: float):
+        if duration <= 0.0:
+            return "ERROR_MALFORMED_MAGCAL\n"
+        if self.pos_obj.calibrate_mag(duration):
+            return "MAGCAL_STARTED\n"  # The sensor has to be turned in every direction until the status is DONE
+        return "ERROR_NOT_READY_MAGCAL\n"
+
+    def _enable_motors(self):
+        self.motor.enabler(True)
+        return "MOTORS_ENABLED\n"
+
+    def _disable_motors(self):
+        self.motor.enabler(False)
+        return "MOTORS_DISABLED\n"
+
+    def _motor_status(self):
+        if self.motor.motor_status():
+            return "MOTORS_ENABLED\n"  # Return the status of motors (Enabled/Disabled)
+        return "MOTORS_DISABLED\n"
+
+    def _send_home_steps(self):
+        home_steps = self.cfg_data.get_steps()  # Get the saved steps
+        self.server.sendMessageClient.emit(self.client_id, "STEPS-FROM-HOME",
+                                           [int(home_steps[0]), int(home_steps[1])])
+        return None  # Already sent in the protocol of the client
+
+    def _return_home(self):  # Return to home position
+        home_steps = self.cfg_data.get_steps()  # Get the saved steps
+        self.slew(-int(home_steps[0]), -int(home_steps[1]))
+
+    def _transit(self, ra: float, dec: float):
+        cur_steps = self.cfg_data.get_steps()  # Read the current steps from home to compensate for it
+        ra_steps = ra * MotionCore.RA_STEPS_PER_DEGREE - float(cur_steps[0])
+        dec_steps = dec * MotionCore.DEC_STEPS_PER_DEGREE - float(cur_steps[1])
+        self.slew(ra_steps, dec_steps)
+
+    def _track(self, ra: float, dec: float, speed_ra: float, speed_dec: float, trk_time: float):
+        cur_steps = self.cfg_data.get_steps()  # Read the current steps from home to compensate for it
+        ra_steps = ra * MotionCore.RA_STEPS_PER_DEGREE - float(cur_steps[0])
+        dec_steps = dec * MotionCore.DEC_STEPS_PER_DEGREE - float(cur_steps[1])
+
+        self.trk_speed_ra = speed_ra
+        self.trk_speed_dec = speed_dec
+        self.trk_time = trk_time  # Get the total tracking time requested
+        self.slew(ra_steps, dec_steps)
+        self.tracking_command = True  # Enable the tracking command, so on motor stop the tracking is triggered
+
+    def _sky_scan(self, ra: float, dec: float, speed_ra: float, speed_dec: float, int_time: float):
+        # Store the scanning parameters in a named tuple. Format:
+        '''
+        Two dimensions:
+        a[0] = RA1 and DEC1
+        a[1] = RA2 and DEC2
+        a[2] = RA3 and DEC3
+        a[3] = RA4 and DEC4
+        a[4] = Step_size RA and DEC
+        a[6] = RA_speed and DEC_speed
+
+        One dimension:
+        a[5] = Direction_of_scanning
+        a[7] = Integration_time
+        '''
+        self.scan_params = self.scan_parameters((ra, dec), (speed_ra, speed_dec), int_time)
+
+        # Transit to position first, before sky scanning
+        cur_steps = self.cfg_data.get_steps()  # Read the current steps from home to compensate for it
+        ra_steps = float(self.scan_params.Point1[0]) * MotionCore.RA_STEPS_PER_DEGREE - float(cur_steps[0])
+        dec_steps = float(self.scan_params.Point1[1]) * MotionCore.DEC_STEPS_PER_DEGREE - float(cur_steps[1])
+
+        self.slew(ra_steps, dec_steps)
+        self.sky_scanning_command = True  # Enable the sky scanning command
+
+    def _sky_scan_map(self, split_request: list):
+        for i in range(1, len(split_request) - 1, 2):
+            self.scanning_map += ((split_request[i], split_request[i + 1]),)
+
+    def slew(self, ra_steps, dec_steps):
+        """Move the motors by the provided steps in a straight line, accelerating up to the maximum speed
+
+        Both motors arrive at the same moment, without exceeding the maximum speed and acceleration of either motor.
+
+        Args:
+            ra_steps: Steps of the RA motor, negative for the backward direction
+            dec_steps: Steps of the DEC motor, negative for the backward direction
+        """
+        limits = self.motor_move.limits
+        self.motor_move.moveMotSig.emit("%.1f_%.1f_%d_%d_LINE" % (limits[0].max_velocity, limits[1].max_velocity,
+                                                                  int(ra_steps), int(dec_steps)))
+
+    def tracker(self):
+        if self.tracking_command:
+            track_time = self.trk_time * 60  # Total tracking time in seconds
+            # Individual motor stepping frequencies
+            if (self.trk_speed_ra == 0.0) and (self.trk_speed_dec == 0.0):
+                freq1 = freq2 = 12  # Set a stellar tracking speed
+                ra_steps = 345600  # Enough steps to track for 8 hours
+                dec_steps = 0  # Declination is not changing is stellar objects, so we do not move this motor
+            else:
+                freq1 = 12 + self.trk_speed_ra * STEPS_PER_DEGREE_RA
+                freq2 = self.trk_speed_dec * STEPS_PER_DEGREE_DEC
+
+                ra_steps = track_time * freq1  # Calculate the necessary step number
+                dec_steps = track_time * freq2  # Calculate the necessary step number
+
+            self.tracking_command = False  # Reset tracking command
+            self.motor_move.moveMotSig.emit("%.1f_%.1f_%d_%d" % (freq1, freq2, int(ra_steps), int(dec_steps)))
+
+    def sky_scanner(self):
+        if self.sky_scanning_command:
+            if self.integrate is True:
+                track_time = float(self.scan_params.IntTime) * 60.0
+                if (self.scan_params.MotSpeeds[0] == 0.0) and (self.scan_params.MotSpeeds[1] == 0.0):
+                    freq1 = freq2 = 12
+                    ra_steps = freq1 * track_time
+                    dec_steps = 0
+                else:
+                    freq1 = 12 + self.scan_params.MotSpeeds[0]
+                    freq2 = self.scan_params.MotSpeeds[1]
+
+                    ra_steps = track_time * freq1
+                    dec_steps = track_time * freq2
+                self.integrate = False  # Get out of integration next time
+                self.motor_move.moveMotSig.emit("%.1f_%.1f_%d_%d" % (freq1, freq2, int(ra_steps), int(dec_steps)))
+            else:
+                if not self.point_count > len(self.scanning_map):
+                    current_steps = self.cfg_data.get_steps()  # Read the current steps from home to compensate for it
+                    ra_steps = float(self.scanning_map[self.point_count][0]) * MotionCore.RA_STEPS_PER_DEGREE - float(
+                        current_steps[0])
+                    dec_steps = float(self.scanning_map[self.point_count][1]) * MotionCore.\
+                        DEC_STEPS_PER_DEGREE - float(current_steps[1])
+                    self.slew(ra_steps, dec_steps)
+                    self.point_count += 1  # Increment the point count
+
+                    if float(self.scan_params.IntTime) > 0:
+                        self.integrate = True  # Indicate that integration is requested
+                else:
+                    self.point_count = 0
+                    self.scanning_map = ()  # Reset the tuple
+                    self.sky_scanning_command = False  # Indicate that scanning is done
+
+    def tracking_status(self, status: str):
+        if status == "STOPPED":
+            self.server.sendDataClient.emit("TRACKING_STOPPED\n")
+            self.server.publish.emit("TRACKING", "TRACKSTATE", [0])
+        elif status == "STARTED":
+            self.server.sendDataClient.emit("TRACKING_STARTED\n")
+            self.server.publish.emit("TRACKING", "TRACKSTATE", [1])
+
+    def step_update(self, data: list):
+        self.cfg_data.set_steps(data)
+
+    def position_update(self, position: list):
+        self.cfg_data.set_steps(["BOTH", position[2], position[3]])
+
+    def steps_flush(self):
+        self.cfg_data.flush_steps()
+
+    def action_reseter(self):
+        self.tracking_command = False
+        self.sky_scanning_command = False
+        self.integrate = False
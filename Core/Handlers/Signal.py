@@ -0,0 +1,52 @@
+import logging
+import threading
+
+
+class Signal:
+    """Qt-free replacement of ``pyqtSignal``, with the same ``connect``, ``disconnect`` and ``emit`` methods
+
+    The connected callables are called directly when the signal is emitted from the thread of the event loop. When it
+    is emitted from another thread, like the stepping engine thread, the calls are queued to the event loop, the same
+    way Qt queues the signals crossing threads.
+    """
+    _loop = None  # Event loop receiving the emits from the other threads
+    _loop_thread = None
+
+    def __init__(self):
+        self.log_data = logging.getLogger(__name__)
+        self._slots = []
+
+    @classmethod
+    def set_loop(cls, loop):
+        """Set the event loop of the application. Must be called from the thread running the loop.
+
+        Args:
+            loop: The asyncio event loop
+        """
+        cls._loop = loop
+        cls._loop_thread = threading.get_ident()
+
+    def connect(self, slot):
+        self._slots.append(slot)
+
+    def disconnect(self, slot=None):
+        """Disconnect a callable, or all of them if none is given"""
+        if slot is None:
+            self._slots = []
+        else:
+            self._slots = [item for item in self._slots if item != slot]
+
+    def emit(self, *args):
+        if self._loop is not None and threading.get_ident() != self._loop_thread:
+            self._loop.call_soon_threadsafe(self._call, args)
+        else:
+            self._call(args)
+
+    def _call(self, args):
+        for slot in tuple(self._slots):  # A slot may connect or disconnect others
+            try:
+                slot(*args)
+            except (SystemExit, KeyboardInterrupt):
+                raise
+            except Exception:
+                self.log_data.exception("Problem in a signal handler. See traceback.")
@@ -0,0 +1,332 @@
+import os
+import sys
+import time
+import logging
+import threading
+from array import array
+
+RA_AXIS = 0  # Axis identifier for the right ascension motor
+DEC_AXIS = 1  # Axis identifier for the declination motor
+
+SPIN_THRESHOLD_NS = 200000  # Busy-wait the last 200 us before a deadline instead of sleeping
+ENGINE_PRIORITY = 50  # Real-time priority requested for the stepping thread, if permitted
+SWITCH_INTERVAL = 0.0001  # Seconds a thread may hold the interpreter while the engine waits for it, during a motion
+SWITCH_THRESHOLD_NS = 20000000  # Lower the switch interval only for schedules with steps closer than 20 ms (50 Hz)
+
+HALF_STEPS = ((1, 0), (1, 1), (0, 1), (0, 0))  # Coil outputs for each phase of the motor sequence
+IDLE_PHASE = 3  # Phase of the coils after the GPIO initialization, where both outputs are low
+
+# Next phase index for each current phase index, one table per direction
+_TRANSITIONS = {
+    1: tuple((phase + 1) % len(HALF_STEPS) for phase in range(len(HALF_STEPS))),
+    -1: tuple((phase - 1) % len(HALF_STEPS) for phase in range(len(HALF_STEPS))),
+}
+
+
+def constant_schedule(frequency: float, steps: int):
+    """Build a step schedule for a constant stepping frequency
+
+    Args:
+        frequency (float): Stepping frequency in steps per second
+        steps (int): Number of steps to be done
+
+    Returns:
+        array: Intervals between successive steps in nanoseconds
+    """
+    if frequency <= 0.0:
+        raise ValueError("Stepping frequency must be positive, got %s" % frequency)
+    return array('q', [int(round(1e9 / frequency))]) * int(steps)
+
+
+class AxisStepper:
+    """Software phase state machine for the coils of one motor axis
+
+    The current phase is kept in memory, so a step is a table lookup followed by exactly one output write. The pins
+    are never read back.
+    """
+    __slots__ = ('write', 'phase', 'position')
+
+    def __init__(self, write, position=0, phase=IDLE_PHASE):
+        """Class constructor
+
+        Args:
+            write: Callable receiving the two coil output values, that writes them to the motor pins at once
+            position (int): Initial step count of the axis from the home position
+            phase (int): Initial phase index in :data:`HALF_STEPS`
+        """
+        self.write = write
+        self.phase = phase
+        self.position = int(position)
+
+    def step(self, direction: int):
+        """Advance the coils by one half-step
+
+        Args:
+            direction (int): 1 for a forward step and -1 for a backward step
+        """
+        self.phase = _TRANSITIONS[direction][self.phase]
+        self.write(*HALF_STEPS[self.phase])
+        self.position += direction
+
+
+class _AxisJob:
+    """Holds the progress of a single axis through its step schedule"""
+    __slots__ = ('axis', 'axes', 'direction', 'intervals', 'index', 'deadline', 'short')
+
+    def __init__(self, axis, direction, intervals, start_ns):
+        self.axis = axis
+        self.axes = (axis,)
+        self.direction = direction
+        self.intervals = intervals
+        self.index = 0
+        self.deadline = start_ns + intervals[0]
+        self.short = False  # Whether the schedule has intervals short enough to lower the switch interval
+
+    def fire(self, step_callback):
+        """Do the step that is due"""
+        step_callback(self.axis, self.direction)
+
+
+class _LineJob:
+    """Holds the progress of a coordinated move of both axes
+
+    The schedule belongs to the axis with the most steps, the major axis. The steps of the other axis are distributed
+    over the ticks of the major axis with an integer DDA, so both axes do their last step on the same tick and the
+    path is a straight line in step space.
+    """
+    __slots__ = ('axis', 'axes', 'minor', 'directions', 'major_steps', 'minor_steps', 'error', 'intervals', 'index',
+                 'deadline', 'short')
+
+    def __init__(self, directions, steps, intervals, start_ns):
+        self.axis = RA_AXIS if steps[RA_AXIS] >= steps[DEC_AXIS] else DEC_AXIS  # The major axis
+        self.minor = DEC_AXIS if self.axis == RA_AXIS else RA_AXIS
+        self.axes = (self.minor, self.axis)
+        self.directions = directions
+        self.major_steps = steps[self.axis]
+        self.minor_steps = steps[self.minor]
+        self.error = 0  # DDA accumulator
+        self.intervals = intervals
+        self.index = 0
+        self.deadline = start_ns + intervals[0]
+        self.short = False  # Whether the schedule has intervals short enough to lower the switch interval
+
+    def fire(self, step_callback):
+        """Do the step of the major axis that is due, and the step of the minor axis if it falls on this tick"""
+        step_callback(self.axis, self.directions[self.axis])
+        self.error += self.minor_steps
+        if self.error >= self.major_steps:
+            self.error -= self.major_steps
+            step_callback(self.minor, self.directions[self.minor])
+
+
+class StepEngine(threading.Thread):
+    """Dedicated stepping thread
+
+    Plays back precomputed step schedules, held as intervals in nanoseconds, against the monotonic clock. The wait for
+    each deadline is done with an interruptible sleep followed by a short busy-wait, so the pulse timing does not
+    depend on the Qt event loop.
+
+    The engine is still a Python thread, so after each wait it needs the interpreter lock back from the other threads,
+    which keep it for up to the switch interval of the interpreter, 5 ms by default. While an axis runs a schedule with
+    steps closer than ``switch_threshold_ns``, the engine lowers the switch interval of the whole process to
+    ``switch_interval``, and restores it once no such schedule is left. Busy threads still delay the steps by a few
+    switch intervals, see ``Benchmarks/stepping_benchmark.py --load``.
+
+    The lower interval makes the interpreter switch between the busy threads up to 50 times more often. It measured
+    within 1% of the throughput of two busy threads, but it applies to every thread of the process, so the slow
+    tracking schedules, where a 5 ms delay is small compared to the step interval, keep the default one.
+
+    The engine itself does not know about the hardware. It calls the provided step callback for every step and the
+    done callback when an axis has finished its schedule. Both callbacks run in the engine thread, with the step lock
+    held, so a :meth:`halt` waits for them and an axis is never reported as done after the halt has returned.
+    """
+
+    def __init__(self, step_callback, done_callback, deadline_callback=None, spin_ns=SPIN_THRESHOLD_NS,
+                 switch_interval=SWITCH_INTERVAL, switch_threshold_ns=SWITCH_THRESHOLD_NS):
+        """Class constructor
+
+        Args:
+            step_callback: Called with the axis and the direction (1 or -1) for every step
+            done_callback: Called with the axis when its schedule is complete
+            deadline_callback: Optional, called with the deadline in nanoseconds right before each step callback
+            spin_ns (int): Time before a deadline, in nanoseconds, where the thread stops sleeping and busy-waits
+            switch_interval (float): Switch interval of the interpreter in seconds while an axis moves, None to keep
+                the one of the process
+            switch_threshold_ns (int): Shortest step interval of a schedule, in nanoseconds, from which the switch
+                interval is kept as it is
+        """
+        super(StepEngine, self).__init__(name="StepEngine", daemon=True)
+        self.log_data = logging.getLogger(__name__)
+        self._step_callback = step_callback
+        self._done_callback = done_callback
+        self._deadline_callback = deadline_callback
+        self._spin_ns = spin_ns
+        self._switch_interval = switch_interval
+        self._switch_threshold_ns = switch_threshold_ns
+        self._idle_interval = None  # Switch interval of the process to restore once the motion stops, while it moves
+
+        self._jobs = {}  # Active jobs, one per axis
+        self._cond = threading.Condition()  # Guards the job table and wakes the thread on changes
+        self._step_lock = threading.RLock()  # Held during a step and its done callback, so a halt is synchronous
+        self._wake = threading.Event()  # Interrupts the sleep phase when the jobs change
+        self._closing = False
+
+    def add_job(self, axis: int, direction: int, intervals):
+        """Start moving an axis according to the provided schedule
+
+        Any job already running on the same axis is replaced. The first step is done one interval after this call.
+
+        Args:
+            axis (int): The axis to move, :data:`RA_AXIS` or :data:`DEC_AXIS`
+            direction (int): 1 for forward and -1 for backward movement
+            intervals: Sequence of step intervals in nanoseconds
+
+        Raises:
+            RuntimeError: If the axis is part of a coordinated move, which replacing would stop on the other axis too
+        """
+        if len(intervals) == 0:
+            return
+        with self._cond:
+            if isinstance(self._jobs.get(axis), _LineJob):
+                raise RuntimeError("Axis %d is part of a coordinated move, halt it first" % axis)
+            self._remove(axis)
+            self._jobs[axis] = self._classify(_AxisJob(axis, direction, intervals, time.monotonic_ns()))
+            self._wake.set()
+            self._cond.notify()
+
+    def add_line_job(self, directions, steps, intervals):
+        """Start a coordinated move of both axes, driven from a single time base
+
+        Any job already running on either axis is replaced. Both axes finish on the same tick.
+
+        Args:
+            directions (tuple): Direction of each axis, 1 or -1, indexed by the axis identifiers
+            steps (tuple): Number of steps of each axis, indexed by the axis identifiers
+            intervals: Schedule of the axis with the most steps, in nanoseconds. Its length must be equal to that
+                number of steps
+        """
+        if len(intervals) != max(steps):
+            raise ValueError("The schedule must have one interval per step of the major axis")
+        if len(intervals) == 0:
+            return
+        with self._cond:
+            self._remove(RA_AXIS)
+            self._remove(DEC_AXIS)
+            job = self._classify(_LineJob(directions, steps, intervals, time.monotonic_ns()))
+            self._jobs[RA_AXIS] = self._jobs[DEC_AXIS] = job
+            self._wake.set()
+            self._cond.notify()
+
+    def is_moving(self, axis: int):
+        """Check whether the given axis has an active schedule"""
+        return axis in self._jobs
+
+    def halt(self):
+        """Stop all the axes immediately
+
+        Returns only after any step that is already executing has completed, together with its done callback. The done
+        callback is not called for the halted axes. It may be called from the callbacks of the engine.
+        """
+        with self._step_lock:
+            with self._cond:
+                self._jobs.clear()
+                self._wake.set()
+
+    def close(self):
+        """Halt the motion and terminate the engine thread"""
+        self.halt()
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+
+    def run(self):
+        self._raise_priority()
+        while True:
+            with self._cond:
+                if not self._jobs:
+                    self._restore_switch_interval()
+                while not self._jobs and not self._closing:
+                    self._cond.wait()
+                if self._closing:
+                    return
+                if any(item.short for item in self._jobs.values()):
+                    self._lower_switch_interval()
+                else:
+                    self._restore_switch_interval()
+                job = min(self._jobs.values(), key=lambda item: item.deadline)  # A line job appears twice
+                self._wake.clear()
+
+            if not self._wait_until(job.deadline):
+                continue  # The jobs changed while waiting, so get the next deadline again
+
+            with self._step_lock:
+                if self._jobs.get(job.axis) is not job:
+                    continue  # Halted or replaced while waiting
+                try:
+                    if self._deadline_callback is not None:
+                        self._deadline_callback(job.deadline)
+                    job.fire(self._step_callback)
+                except Exception:
+                    self.log_data.exception("Problem executing a motor step. See traceback.")
+                with self._cond:
+                    job.index += 1
+                    finished = job.index >= len(job.intervals)
+                    if finished:
+                        self._remove(job.axis)
+                    else:
+                        job.deadline += job.intervals[job.index]
+                if finished:  # Still under the step lock, so a halt cannot come between the last step and the report
+                    for axis in job.axes:
+                        try:
+                            self._done_callback(axis)
+                        except Exception:
+                            self.log_data.exception("Problem reporting a finished motor schedule. See traceback.")
+
+    def _remove(self, axis: int):
+        """Remove the job of an axis, from all the axes it drives. Must be called with the condition held."""
+        job = self._jobs.get(axis)
+        if job is not None:
+            for item in job.axes:
+                del self._jobs[item]
+
+    def _wait_until(self, deadline: int):
+        """Wait until the provided monotonic time
+
+        Args:
+            deadline (int): Monotonic time in nanoseconds
+
+        Returns:
+            bool: False if the wait was interrupted by a change in the jobs, True otherwise
+        """
+        remaining = deadline - time.monotonic_ns()
+        while remaining > self._spin_ns:
+            if self._wake.wait((remaining - self._spin_ns) / 1e9):
+                return False
+            remaining = deadline - time.monotonic_ns()
+        while time.monotonic_ns() < deadline:
+            pass
+        return True
+
+    def _classify(self, job):
+        """Mark a new job whose schedule needs the lower switch interval, and return it"""
+        job.short = self._switch_interval is not None and min(job.intervals) < self._switch_threshold_ns
+        return job
+
+    def _lower_switch_interval(self):
+        """Shorten the time other threads may hold the interpreter, at the start of a fast motion"""
+        if self._switch_interval is not None and self._idle_interval is None:
+            self._idle_interval = sys.getswitchinterval()
+            sys.setswitchinterval(self._switch_interval)
+
+    def _restore_switch_interval(self):
+        """Give the process its own switch interval back, once no fast motion is left"""
+        if self._idle_interval is not None:
+            sys.setswitchinterval(self._idle_interval)
+            self._idle_interval = None
+
+    def _raise_priority(self):
+        """Request real-time scheduling for the engine thread, when the system permits it"""
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(ENGINE_PRIORITY))
+        except (AttributeError, OSError):
+            self.log_data.debug("Real-time priority not available for the stepping thread")
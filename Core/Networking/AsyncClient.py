@@ -0,0 +1,94 @@
+import asyncio
+import logging
+from Core.Handlers.Signal import Signal
+from Core.Networking import SendQueue, Reconnect
+from Core.Networking.AsyncServer import stream_queue
+
+
+class AsyncClient:
+    """The TCP client of the asyncio runtime, with the same signals and reconnection policy as
+    :class:`TCPClient.TCPClient`
+    """
+
+    def __init__(self, cfg_data):
+        """Initialize the class by providing the configuration data object
+
+        Args:
+            cfg_data: Configuration data object
+        """
+        # Create the signals to be used for data handling
+        self.dataRcvSigC = Signal()  # Send the received data out
+        self.sendData = Signal()  # Data to be sent to the server
+        self.sendTelemetry = Signal()  # Key and data, only the latest is kept
+        self.reConnectSigC = Signal()  # A reconnection request
+
+        self.cfg_data = cfg_data  # Create a variable for the cfg file
+        self.log_data = logging.getLogger(__name__)  # Create the logger
+        self.state = Reconnect.DISCONNECTED
+        self.backoff = Reconnect.Backoff()
+        self.queue = SendQueue.SendQueue(max_control=Reconnect.MAX_BUFFERED)  # Outbound messages, kept when offline
+        self._task = None  # Connection task
+        self._retry_now = None  # Set to cut the backoff delay short
+
+    def start(self):
+        # Connected once, so the messages are queued in any state
+        self.sendData.connect(self.send_data)
+        self.sendTelemetry.connect(self.send_telemetry)
+        self.reConnectSigC.connect(self.connect)  # Do the reconnect signal connection
+        self._retry_now = asyncio.Event()
+        self._task = asyncio.ensure_future(self._run())
+
+    def connect(self):
+        """Connect now, unless connected or already trying. A pending retry is started right away."""
+        if self.state == Reconnect.WAITING:
+            self.backoff.reset()
+            self._retry_now.set()
+
+    async def _run(self):
+        """Keep the connection up, retrying with the backoff whenever it fails"""
+        while True:
+            self._retry_now.clear()
+            await self._connection()
+            self.state = Reconnect.WAITING
+            delay = self.backoff.next()
+            self.log_data.info("Reconnecting to the server in %.1f s" % delay)
+            try:
+                await asyncio.wait_for(self._retry_now.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _connection(self):
+        """Make one connection attempt and serve the connection until it is lost"""
+        # Get the host and port from the settings file for the client connection
+        host = self.cfg_data.get_client_host()
+        port = self.cfg_data.get_client_port()
+
+        self.state = Reconnect.CONNECTING
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, int(port)),
+                                                    Reconnect.CONNECT_TIMEOUT)
+        except (OSError, asyncio.TimeoutError) as excep:
+            self.log_data.warning("Some error occurred in client: %s" % (excep or "connection timed out"))
+            return
+
+        self.state = Reconnect.CONNECTED
+        self.backoff.reset()
+        stream_queue(writer, self.queue)  # Sends what was queued while disconnected
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.dataRcvSigC.emit(line.decode('utf-8', 'replace').rstrip('\n'))
+        except (ConnectionError, ValueError) as excep:
+            self.log_data.warning("Some error occurred in client: %s" % excep)
+        finally:
+            self.queue.detach()  # Keep the messages until the connection is up again
+            writer.close()
+        self.log_data.warning("Lost the connection to the server")
+
+    def send_data(self, data: str):
+        self.queue.push(data.encode('utf-8'))  # Written as the stream drains, kept while disconnected
+
+    def send_telemetry(self, key: str, data: str):
+        self.queue.push(data.encode('utf-8'), key)  # Replaces any unsent message with the same key
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+from Core import Startup
+from Core.Handlers.Signal import Signal
+from Core.Networking import SendQueue
+from Core.Networking.Sessions import ServerCore, HOLD_CHECK_INTERVAL
+
+READ_SIZE = 4096  # Maximum bytes read at once from a client in the binary protocol
+
+
+def stream_queue(writer, queue=None):
+    """Attach a send queue to an asyncio stream
+
+    The high water mark of the transport is set just below the window of the queue, so the transport is paused
+    whenever the queue holds messages back. The queue is then flushed again once the transport has drained, the same
+    way the Qt sockets flush it on ``bytesWritten``.
+
+    Args:
+        writer: The stream writer of the connection
+        queue (SendQueue.SendQueue): The queue to attach, or None for a new one
+
+    Returns:
+        SendQueue.SendQueue: The queue writing to the stream
+    """
+    if queue is None:
+        queue = SendQueue.SendQueue()
+    transport = writer.transport
+    transport.set_write_buffer_limits(high=SendQueue.WRITE_WINDOW - 1)
+    waiting = []  # The drain task, while there is one
+
+    async def drained():
+        try:
+            await writer.drain()
+        except ConnectionError:
+            return  # The connection is closing, nothing more to write
+        finally:
+            waiting.clear()
+        queue.flush()
+
+    def pending():
+        size = transport.get_write_buffer_size()
+        if size >= queue.window and not waiting and not transport.is_closing():
+            waiting.append(asyncio.ensure_future(drained()))
+        return size
+
+    queue.attach(writer.write, pending)
+    queue.flush()  # Write anything queued before the attachment
+    return queue
+
+
+class AsyncServer(ServerCore):
+    """The TCP server of the asyncio runtime, with the same signals and protocol as :class:`TCPServer.TCPServer`"""
+
+    def __init__(self, cfg):
+        # Create the signals to be used for data handling
+        self.sendDataClient = Signal()  # Send the data to all the clients
+        self.sendResponse = Signal()  # Send the data to one client
+        self.sendMessageClient = Signal()  # Message of the binary table
+        self.publish = Signal()  # Topic, message name and fields of an update
+        self.releaseClientSig = Signal()  # Close the connection of a client
+        self.requestProcess = Signal()  # Send the received data for processing
+        self.requestTokens = Signal()  # Send a decoded binary request
+        self.clientDisconnected = Signal()  # Report that the last client disconnected
+
+        self.host = cfg.get_host()  # Get the TCP connection host
+        self.port = cfg.get_port()  # Get the server port from the settings file
+        self._setup_sessions()
+        self.log_data = logging.getLogger(__name__)  # Create the necessary logger
+        self.tcp_server = None
+        self._hold_task = None  # Sends the held back updates
+
+    async def start(self):
+        """Start listening for connections. Must be awaited from the event loop."""
+        self.sendDataClient.connect(self.send)  # Connect the signal trigger for data sending
+        self.sendResponse.connect(self.send_response)
+        self.sendMessageClient.connect(self.send_message)
+        self.publish.connect(self._publish)
+        self.releaseClientSig.connect(self.releaseClient)
+
+        # Listen on the loopback only for localhost, otherwise on every interface
+        host = self.host if self.host == "localhost" else None
+        self.tcp_server = await asyncio.start_server(self._new_connection, host, int(self.port))
+        Startup.status.mark("LISTEN")
+        self._hold_task = asyncio.ensure_future(self._hold_timer())
+
+    async def serve_forever(self):
+        await self.tcp_server.serve_forever()
+
+    def close(self):
+        """Stop listening for connections and sending the held back updates"""
+        if self._hold_task is not None:
+            self._hold_task.cancel()
+            self._hold_task = None
+        if self.tcp_server is not None:
+            self.tcp_server.close()
+            self.tcp_server = None
+
+    async def _hold_timer(self):
+        """Send the updates held back by the subscription rates, at the same interval as the Qt server"""
+        while True:
+            await asyncio.sleep(HOLD_CHECK_INTERVAL / 1000.0)
+            self._send_held()
+
+    async def _new_connection(self, reader, writer):
+        """Serve one client, from its connection until it leaves"""
+        session = self._add_session(stream_queue(writer), writer)
+        try:
+            while True:
+                if session.binary_mode:
+                    data = await reader.read(READ_SIZE)
+                    if not data:
+                        break
+                    self._receive_frames(session, data)
+                else:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    try:
+                        self._receive_line(session, line.decode('utf-8').rstrip('\n'))
+                    except UnicodeDecodeError:
+                        self.log_data.warning("Client %d sent a line that is not valid text" % session.client_id)
+        except (ConnectionError, ValueError) as excep:
+            self.log_data.warning("Some error occurred in client %d: %s" % (session.client_id, excep))
+        finally:
+            writer.close()
+            self._remove_session(session)
+
+    def releaseClient(self, client_id: int):
+        """Close the connection of a client, after sending everything queued for it
+
+        Args:
+            client_id (int): Identifier of the client
+        """
+        session = self.sessions.get(client_id)
+        if session is not None:
+            session.queue.drain()
+            session.connection.close()  # The transport sends the buffered data before closing
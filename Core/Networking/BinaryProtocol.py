@@ -0,0 +1,160 @@
+"""Length-prefixed binary framing, used by the server after a client negotiates it
+
+Every frame is a header, holding the payload length and the message type code, followed by the payload. The payload
+of each message type is a fixed set of fields packed with :mod:`struct`, as described in the message table. Messages
+without an entry in the table, like most responses, are sent as ``TEXT`` frames holding the ASCII line.
+
+A client switches a connection to the binary mode by sending the ASCII line ``BINARY_MODE``. The server answers with
+``BINARY_MODE_OK`` in ASCII and every following frame, in both directions, is binary.
+"""
+
+import struct
+import logging
+from collections import namedtuple
+
+NEGOTIATE_REQUEST = "BINARY_MODE"  # ASCII request that switches a connection to the binary mode
+NEGOTIATE_RESPONSE = "BINARY_MODE_OK\n"  # ASCII response confirming the switch
+
+HEADER = struct.Struct('<HB')  # Payload length and message type code
+MAX_PAYLOAD = 0xFFFF
+
+TEXT = 0x00  # Type code of a message holding an ASCII line
+
+MessageType = namedtuple('MessageType', 'code name struct tokens ascii')
+
+# Message table as (code, name, struct format, request tokens, ASCII format). The request tokens give the token list
+# of the equivalent ASCII request, where an integer is replaced by the field with that index. The ASCII format builds
+# the equivalent ASCII line from the fields.
+_TABLE = (
+    # Requests
+    (0x01, "CONNECT_CLIENT", "", ("CONNECT_CLIENT",), None),
+    (0x02, "START_SENDING_POS", "", ("START_SENDING_POS",), None),
+    (0x03, "STOP_POS_SEND", "", ("STOP_POS_SEND",), None),
+    (0x04, "SEND_POS_UPDATE", "", ("SEND_POS_UPDATE",), None),
+    (0x05, "STOP", "", ("STOP",), None),
+    (0x06, "Test", "", ("Test",), None),
+    (0x07, "Terminate", "", ("Terminate",), None),
+    (0x08, "Quit", "", ("Quit",), None),
+    (0x09, "ENABLE_MOTORS", "", ("ENABLE_MOTORS",), None),
+    (0x0A, "DISABLE_MOTORS", "", ("DISABLE_MOTORS",), None),
+    (0x0B, "REPORT_MOTOR_STATUS", "", ("REPORT_MOTOR_STATUS",), None),
+    (0x0C, "TRKNGSTAT", "", ("TRKNGSTAT",), None),
+    (0x0D, "SCALE", "", ("SCALE",), None),
+    (0x0E, "SEND_HOME_STEPS", "", ("SEND_HOME_STEPS",), None),
+    (0x0F, "RETURN_HOME", "", ("RETURN_HOME",), None),
+    (0x10, "TRNST", "<dd", ("TRNST", "RA", 0, "DEC", 1), None),
+    (0x11, "TRK", "<ddddd", ("TRK", "RA", 0, "DEC", 1, "RASPEED", 2, "DECSPEED", 3, "TIME", 4), None),
+    (0x12, "SKY-SCAN", "<ddddd", ("SKY-SCAN", "RA", 0, "DEC", 1, "RASPEED", 2, "DECSPEED", 3, "INT", 4), None),
+    (0x13, "MANCONT_MOVRA", "<dqq", ("MANCONT", "MOVRA", 0, 1, 2), None),
+    (0x14, "MANCONT_MOVDEC", "<dqq", ("MANCONT", "MOVDEC", 0, 1, 2), None),
+    (0x15, "MANCONT_MOVE", "<dqq", ("MANCONT", "MOVE", 0, 1, 2), None),
+    (0x16, "MANCONT_STOP", "", ("MANCONT", "STOP"), None),
+
+    # Telemetry and structured responses
+    (0x40, "DISHPOS", "<ddqqd", None, "DISHPOS_RA_%.5f_DEC_%.5f_STEPS_RA_%d_DEC_%d_TIME_%.3f\n"),
+    (0x41, "POSUPDATE", "<dd", None, "POSUPDATE_RA_%.5f_DEC_%.5f\n"),
+    (0x42, "STEPS-FROM-HOME", "<qq", None, "STEPS-FROM-HOME_%d_%d\n"),
+    (0x43, "MOTORSTATE", "<B", None, "MOTORSTATE_%d\n"),
+    (0x44, "TRACKSTATE", "<B", None, "TRACKSTATE_%d\n"),
+)
+
+# Messages where only the latest one matters, so unsent ones can be replaced
+TELEMETRY = frozenset(("DISHPOS", "MOTORSTATE", "TRACKSTATE"))
+
+MESSAGES = {}  # Message types by name
+_BY_CODE = {}  # Message types by type code
+for _code, _name, _format, _tokens, _ascii in _TABLE:
+    MESSAGES[_name] = _BY_CODE[_code] = MessageType(_code, _name, struct.Struct(_format), _tokens, _ascii)
+
+
+def encode(name: str, *values):
+    """Build the binary frame of a message in the table
+
+    Args:
+        name (str): Name of the message type
+        *values: The fields of the message, in the order of its format
+
+    Returns:
+        bytes: The frame, ready to be written to the socket
+    """
+    message = MESSAGES[name]
+    payload = message.struct.pack(*values)
+    return HEADER.pack(len(payload), message.code) + payload
+
+
+def encode_text(line: str):
+    """Build the ``TEXT`` frame of an ASCII line
+
+    Args:
+        line (str): The line, with or without the trailing new line
+
+    Returns:
+        bytes: The frame, ready to be written to the socket
+    """
+    payload = line.rstrip('\n').encode('utf-8')[:MAX_PAYLOAD]
+    return HEADER.pack(len(payload), TEXT) + payload
+
+
+def format_ascii(name: str, *values):
+    """Build the ASCII line of a message in the table
+
+    Args:
+        name (str): Name of the message type
+        *values: The fields of the message, in the order of its format
+
+    Returns:
+        str: The line, including the trailing new line
+    """
+    return MESSAGES[name].ascii % values
+
+
+class FrameDecoder:
+    """Incremental decoder of the received binary frames
+
+    The received bytes are fed as they arrive. Each complete frame is decoded to the request string and the request
+    token list that the request handler expects, so no string splitting is needed for the typed messages.
+    """
+
+    def __init__(self):
+        self.log_data = logging.getLogger(__name__)
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes):
+        """Add received bytes and decode all the complete frames
+
+        Args:
+            data (bytes): The received bytes
+
+        Returns:
+            list: ``(request, tokens)`` for each decoded frame. For ``TEXT`` frames the request is the ASCII line and
+            the tokens are None. Frames with an unknown type code or a payload of the wrong size are logged and
+            dropped.
+        """
+        self._buffer.extend(data)
+        decoded = []
+        offset = 0
+        while len(self._buffer) - offset >= HEADER.size:
+            length, code = HEADER.unpack_from(self._buffer, offset)
+            end = offset + HEADER.size + length
+            if end > len(self._buffer):
+                break  # Incomplete frame, wait for the rest
+            payload = bytes(self._buffer[offset + HEADER.size:end])
+            offset = end
+            try:
+                decoded.append(self._decode(code, payload))
+            except (ValueError, UnicodeDecodeError):
+                self.log_data.warning("Dropped an invalid binary frame of type 0x%02X" % code)
+        del self._buffer[:offset]
+        return decoded
+
+    @staticmethod
+    def _decode(code: int, payload: bytes):
+        if code == TEXT:
+            return payload.decode('utf-8'), None
+        message = _BY_CODE.get(code)
+        if message is None or message.tokens is None:
+            raise ValueError("Unknown request type code 0x%02X" % code)
+        if len(payload) != message.struct.size:
+            raise ValueError("Wrong payload size %d for %s" % (len(payload), message.name))
+        values = message.struct.unpack(payload)
+        return message.name, [values[item] if isinstance(item, int) else item for item in message.tokens]
@@ -0,0 +1,53 @@
+"""Reconnection policy shared by the Qt and the asyncio clients"""
+
+import random
+
+INITIAL_DELAY = 0.5  # Seconds before the first retry
+MAX_DELAY = 30.0  # Longest wait between two retries, in seconds
+FACTOR = 2.0  # Growth of the delay after every failed attempt
+
+CONNECT_TIMEOUT = 1.0  # Seconds to wait for a connection attempt before retrying
+MAX_BUFFERED = 256  # Messages kept while disconnected, the oldest are dropped above it
+
+# Connection states
+DISCONNECTED = "DISCONNECTED"  # Not started yet
+CONNECTING = "CONNECTING"  # A connection attempt is in progress
+CONNECTED = "CONNECTED"
+WAITING = "WAITING"  # Waiting for the backoff delay before the next attempt
+
+
+class Backoff:
+    """Exponential backoff with jitter, for the reconnection attempts
+
+    The delay doubles after every failed attempt, up to a maximum. A random part of it is removed, so clients that
+    lost the connection together do not retry together.
+    """
+
+    def __init__(self, initial=INITIAL_DELAY, maximum=MAX_DELAY, factor=FACTOR, jitter=0.5):
+        """Class constructor
+
+        Args:
+            initial (float): Delay before the first retry, in seconds
+            maximum (float): Longest delay, in seconds
+            factor (float): Growth of the delay after every attempt
+            jitter (float): Largest fraction of the delay that is randomly removed, between 0 and 1
+        """
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self.attempts = 0  # Failed attempts since the last reset
+
+    def next(self):
+        """Delay before the next attempt, counting one more failed attempt
+
+        Returns:
+            float: The delay in seconds
+        """
+        delay = min(self.maximum, self.initial * self.factor ** self.attempts)
+        self.attempts += 1
+        return delay * (1.0 - self.jitter * random.random())
+
+    def reset(self):
+        """Start over from the initial delay, after a successful connection"""
+        self.attempts = 0
@@ -0,0 +1,110 @@
+import logging
+from collections import deque, OrderedDict
+
+WRITE_WINDOW = 16384  # Bytes allowed in the socket buffer before the queued messages are held back
+MAX_TELEMETRY_KEYS = 32  # Number of distinct telemetry streams that can be pending at once
+NOT_CONNECTED = float('inf')  # Unsent bytes reported while detached, so everything stays queued
+
+
+class SendQueue:
+    """Outbound message queue of one connection
+
+    The messages are written to the socket only while the socket has less than a window of unsent bytes, so a slow
+    peer never makes the socket buffer grow without limit and nothing ever waits for the data to be written. The queue
+    is flushed again whenever the socket reports written bytes.
+
+    There are two priority classes. Control messages, like the command responses, are kept in order and never dropped.
+    Telemetry messages have a key and only the latest message of each key is kept, so under backpressure the old
+    position updates are replaced by the new ones. Control messages are always written first.
+
+    A queue without a socket keeps everything until one is attached, like a client waiting to reconnect. Such a queue
+    should have a bound on the control messages, above which the oldest ones are dropped.
+    """
+
+    def __init__(self, write=None, pending=None, window=WRITE_WINDOW, max_keys=MAX_TELEMETRY_KEYS, max_control=None):
+        """Class constructor
+
+        Args:
+            write: Called with the bytes to write to the socket, or None to start detached
+            pending: Returns the number of bytes the socket has not sent yet
+            window (int): Maximum number of unsent bytes in the socket before the queue holds the messages back
+            max_keys (int): Maximum number of pending telemetry keys, the oldest one is dropped above it
+            max_control (int): Maximum number of pending control messages, or None for no limit
+        """
+        self.log_data = logging.getLogger(__name__)
+        self.window = window
+        self.max_keys = max_keys
+        self.attach(write, pending)
+
+        self._control = deque(maxlen=max_control)  # Control messages in order of submission
+        self._telemetry = OrderedDict()  # Latest message of each telemetry key, oldest key first
+        self.coalesced = 0  # Number of telemetry messages replaced by a newer one before they were sent
+        self.dropped = 0  # Number of control messages dropped because the queue was full
+
+    def attach(self, write, pending):
+        """Write to a socket, like after a connection. The queued messages are written once it is flushed.
+
+        Args:
+            write: Called with the bytes to write to the socket, or None to detach
+            pending: Returns the number of bytes the socket has not sent yet
+        """
+        if write is None:
+            self.detach()
+        else:
+            self._write = write
+            self._pending = pending
+
+    def detach(self):
+        """Stop writing and keep the messages queued, like when the connection is lost"""
+        self._write = None
+        self._pending = lambda: NOT_CONNECTED
+
+    def push(self, data: bytes, key=None):
+        """Queue a message and write as much of the queue as the window allows
+
+        Args:
+            data (bytes): The encoded message
+            key (str): Telemetry key of the message, or None for a control message
+        """
+        if key is None:
+            if len(self._control) == self._control.maxlen:
+                self.dropped += 1  # The oldest is pushed out
+            self._control.append(data)
+        else:
+            if key in self._telemetry:
+                self.coalesced += 1
+            elif len(self._telemetry) >= self.max_keys:
+                self._telemetry.popitem(last=False)
+                self.coalesced += 1
+            self._telemetry[key] = data  # Latest value wins and keeps the place of the key
+        self.flush()
+
+    def flush(self, *_args):
+        """Write the queued messages while the socket buffer is below the window
+
+        It accepts and ignores any arguments, so it can be connected directly to the ``bytesWritten`` signal.
+        """
+        try:
+            while self._pending() < self.window:
+                if self._control:
+                    self._write(self._control.popleft())
+                elif self._telemetry:
+                    self._write(self._telemetry.popitem(last=False)[1])
+                else:
+                    break
+        except Exception:
+            self.log_data.exception("Problem writing the queued messages. See traceback.")
+
+    def drain(self):
+        """Write everything queued, ignoring the window, like before closing the connection"""
+        window, self.window = self.window, float('inf')
+        self.flush()
+        self.window = window
+
+    def clear(self):
+        """Drop everything queued, like when the connection closes"""
+        self._control.clear()
+        self._telemetry.clear()
+
+    def __len__(self):
+        return len(self._control) + len(self._telemetry)
@@ -0,0 +1,210 @@
+import time
+import logging
+from Core.Networking import BinaryProtocol
+
+TOPICS = ("POSITION", "MOTOR", "TRACKING")  # Topics the clients can subscribe to
+HOLD_CHECK_INTERVAL = 50  # Milliseconds between the checks for updates held back by a subscription rate
+
+
+class Update:
+    """A published update, encoded at most once for each protocol however many clients receive it"""
+    __slots__ = ('topic', 'name', 'values', '_ascii', '_binary')
+
+    def __init__(self, topic, name, values):
+        self.topic = topic
+        self.name = name
+        self.values = values
+        self._ascii = None
+        self._binary = None
+
+    def encoded(self, binary: bool):
+        if binary:
+            if self._binary is None:
+                self._binary = BinaryProtocol.encode(self.name, *self.values)
+            return self._binary
+        if self._ascii is None:
+            self._ascii = BinaryProtocol.format_ascii(self.name, *self.values).encode('utf-8')
+        return self._ascii
+
+
+class ClientSession:
+    """State of a connected client: its connection, protocol, outbound queue and subscriptions"""
+
+    def __init__(self, client_id: int, queue, connection=None):
+        """Class constructor
+
+        Args:
+            client_id (int): Identifier of the client
+            queue (SendQueue.SendQueue): Outbound queue writing to the connection
+            connection: The socket or stream writer of the client, kept for the server that owns it
+        """
+        self.client_id = client_id
+        self.connection = connection
+        self.binary_mode = False  # True after the client has negotiated the binary protocol
+        self.decoder = BinaryProtocol.FrameDecoder()
+        self.queue = queue
+        self.subscriptions = {}  # Minimum interval in nanoseconds between the updates, by topic
+        self.last_sent = {}  # Time of the last update sent, by topic
+        self.held = {}  # Latest update not yet sent because of the subscription rate, by topic
+
+    def send(self, data: str):
+        """Queue a text line, in the protocol of the client"""
+        if self.binary_mode:
+            self.queue.push(BinaryProtocol.encode_text(data))
+        else:
+            self.queue.push(data.encode('utf-8'))
+
+    def offer(self, update: Update, now: int):
+        """Send a published update if the client is subscribed, respecting its rate"""
+        interval = self.subscriptions.get(update.topic)
+        if interval is None:
+            return
+        if now - self.last_sent.get(update.topic, 0) >= interval:
+            self.held.pop(update.topic, None)
+            self.last_sent[update.topic] = now
+            self.queue.push(update.encoded(self.binary_mode), update.topic)  # Coalesced under backpressure
+        else:
+            self.held[update.topic] = update  # Only the latest one is sent when the interval has passed
+
+
+class ServerCore:
+    """Client sessions, subscriptions and message routing, shared by the Qt and the asyncio servers
+
+    The class using it provides the ``requestProcess``, ``requestTokens`` and ``clientDisconnected`` signals, and
+    feeds the received data to :meth:`_receive_line` or :meth:`_receive_frames`, depending on the client protocol.
+    """
+
+    def _setup_sessions(self):
+        self.sessions = {}  # Connected clients by their identifier
+        self._next_id = 1
+        self.log_data = logging.getLogger(__name__)  # Create the necessary logger
+
+        # Requests handled by the server itself, since they concern the connection and not the telescope
+        self._session_commands = {
+            "SUBSCRIBE": self._subscribe,
+            "UNSUBSCRIBE": self._unsubscribe,
+        }
+
+    def _add_session(self, queue, connection):
+        """Create and register the session of a new client
+
+        Args:
+            queue (SendQueue.SendQueue): Outbound queue writing to the connection
+            connection: The socket or stream writer of the client
+
+        Returns:
+            ClientSession: The new session
+        """
+        session = ClientSession(self._next_id, queue, connection)
+        self._next_id += 1
+        self.sessions[session.client_id] = session
+        self.log_data.info("Client %d connected on server, %d connected" % (session.client_id, len(self.sessions)))
+        return session
+
+    def _remove_session(self, session: ClientSession):
+        """Forget a client whose connection is closed"""
+        session.queue.clear()  # Nobody to send the pending messages to
+        self.sessions.pop(session.client_id, None)
+        self.log_data.info("Client %d disconnected, %d connected" % (session.client_id, len(self.sessions)))
+        if not self.sessions:
+            self.clientDisconnected.emit()  # Nobody is in control of the telescope any more
+
+    def _receive_line(self, session: ClientSession, rec_data: str):
+        """Handle an ASCII line received from a client in the text protocol"""
+        if rec_data == BinaryProtocol.NEGOTIATE_REQUEST:
+            session.queue.push(BinaryProtocol.NEGOTIATE_RESPONSE.encode('utf-8'))
+            session.binary_mode = True  # Everything after the negotiation is framed
+        else:
+            self._handle_request(session, rec_data)
+
+    def _receive_frames(self, session: ClientSession, data: bytes):
+        """Handle bytes received from a client in the binary protocol"""
+        for request, tokens in session.decoder.feed(data):
+            if tokens is None:
+                self._handle_request(session, request)  # Text frame, handled like an ASCII line
+            else:
+                self.requestTokens.emit(session.client_id, request, tokens)
+
+    def _handle_request(self, session: ClientSession, request: str):
+        """Handle the connection requests here and send the rest to be processed"""
+        command = self._session_commands.get(request.partition("_")[0])
+        if command is not None:
+            session.send(command(session, request))
+        else:
+            self.requestProcess.emit(session.client_id, request)  # Send the received data to be processed
+
+    def _subscribe(self, session: ClientSession, request: str):
+        """Handle ``SUBSCRIBE_<topic>[_<rate in Hz>]``, without a rate every update is sent"""
+        fields = request.split("_")
+        try:
+            if len(fields) not in (2, 3) or fields[1] not in TOPICS:
+                raise ValueError
+            rate = float(fields[2]) if len(fields) == 3 else 0.0
+        except ValueError:
+            return "ERROR_MALFORMED_SUBSCRIBE\n"
+        session.subscriptions[fields[1]] = int(1e9 / rate) if rate > 0.0 else 0
+        return "SUBSCRIBED_%s\n" % fields[1]
+
+    def _unsubscribe(self, session: ClientSession, request: str):
+        """Handle ``UNSUBSCRIBE_<topic>``"""
+        fields = request.split("_")
+        if len(fields) != 2 or fields[1] not in TOPICS:
+            return "ERROR_MALFORMED_UNSUBSCRIBE\n"
+        session.subscriptions.pop(fields[1], None)
+        session.held.pop(fields[1], None)
+        return "UNSUBSCRIBED_%s\n" % fields[1]
+
+    def _publish(self, topic: str, name: str, values: list):
+        """Fan an update out to the subscribed clients. It is encoded once per protocol in use."""
+        update = Update(topic, name, values)
+        now = time.monotonic_ns()
+        for session in self.sessions.values():
+            session.offer(update, now)
+
+    def _send_held(self):
+        """Send the updates held back by the subscription rates, once their interval has passed"""
+        now = time.monotonic_ns()
+        for session in self.sessions.values():
+            for update in list(session.held.values()):
+                session.offer(update, now)
+
+    def send(self, data: str):
+        """Send a notification to all the connected clients"""
+        try:
+            for session in self.sessions.values():
+                session.send(data)
+        except Exception:
+            self.log_data.exception("Problem sending data. See traceback.")
+
+    def send_response(self, client_id: int, data: str):
+        """Send a response to the client that made the request
+
+        Args:
+            client_id (int): Identifier of the client
+            data (str): The response line
+        """
+        session = self.sessions.get(client_id)
+        if session is not None:
+            session.send(data)
+
+    def send_message(self, client_id: int, name: str, values: list):
+        """Send a message of the binary message table to a client, in the protocol the client has chosen
+
+        Telemetry messages are coalesced with any unsent message of the same type.
+
+        Args:
+            client_id (int): Identifier of the client
+            name (str): Name of the message type
+            values (list): Fields of the message
+        """
+        session = self.sessions.get(client_id)
+        if session is None:
+            return
+        try:
+            key = name if name in BinaryProtocol.TELEMETRY else None
+            if session.binary_mode:
+                session.queue.push(BinaryProtocol.encode(name, *values), key)
+            else:
+                session.queue.push(BinaryProtocol.format_ascii(name, *values).encode('utf-8'), key)
+        except Exception:
+            self.log_data.exception("Problem sending data. See traceback.")
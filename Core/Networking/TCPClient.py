@@ -1,11 +1,19 @@
 import logging
 from PyQt5 import QtCore, QtNetwork
+from Core.Networking import SendQueue, Reconnect
 
 
 class TCPClient(QtCore.QObject):
+    """Client connection to the control PC
+
+    The connection is never waited for. A failed or lost connection is retried with an exponential backoff, and the
+    messages sent meanwhile are kept in a bounded queue, which is written once the connection is up again. Position
+    telemetry only keeps its latest message, so it never fills the queue.
+    """
     # Create the signals to be used for data handling
     dataRcvSigC = QtCore.pyqtSignal(str, name='dataClientRX')  # Send the received data out
     sendData = QtCore.pyqtSignal(str, name='sendDataClient')  # Data to be sent to the server
+    sendTelemetry = QtCore.pyqtSignal(str, str, name='sendTelemetryClient')  # Key and data, only the latest is kept
     reConnectSigC = QtCore.pyqtSignal(name='reConnectClient')  # A reconnection signal originating from a button press
 
     def __init__(self, cfg_data, parent=None):
@@ -18,36 +26,73 @@ class TCPClient(QtCore.QObject):
         """
         super(TCPClient, self).__init__(parent)  # Get the parent of the class
         self.cfg_data = cfg_data  # Create a variable for the cfg file
+        self.state = Reconnect.DISCONNECTED
+        self.backoff = Reconnect.Backoff()
+        self.queue = SendQueue.SendQueue(max_control=Reconnect.MAX_BUFFERED)  # Outbound messages, kept when offline
 
     def start(self):
         self.log_data = logging.getLogger(__name__)  # Create the logger
-        self.sock = QtNetwork.QTcpSocket()  # Create the TCP socket
+        self.sock = QtNetwork.QTcpSocket()  # Create the TCP socket, reused by every connection attempt
+        self.sock.bytesWritten.connect(self.queue.flush)  # Write more of the queue as the socket drains
+        self.sock.readyRead.connect(self._receive)  # Data que signal
+        self.sock.connected.connect(self._host_connected)  # What to do when we have connected
+        self.sock.error.connect(self._error)  # Log any error occurred and also perform the necessary actions
+        self.sock.disconnected.connect(self._disconnected)  # If there is state change then call the function
+
+        self.connect_timer = QtCore.QTimer()  # Abandons an attempt that takes too long
+        self.connect_timer.setSingleShot(True)
+        self.connect_timer.timeout.connect(self._connect_timeout)
+        self.retry_timer = QtCore.QTimer()  # Starts the next attempt after the backoff delay
+        self.retry_timer.setSingleShot(True)
+        self.retry_timer.timeout.connect(self._attempt)
+
+        # Connected once, so the messages are queued in any state
+        self.sendData.connect(self.send_data)
+        self.sendTelemetry.connect(self.send_telemetry)
         self.reConnectSigC.connect(self.connect)  # Do the reconnect signal connection
         self.connect()  # Start a connection
 
     # The connect function is called if the signal is fired or in the start of the thread
     @QtCore.pyqtSlot(name='reConnectClient')
     def connect(self):
-        if self.sock.state() != QtNetwork.QAbstractSocket.ConnectedState:
-            # Get the host and port from the settings file for the client connection
-            host = self.cfg_data.get_client_host()
-            port = self.cfg_data.get_client_port()
+        """Connect now, unless connected or already trying. A pending retry is started right away."""
+        if self.state in (Reconnect.CONNECTED, Reconnect.CONNECTING):
+            return
+        self.retry_timer.stop()
+        self.backoff.reset()
+        self._attempt()
 
-            self.sock = QtNetwork.QTcpSocket()  # Create the TCP socket
-            self.sock.readyRead.connect(self._receive)  # Data que signal
-            self.sock.connected.connect(self._host_connected)  # What to do when we have connected
-            self.sock.error.connect(self._error)  # Log any error occurred and also perform the necessary actions
-            self.sock.disconnected.connect(self._disconnected)  # If there is state change then call the function
+    def _attempt(self):
+        # Get the host and port from the settings file for the client connection
+        host = self.cfg_data.get_client_host()
+        port = self.cfg_data.get_client_port()
 
-            self.sock.connectToHost(QtNetwork.QHostAddress(host), int(port))  # Attempt to connect to the server
+        self.state = Reconnect.CONNECTING
+        self.sock.abort()  # Drop anything left from the previous connection
+        self.sock.connectToHost(QtNetwork.QHostAddress(host), int(port))  # Attempt to connect to the server
+        self.connect_timer.start(int(Reconnect.CONNECT_TIMEOUT * 1000))
 
-            self.sock.waitForConnected(msecs=1000)  # Wait a until connected (the function is waiting for 1 sec)
+    def _retry(self):
+        """Wait for the backoff delay before the next attempt"""
+        self.connect_timer.stop()
+        self.state = Reconnect.WAITING
+        delay = self.backoff.next()
+        self.log_data.info("Reconnecting to the server in %.1f s" % delay)
+        self.retry_timer.start(int(delay * 1000))
+
+    def _connect_timeout(self):
+        if self.state == Reconnect.CONNECTING:
+            self.log_data.warning("Connection attempt timed out")
+            self._retry()
+            self.sock.abort()  # After leaving the connecting state, so an error it reports is not retried twice
 
     @QtCore.pyqtSlot(str, name='sendDataClient')
     def send_data(self, data: str):
-        if self.sock.state() == QtNetwork.QAbstractSocket.ConnectedState:
-            self.sock.write(data.encode('utf-8'))
-            self.sock.waitForBytesWritten()
+        self.queue.push(data.encode('utf-8'))  # Written as the socket drains, kept while disconnected
+
+    @QtCore.pyqtSlot(str, str, name='sendTelemetryClient')
+    def send_telemetry(self, key: str, data: str):
+        self.queue.push(data.encode('utf-8'), key)  # Replaces any unsent message with the same key
 
     def _receive(self):
         while self.sock.bytesAvailable() > 0:  # Read all data in que
@@ -56,14 +101,22 @@ class TCPClient(QtCore.QObject):
             self.dataRcvSigC.emit(string)  # Decode the data to a string
 
     def _disconnected(self):
-        self.sendData.disconnect()
-        self.sock.waitForConnected(msecs=1000)
+        self.queue.detach()  # Keep the messages until the connection is up again
+        if self.state == Reconnect.CONNECTED:
+            self.log_data.warning("Lost the connection to the server")
+            self._retry()
 
     def _host_connected(self):
-        self.sendData.connect(self.send_data)  # Send the data to the server when this signal is fired
+        self.connect_timer.stop()
+        self.state = Reconnect.CONNECTED
+        self.backoff.reset()
+        self.queue.attach(self.sock.write, self.sock.bytesToWrite)
+        self.queue.flush()  # Send what was queued while disconnected
 
     def _error(self):
         self.log_data.warning("Some error occurred in client: %s" % self.sock.errorString())
+        if self.state == Reconnect.CONNECTING:
+            self._retry()  # The attempt failed, the disconnected signal is only fired for established connections
 
     ''''# This method is called when the thread exits
     def close(self):
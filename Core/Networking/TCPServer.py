@@ -1,17 +1,27 @@
 import logging
+from functools import partial
 from PyQt5 import QtCore, QtNetwork
+from Core import Startup
+from Core.Networking import SendQueue
+from Core.Networking.Sessions import ServerCore, ClientSession, HOLD_CHECK_INTERVAL
 
 
-class TCPServer(QtCore.QObject):
+class TCPServer(QtCore.QObject, ServerCore):
     # Create the signals to be used for data handling
-    sendDataClient = QtCore.pyqtSignal(str, name='clientDataSend')  # Send the data to client
-    requestProcess = QtCore.pyqtSignal(str, name='requestProcess')  # Send the received data for further processing
-    clientDisconnected = QtCore.pyqtSignal(name='cleintDisconnected')  # Report a disconnected client from the server
+    sendDataClient = QtCore.pyqtSignal(str, name='clientDataSend')  # Send the data to all the clients
+    sendResponse = QtCore.pyqtSignal(int, str, name='clientResponseSend')  # Send the data to one client
+    sendMessageClient = QtCore.pyqtSignal(int, str, list, name='clientMessageSend')  # Message of the binary table
+    publish = QtCore.pyqtSignal(str, str, list, name='publishUpdate')  # Topic, message name and fields of an update
+    releaseClientSig = QtCore.pyqtSignal(int, name='clientReleaseRequest')  # Close the connection of a client
+    requestProcess = QtCore.pyqtSignal(int, str, name='requestProcess')  # Send the received data for processing
+    requestTokens = QtCore.pyqtSignal(int, str, list, name='requestTokens')  # Send a decoded binary request
+    clientDisconnected = QtCore.pyqtSignal(name='cleintDisconnected')  # Report that the last client disconnected
 
     def __init__(self, cfg, parent=None):
         super(TCPServer, self).__init__(parent)  # Get the parent of the class
         self.host = cfg.get_host()  # Get the TCP connection host
         self.port = cfg.get_port()  # Get the server port from the settings file
+        self._setup_sessions()
         self.log_data = logging.getLogger(__name__)  # Create the necessary logger
 
     # This method is called in every thread start
@@ -20,7 +30,6 @@ class TCPServer(QtCore.QObject):
         This function is called whenever the thread is started. It does the necessary first initializations.
         :return: Nothing
         """
-        self.socket = None  # Create the instance os the socket variable to use it later
         self.connect_server()  # Start the server
 
     def connect_server(self):
@@ -41,54 +50,91 @@ class TCPServer(QtCore.QObject):
         self.tcp_server = QtNetwork.QTcpServer()  # Create a server object
         self.tcp_server.newConnection.connect(self._new_connection)  # Handler for a new connection
         self.sendDataClient.connect(self.send)  # Connect the signal trigger for data sending
+        self.sendResponse.connect(self.send_response)
+        self.sendMessageClient.connect(self.send_message)
+        self.publish.connect(self._publish)
+        self.releaseClientSig.connect(self.releaseClient)
 
-        self.tcp_server.listen(QtNetwork.QHostAddress(self.host), int(self.port))  # Start listening for connections
+        self.hold_timer = QtCore.QTimer()  # Sends the updates held back by the subscription rates
+        self.hold_timer.setInterval(HOLD_CHECK_INTERVAL)
+        self.hold_timer.timeout.connect(self._send_held)
+        self.hold_timer.start()
+
+        # Start listening for connections
+        if self.tcp_server.listen(QtNetwork.QHostAddress(self.host), int(self.port)):
+            Startup.status.mark("LISTEN")
+        else:
+            self.log_data.error("The server could not listen: %s" % self.tcp_server.errorString())
+            Startup.status.mark("LISTEN", "FAILED")
 
     # Whenever there is new connection, we call this method
     def _new_connection(self):
         """
-        Called whenever there is a new connection.
+        Called whenever there is a new connection. Every pending connection gets its own session.
         :return: Nothing
         """
-        if self.tcp_server.hasPendingConnections():
-            self.socket = self.tcp_server.nextPendingConnection()  # Returns a new QTcpSocket
+        while self.tcp_server.hasPendingConnections():
+            socket = self.tcp_server.nextPendingConnection()  # Returns a new QTcpSocket
+            if socket.state() != QtNetwork.QAbstractSocket.ConnectedState:
+                continue
 
-            if self.socket.state() == QtNetwork.QAbstractSocket.ConnectedState:
-                self.socket.readyRead.connect(self._receive)  # If there is pending data get it
-                self.socket.disconnected.connect(self._disconnected)  # Execute the appropriate code on state change
-                self.socket.error.connect(self._error)  # Log any error occurred
-                self.tcp_server.close()  # Stop listening for other connections
-                self.log_data.info("Someone connected on server")
+            session = self._add_session(SendQueue.SendQueue(socket.write, socket.bytesToWrite), socket)
+            socket.readyRead.connect(partial(self._receive, session))  # If there is pending data get it
+            socket.disconnected.connect(partial(self._disconnected, session))  # Clean up when the client leaves
+            socket.error.connect(partial(self._error, session))  # Log any error occurred
+            socket.bytesWritten.connect(session.queue.flush)  # Write more of the queue as the socket drains
 
     # Should we have data pending to be received, this method is called
-    def _receive(self):
+    def _receive(self, session: ClientSession):
+        socket = session.connection
         try:
-            while self.socket.bytesAvailable() > 0:  # Read all data in que
-                rec_data = self.socket.readLine().data().decode('utf-8').rstrip('\n')  # Get the data as a string
-                self.requestProcess.emit(rec_data)  # Send the received data to be processed
+            while socket.bytesAvailable() > 0:  # Read all data in que
+                if session.binary_mode:
+                    self._receive_frames(session, socket.readAll().data())
+                else:
+                    self._receive_line(session, socket.readLine().data().decode('utf-8').rstrip('\n'))
         except Exception:
             # If data is sent fast, then an exception will occur
             self.log_data.exception("A connected client abruptly disconnected. Returning to connection waiting")
 
+    @QtCore.pyqtSlot(str, str, list, name='publishUpdate')
+    def _publish(self, topic: str, name: str, values: list):
+        ServerCore._publish(self, topic, name, values)
+
     # If at any moment the connection state is changed, we call this method
-    def _disconnected(self):
+    def _disconnected(self, session: ClientSession):
         # Do the following if the connection is lost
-        self.socket.close()
-        self.clientDisconnected.emit()
-        self.tcp_server.listen(QtNetwork.QHostAddress(self.host), int(self.port))  # Start listening again
+        session.connection.deleteLater()
+        self._remove_session(session)
+
+    def _error(self, session: ClientSession, _socket_error=None):
+        self.log_data.warning("Some error occurred in client %d: %s" % (session.client_id,
+                                                                        session.connection.errorString()))
 
-    def _error(self):
-        self.log_data.warning("Some error occurred in client: %s" % self.socket.errorString())
+    @QtCore.pyqtSlot(int)
+    def releaseClient(self, client_id: int):
+        """Close the connection of a client, after sending everything queued for it
+
+        Args:
+            client_id (int): Identifier of the client
+        """
+        session = self.sessions.get(client_id)
+        if session is not None:
+            session.queue.drain()
+            session.connection.disconnectFromHost()  # Qt sends the buffered data before closing
 
     # This method is called whenever the signal to send data back is fired
     @QtCore.pyqtSlot(str, name='clientDataSend')
     def send(self, data: str):
-        try:
-            if self.socket.state() == QtNetwork.QAbstractSocket.ConnectedState:
-                self.socket.write(data.encode('utf-8'))  # Send data back to client
-                self.socket.waitForBytesWritten()  # Wait for the data to be written
-        except Exception:
-            self.log_data.exception("Problem sending data. See traceback.")
+        ServerCore.send(self, data)
+
+    @QtCore.pyqtSlot(int, str, name='clientResponseSend')
+    def send_response(self, client_id: int, data: str):
+        ServerCore.send_response(self, client_id, data)
+
+    @QtCore.pyqtSlot(int, str, list, name='clientMessageSend')
+    def send_message(self, client_id: int, name: str, values: list):
+        ServerCore.send_message(self, client_id, name, values)
 
     """
     # This method is called whenever the thread exits
@@ -2,22 +2,26 @@
 
 import os
 import sys
-import logging.config
+import argparse
+import logging
 sys.path.append(os.path.abspath('.'))  # noqa
 
 # pylint: disable=wrong-import-position
 
-# Import the required libraries and classes
-from PyQt5 import QtCore
-from Position import DishPosition
-from Core.Handlers import RequestHandler
-from Core.Networking import TCPServer, TCPClient
+# Import the required libraries and classes. The runtime modules are imported when the runtime is chosen.
+from Core import Startup  # Imported first, since it times the startup from its import
 from Core.Configuration import ConfigDataPi, DefaultData
 
 # pylint: disable=wrong-import-position
 
 
 def main():
+    # Choose the runtime, Qt by default. Any other arguments are left for Qt.
+    parser = argparse.ArgumentParser(description="Radio telescope controller")
+    parser.add_argument("--runtime", choices=("qt", "asyncio"), default="qt",
+                        help="event loop running the controller")
+    args, _ = parser.parse_known_args()
+
     # TODO Test the functionality of the server and client
     # TODO make the app "exitable" so killing is not required for termination
 
@@ -51,8 +55,35 @@ def main():
         print("There is a problem creating the settings file. See tracback: \n%s" % excep, file=sys.stderr)
         sys.exit(-1)  # Exit the program if an error occurred
 
-    logging.config.fileConfig('Settings/log_config.ini')  # Get the and apply the logger configuration
-    cfg = ConfigDataPi.ConfDataPi("settings_pi.xml")  # Parse the configuration file and create the object
+    # Apply the logger configuration in the background, the records until then are kept
+    Startup.configure_logging('Settings/log_config.ini')
+    cfg = ConfigDataPi.ConfDataPi("Settings/settings_pi.xml")  # Parse the configuration file and create the object
+
+    if args.runtime == "asyncio":
+        from Core import AsyncRuntime
+        try:
+            AsyncRuntime.run(cfg)
+        finally:
+            cfg.close()  # Write the pending step counts to the journal
+    else:
+        status = _run_qt(cfg)
+        cfg.close()  # Write the pending step counts to the journal
+        sys.exit(status)
+
+
+def _run_qt(cfg):
+    """Run the controller on the Qt event loop, with each part in its own thread
+
+    Args:
+        cfg: Configuration data object
+
+    Returns:
+        int: The exit status of the event loop
+    """
+    from PyQt5 import QtCore
+    from Position import DishPosition
+    from Core.Handlers import RequestHandler
+    from Core.Networking import TCPServer, TCPClient
 
     app = QtCore.QCoreApplication(sys.argv)  # Create application object
 
@@ -85,7 +116,7 @@ def main():
     # handler_thread.finished.connect(request_handle.close)
     handler_thread.start()  # Start the handler thread
 
-    sys.exit(app.exec_())  # Start the event loop
+    return app.exec_()  # Start the event loop
 
 
 if __name__ == '__main__':
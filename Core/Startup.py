@@ -0,0 +1,140 @@
+"""Startup stages of the controller
+
+The server starts listening as soon as the settings are parsed. The slower parts of the startup, like the logging
+handlers, the GPIO and the IMU, are set up in background threads, and each of them is recorded here as a stage with
+the time it finished. The ``STARTUP_STATUS`` request reports them, so a client can tell when the controller is ready.
+"""
+
+import time
+import logging
+import logging.config
+import threading
+
+STAGES = ("LISTEN", "LOGGING", "GPIO", "IMU")  # Stages that must finish for the controller to be ready
+MAX_BUFFERED_RECORDS = 1000  # Log records kept while the logging handlers are set up, the oldest are dropped
+
+_PENDING = "PENDING"
+_FAILED = "FAILED"
+_SKIPPED = "SKIPPED"
+
+
+class StartupStatus:
+    """Finishing time of every startup stage, measured from the start of the process"""
+
+    def __init__(self, stages=STAGES):
+        self.log_data = logging.getLogger(__name__)
+        self.start_time = time.monotonic()
+        self.stages = stages
+        self._results = {}  # Milliseconds from the start, or the failed or skipped marker, by stage
+        self._lock = threading.Lock()
+        self.ready = threading.Event()  # Set once every stage has finished
+
+    def mark(self, stage: str, result=None):
+        """Record that a stage has finished
+
+        Args:
+            stage (str): Name of the stage
+            result (str): None if the stage succeeded, otherwise ``FAILED`` or ``SKIPPED``
+        """
+        elapsed = int((time.monotonic() - self.start_time) * 1000.0)
+        with self._lock:
+            self._results[stage] = elapsed if result is None else result
+            done = all(name in self._results for name in self.stages)
+        self.log_data.info("Startup stage %s finished after %d ms" % (stage, elapsed))
+        if done:
+            self.ready.set()
+
+    def skip(self, stage: str):
+        self.mark(stage, _SKIPPED)
+
+    def run_background(self, stage: str, function, on_done=None):
+        """Run a stage in a background thread
+
+        A failure of the function is logged and marks the stage as failed.
+
+        Args:
+            stage (str): Name of the stage
+            function: Called without arguments in the background thread
+            on_done: Called with the result of the function in the background thread, if it succeeds. It is then
+                responsible for marking the stage. Without it, the stage is marked as soon as the function returns.
+
+        Returns:
+            threading.Thread: The started thread
+        """
+        def run():
+            try:
+                result = function()
+            except Exception:
+                self.log_data.exception("Startup stage %s failed. See traceback." % stage)
+                self.mark(stage, _FAILED)
+                return
+            if on_done is None:
+                self.mark(stage)
+            else:
+                on_done(result)
+
+        thread = threading.Thread(target=run, name="Startup-%s" % stage, daemon=True)
+        thread.start()
+        return thread
+
+    def format(self):
+        """Build the status response
+
+        Returns:
+            str: ``STARTUP_STATUS_READY_<0 or 1>`` followed by every stage and its finishing time in milliseconds, or
+            ``PENDING``, ``FAILED`` or ``SKIPPED``
+        """
+        with self._lock:
+            fields = ["STARTUP_STATUS_READY", "1" if self.ready.is_set() else "0"]
+            for stage in self.stages:
+                fields.extend((stage, str(self._results.get(stage, _PENDING))))
+        return "_".join(fields) + "\n"
+
+
+class _BufferHandler(logging.Handler):
+    """Keeps the log records until the configured handlers are in place"""
+
+    def __init__(self):
+        super(_BufferHandler, self).__init__(logging.DEBUG)
+        self.records = []
+
+    def emit(self, record):
+        if len(self.records) >= MAX_BUFFERED_RECORDS:
+            del self.records[0]
+        self.records.append(record)
+
+
+def configure_logging(path: str):
+    """Apply the logging configuration file in the background
+
+    Creating the handlers opens and may rotate the log files, so it is kept off the startup path. The records logged
+    until then are buffered and passed to the configured handlers afterwards.
+
+    Args:
+        path (str): Path of the logging configuration file
+    """
+    root = logging.getLogger()
+    buffer = _BufferHandler()
+    root.addHandler(buffer)
+    level = root.level
+    root.setLevel(logging.DEBUG)  # Buffer everything, the configured levels are applied when replaying
+
+    def configure():
+        try:
+            # The loggers already created by the running threads must keep working
+            logging.config.fileConfig(path, disable_existing_loggers=False)
+        except Exception:
+            root.removeHandler(buffer)
+            root.setLevel(level)
+            logging.basicConfig()
+            raise
+        finally:
+            for record in buffer.records:
+                logger = logging.getLogger(record.name)
+                if logger.isEnabledFor(record.levelno):
+                    logger.handle(record)
+
+    status.run_background("LOGGING", configure)
+
+
+status = StartupStatus()  # Startup of this process
@@ -0,0 +1,146 @@
+"""Persistent cache of the IMU calibration
+
+The calibration of the MPU9250 is saved per sensor, so the controller loads it into the driver at startup instead of
+measuring it again. The sensor is identified by ``mpu9250.getSensorId``. The file holds:
+
+- the factory sensitivity adjustment of the magnetometer, which never changes
+- the magnetometer bias and soft iron matrix of the last :mod:`Position.MagCalibration` run, which needs the sensor to
+  be turned around, so it is only replaced by a new run
+- the gyroscope and accelerometer biases of ``mpu9250.calibrateMPU9250``, per temperature band, since they drift with
+  the temperature of the chip
+
+The file is JSON with a version number, and a file of another version is ignored. It is written to a temporary file
+that then replaces the previous one, so a power loss never leaves a torn cache behind.
+"""
+
+import os
+import json
+import math
+import time
+import logging
+import threading
+
+CACHE_VERSION = 1
+TEMPERATURE_BAND = 5.0  # Degrees Celsius covered by each set of gyroscope and accelerometer biases
+DEFAULT_MAX_AGE = 30.0  # Days after which the biases are measured again
+
+
+def temperature_band(temperature: float):
+    """Index of the temperature band of a chip temperature in degrees Celsius"""
+    return int(math.floor(temperature / TEMPERATURE_BAND))
+
+
+class CalibrationCache:
+    """Saved calibrations of the IMU sensors, by sensor identity
+
+    The methods can be called from any thread.
+    """
+
+    def __init__(self, path: str, max_age: float = DEFAULT_MAX_AGE):
+        """Class constructor
+
+        Args:
+            path (str): Path of the cache file, created on the first save
+            max_age (float): Age in days after which the biases of a band are stale
+        """
+        self.log_data = logging.getLogger(__name__)
+        self.path = path
+        self.max_age = max_age * 86400.0
+        self._lock = threading.Lock()
+        self._sensors = self._load()
+
+    def _load(self):
+        """Read the saved calibrations
+
+        Returns:
+            dict: The record of every sensor, empty if the file is missing, unreadable or of another version
+        """
+        try:
+            with open(self.path) as cache_file:
+                data = json.load(cache_file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            self.log_data.warning("The IMU calibration cache %s is unreadable, it is ignored" % self.path)
+            return {}
+        if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+            self.log_data.info("The IMU calibration cache %s is of another version, it is ignored" % self.path)
+            return {}
+        return data.get("sensors", {})
+
+    def _save(self):
+        """Write the calibrations to the file. Called with the lock held.
+
+        A failed write is only logged, the calibrations are still used until the controller stops.
+        """
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w") as cache_file:
+                json.dump({"version": CACHE_VERSION, "sensors": self._sensors}, cache_file, indent=1, sort_keys=True)
+                cache_file.flush()
+                os.fsync(cache_file.fileno())
+            os.replace(temp_path, self.path)
+        except OSError:
+            self.log_data.exception("Problem writing the IMU calibration cache %s. See traceback." % self.path)
+
+    def lookup(self, sensor: str, temperature: float):
+        """Find the calibration of a sensor at a chip temperature
+
+        When the band of the temperature has no biases, those of the nearest band are returned, as a better start than
+        none at all.
+
+        Args:
+            sensor (str): Identity of the sensor
+            temperature (float): Chip temperature in degrees Celsius
+
+        Returns:
+            tuple: A dictionary with the saved ``factory_mag``, ``mag_bias``, ``mag_matrix``, ``gyro_bias`` and
+            ``accel_bias``, of which any may be missing, and whether the biases must be measured again, because
+            they are missing, of another band or too old
+        """
+        band = temperature_band(temperature)
+        with self._lock:
+            record = self._sensors.get(sensor, {})
+            entry = {}
+            if "factory_mag" in record:
+                entry["factory_mag"] = record["factory_mag"]
+            if "mag" in record:
+                entry["mag_bias"] = record["mag"]["bias"]
+                entry["mag_matrix"] = record["mag"]["matrix"]
+            bands = record.get("bands", {})
+            if not bands:
+                return entry, True
+            nearest = min(bands, key=lambda saved: abs(int(saved) - band))
+            biases = bands[nearest]
+        entry["gyro_bias"] = biases["gyro_bias"]
+        entry["accel_bias"] = biases["accel_bias"]
+        stale = int(nearest) != band or time.time() - biases["time"] > self.max_age
+        return entry, stale
+
+    def store_biases(self, sensor: str, temperature: float, gyro_bias, accel_bias):
+        """Save the gyroscope and accelerometer biases measured at a chip temperature
+
+        Args:
+            sensor (str): Identity of the sensor
+            temperature (float): Chip temperature in degrees Celsius during the measurement
+            gyro_bias: Biases in degrees per second, as returned by ``mpu9250.calibrateMPU9250``
+            accel_bias: Biases in g, as returned by ``mpu9250.calibrateMPU9250``
+        """
+        with self._lock:
+            bands = self._sensors.setdefault(sensor, {}).setdefault("bands", {})
+            bands[str(temperature_band(temperature))] = {"gyro_bias": list(gyro_bias), "accel_bias": list(accel_bias),
+                                                         "temperature": temperature, "time": time.time()}
+            self._save()
+
+    def store_factory_mag(self, sensor: str, factory):
+        """Save the factory sensitivity adjustment of the magnetometer, as returned by ``mpu9250.initAK8963``"""
+        with self._lock:
+            self._sensors.setdefault(sensor, {})["factory_mag"] = list(factory)
+            self._save()
+
+    def store_mag(self, sensor: str, bias, matrix):
+        """Save the magnetometer bias in milliGauss and its 3x3 soft iron matrix"""
+        with self._lock:
+            self._sensors.setdefault(sensor, {})["mag"] = {"bias": list(bias), "matrix": [list(row) for row in matrix],
+                                                           "time": time.time()}
+            self._save()
@@ -0,0 +1,89 @@
+#include <chrono>
+#include "FifoStream.h"
+
+FifoStream::FifoStream(MPU9250 &mpu, std::mutex &bus) : mpu(mpu), bus(bus), period(0.0), last_timestamp(0.0),
+	anchored(false), magCount{0, 0, 0}, enabled(false), samples(0), overflows(0)
+{
+}
+
+// Start streaming at the closest rate the chip supports to rate Hz, returns that rate
+double FifoStream::configure(double rate)
+{
+	double divider = std::round(FIFO_BASE_RATE / rate) - 1.0;
+	if(divider < 0.0)
+		divider = 0.0;
+	if(divider > 255.0)
+		divider = 255.0;
+
+	std::lock_guard<std::mutex> lock(bus);
+	mpu.enableFifo((uint8_t)divider);
+	period = (1.0 + divider) / FIFO_BASE_RATE;
+	anchored = false;
+	enabled = true;
+	samples = 0;
+	overflows = 0;
+	return 1.0 / period;
+}
+
+void FifoStream::disable()
+{
+	std::lock_guard<std::mutex> lock(bus);
+	mpu.disableFifo();
+	enabled = false;
+}
+
+// Append every sample queued in the FIFO to dest, returns how many were appended
+// After an overflow the FIFO is reset and nothing is returned, since its content
+// may no longer start on a sample boundary
+size_t FifoStream::read(std::vector<ImuSample> &dest)
+{
+	std::lock_guard<std::mutex> lock(bus);
+	if(mpu.fifoOverflowed())
+	{
+		mpu.resetFifo();
+		overflows++;
+		anchored = false;  // Samples were lost, the timeline starts again
+		return 0;
+	}
+	uint16_t count = mpu.readFifo(raw, FIFO_SIZE / FIFO_SAMPLE_SIZE);
+	double now = mpu.now();
+	mpu.readMagData(magCount);  // Left unchanged when no new data is ready
+	if(count == 0)
+		return 0;
+
+	// The newest sample was taken at most one period before the read
+	// While the batches follow each other, the timeline continues from the last one,
+	// and is slowly pulled towards the read time to follow the difference between the clocks
+	// If it is more than a period away, the samples are anchored to the read time again
+	double first = last_timestamp + period;
+	double error = now - (first + (count - 1) * period) - period / 2.0;
+	if(!anchored || error < -period || error > period)
+		first = now - (count - 1) * period - period / 2.0;
+	else
+		first += error / 16.0;
+	anchored = true;
+
+	// The magnetometer is not in the FIFO, its last reading goes with every sample of the batch
+	double mag[3];
+	mpu.scaleMagData(magCount, mag);
+	for(uint16_t i = 0; i < count; i++)
+	{
+		const int16_t *values = &raw[i * 7];
+		ImuSample sample;
+		sample.timestamp = first + i * period;
+		sample.ax = (double)values[0] * mpu.aRes;
+		sample.ay = (double)values[1] * mpu.aRes;
+		sample.az = (double)values[2] * mpu.aRes;
+		sample.temperature = (double)values[3] / TEMP_SENSITIVITY + TEMP_OFFSET;
+		sample.gx = (double)values[4] * mpu.gRes;
+		sample.gy = (double)values[5] * mpu.gRes;
+		sample.gz = (double)values[6] * mpu.gRes;
+		sample.mx = mag[0];
+		sample.my = mag[1];
+		sample.mz = mag[2];
+		dest.push_back(sample);
+	}
+	last_timestamp = first + (count - 1) * period;
+	samples += count;
+	return count;
+}
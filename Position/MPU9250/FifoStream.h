@@ -0,0 +1,38 @@
+/*
+ Streaming of the MPU9250 samples through its hardware FIFO.
+ The chip samples on its own clock and queues the samples, so none are lost
+ while the host is busy, as long as it reads before the FIFO fills up. The
+ timestamps of the queued samples are reconstructed from the sample period.
+ */
+#ifndef _FIFO_STREAM_H_
+#define _FIFO_STREAM_H_
+
+#include <mutex>
+#include <vector>
+#include <stdint.h>
+#include "MPU9250.h"
+#include "ImuSample.h"
+
+class FifoStream
+{
+private:
+	MPU9250 &mpu;
+	std::mutex &bus;  // Held for every access to the sensor
+	double period;  // Seconds between two samples
+	double last_timestamp;  // Timestamp of the last sample handed out
+	bool anchored;  // False until the timeline is anchored to the host clock
+	int16_t magCount[3];  // The magnetometer is not in the FIFO, its last value is used
+	int16_t raw[(FIFO_SIZE / FIFO_SAMPLE_SIZE) * 7];
+
+public:
+	bool enabled;
+	uint64_t samples;  // Samples read since the FIFO was configured
+	uint64_t overflows;  // Times the FIFO filled up and its content was discarded
+
+	FifoStream(MPU9250 &mpu, std::mutex &bus);
+	double configure(double rate);
+	void disable();
+	size_t read(std::vector<ImuSample> &dest);
+};
+
+#endif // _FIFO_STREAM_H_
@@ -0,0 +1,96 @@
+#include <chrono>
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/ioctl.h>
+#include <linux/i2c.h>
+#include <linux/i2c-dev.h>
+#include "I2CBus.h"
+
+LinuxI2CBus::LinuxI2CBus(const char *path) : path(path)
+{
+}
+
+LinuxI2CBus::~LinuxI2CBus()
+{
+	if(descriptor >= 0)
+		close(descriptor);
+}
+
+// Open the adapter, so a missing bus is only an error once the sensor is used
+void LinuxI2CBus::open()
+{
+	if( (descriptor = ::open(path, O_RDWR)) < 0 )
+	{
+		throw "Failed to open the I2C bus";
+	}
+
+	unsigned long funcs = 0;
+	if( ioctl(descriptor, I2C_FUNCS, &funcs) == 0 )
+		combined_transfers = (funcs & I2C_FUNC_I2C) != 0;
+}
+
+void LinuxI2CBus::select(uint8_t device)
+{
+	if(descriptor < 0)
+		open();
+	if(device == slave_address)
+		return; // Already selected, no need for the system call
+
+	if( ioctl(descriptor, I2C_SLAVE, device) < 0 )
+	{
+		slave_address = -1;
+		throw "Error accessing I2C bus.";
+	}
+	slave_address = device;
+}
+
+void LinuxI2CBus::write(uint8_t device, uint8_t reg, uint8_t data)
+{
+	select(device);
+
+	uint8_t buf[2] = {reg, data};
+	if(::write(descriptor, buf, 2) == -1)
+		throw "Problem with writing to I2C";
+}
+
+void LinuxI2CBus::read(uint8_t device, uint8_t reg, uint8_t count, uint8_t *dest)
+{
+	if(descriptor < 0)
+		open();
+
+	if(combined_transfers)
+	{
+		// Write the register address and read the data in a single transfer, with a repeated start in between
+		struct i2c_msg messages[2];
+		messages[0].addr = device;
+		messages[0].flags = 0;
+		messages[0].len = 1;
+		messages[0].buf = &reg;
+		messages[1].addr = device;
+		messages[1].flags = I2C_M_RD;
+		messages[1].len = count;
+		messages[1].buf = dest;
+
+		struct i2c_rdwr_ioctl_data transfer = {messages, 2};
+		if( ioctl(descriptor, I2C_RDWR, &transfer) != 2 )
+		{
+			throw "Failed to read from I2C bus.";
+		}
+		return;
+	}
+
+	select(device);
+	if((::write(descriptor, &reg, 1)) != 1)
+	{
+		throw "Error communicating on I2C.";
+	}
+	if(::read(descriptor, dest, count) != count)
+	{
+		throw "Failed to read from I2C bus.";
+	}
+}
+
+double LinuxI2CBus::now()
+{
+	return std::chrono::duration<double>(std::chrono::steady_clock::now().time_since_epoch()).count();
+}
@@ -0,0 +1,41 @@
+/*
+ The bus the MPU9250 driver talks through.
+ The driver only reads and writes registers, so the Linux I2C device can be
+ replaced by a replay of a capture, or wrapped by a recorder of one.
+ */
+#ifndef _I2C_BUS_H_
+#define _I2C_BUS_H_
+
+#include <stdint.h>
+
+class I2CBus
+{
+public:
+	virtual ~I2CBus() {}
+	virtual void write(uint8_t device, uint8_t reg, uint8_t data) = 0;
+	virtual void read(uint8_t device, uint8_t reg, uint8_t count, uint8_t *dest) = 0;
+	// Seconds of the clock the transfers are timed with, steady but of arbitrary origin
+	virtual double now() = 0;
+};
+
+// The I2C adapter of the Raspberry, opened on the first transfer
+class LinuxI2CBus : public I2CBus
+{
+private:
+	const char *path;
+	int descriptor = -1;
+	int slave_address = -1; // Device address currently selected on the bus, -1 if unknown
+	bool combined_transfers = false; // The adapter supports I2C_RDWR transfers with a repeated start
+
+	void open();
+	void select(uint8_t device);
+
+public:
+	LinuxI2CBus(const char *path);
+	~LinuxI2CBus();
+	void write(uint8_t device, uint8_t reg, uint8_t data);
+	void read(uint8_t device, uint8_t reg, uint8_t count, uint8_t *dest);
+	double now();
+};
+
+#endif // _I2C_BUS_H_
@@ -0,0 +1,20 @@
+/*
+ A timestamped IMU sample, as handed to Python by the sampling thread and the
+ FIFO reader.
+ */
+#ifndef _IMU_SAMPLE_H_
+#define _IMU_SAMPLE_H_
+
+#define SAMPLE_FIELDS 11  // Number of values in a sample
+
+// Laid out as SAMPLE_FIELDS doubles
+struct ImuSample
+{
+	double timestamp;  // Seconds of the monotonic clock, the same clock as Python's time.monotonic()
+	double ax, ay, az;  // Acceleration in g
+	double gx, gy, gz;  // Angular rate in degrees per second
+	double mx, my, mz;  // Magnetic field in milliGauss, the last value the magnetometer reported
+	double temperature;  // Chip temperature in Celsius
+};
+
+#endif // _IMU_SAMPLE_H_
@@ -5,15 +5,26 @@
 //====== and temperature data
 //==============================================================================
 
-auto _cur_time = std::chrono::steady_clock::now(); // used to calculate integration interval
-auto _last_time = std::chrono::steady_clock::now();
+MPU9250::MPU9250() // Uses I2C communication by default, the bus is opened on the first access
+{
+}
 
-MPU9250::MPU9250() // Uses I2C communication by default
+// Talk through another bus, like the replay of a capture, or the hardware one again if NULL
+void MPU9250::setBus(I2CBus * newBus)
 {
-	if( (i2c_descriptor = open(i2c_bus, O_RDWR)) < 0 )
-	{
-		throw "Failed to open the I2C bus";
-	}
+	bus = newBus != NULL ? newBus : &hardware;
+	lastUpdate = -1.0; // The clock of the new bus has another origin
+}
+
+I2CBus &MPU9250::hardwareBus()
+{
+	return hardware;
+}
+
+// Time of the bus in seconds, the recorded one when replaying a capture
+double MPU9250::now()
+{
+	return bus->now();
 }
 
 void MPU9250::getMres()
@@ -101,24 +112,33 @@ void MPU9250::readGyroData(int16_t * destination)
 	destination[2] = ((int16_t)rx_buffer[4] << 8) | rx_buffer[5] ;
 }
 
-void MPU9250::readMagData(int16_t * destination)
+bool MPU9250::readMagData(int16_t * destination)
 {
-	// Wait for magnetometer data ready bit to be set
-	if (readByte(AK8963_ADDRESS, AK8963_ST1) & 0x01)
+	// Read ST1, the six raw data and ST2 registers in one burst
+	// Reading ST2 tells the magnetometer that the data was read, even if it was not ready
+	readBytes(AK8963_ADDRESS, AK8963_ST1, 8);
+	// Check the data ready bit of ST1 and the magnetic sensor overflow bit of ST2
+	if ((rx_buffer[0] & 0x01) && !(rx_buffer[7] & 0x08))
 	{
-		// Read the six raw data and ST2 registers sequentially into data array
-		readBytes(AK8963_ADDRESS, AK8963_XOUT_L, 7);
-		uint8_t c = rx_buffer[6];
-		// Check if magnetic sensor overflow set, if not then report data
-		if (!(c & 0x08))
-		{
-			// Turn the MSB and LSB into a signed 16-bit value
-			destination[0] = ((int16_t)rx_buffer[1] << 8) | rx_buffer[0];
-			// Data stored as little Endian
-			destination[1] = ((int16_t)rx_buffer[3] << 8) | rx_buffer[2];
-			destination[2] = ((int16_t)rx_buffer[5] << 8) | rx_buffer[4];
-		}
+		// Turn the MSB and LSB into a signed 16-bit value
+		destination[0] = ((int16_t)rx_buffer[2] << 8) | rx_buffer[1];
+		// Data stored as little Endian
+		destination[1] = ((int16_t)rx_buffer[4] << 8) | rx_buffer[3];
+		destination[2] = ((int16_t)rx_buffer[6] << 8) | rx_buffer[5];
+		return true;
 	}
+	return false;
+}
+
+// Convert raw magnetometer counts to milliGauss
+// The factory sensitivity adjustment and the hard iron bias are applied first, then the soft iron matrix
+void MPU9250::scaleMagData(const int16_t * counts, double * destination)
+{
+	double centered[3];
+	for (int i = 0; i < 3; i++)
+		centered[i] = (double)counts[i] * mRes * factoryMagCalibration[i] - magBias[i];
+	for (int i = 0; i < 3; i++)
+		destination[i] = magMatrix[i][0] * centered[0] + magMatrix[i][1] * centered[1] + magMatrix[i][2] * centered[2];
 }
 
 int16_t MPU9250::readTempData()
@@ -129,16 +149,31 @@ int16_t MPU9250::readTempData()
 	return ((int16_t)rx_buffer[0] << 8) | rx_buffer[1];
 }
 
+// Read the accelerometer, temperature and gyroscope registers in one 14 byte burst
+// Returns the raw temperature
+int16_t MPU9250::readMotionData(int16_t * accelDest, int16_t * gyroDest)
+{
+	// The registers are contiguous, from ACCEL_XOUT_H to GYRO_ZOUT_L
+	readBytes(MPU9250_ADDRESS, ACCEL_XOUT_H, 14);
+
+	// Turn the MSB and LSB into a signed 16-bit value
+	for (int i = 0; i < 3; i++)
+	{
+		accelDest[i] = ((int16_t)rx_buffer[2 * i] << 8) | rx_buffer[2 * i + 1];
+		gyroDest[i] = ((int16_t)rx_buffer[8 + 2 * i] << 8) | rx_buffer[9 + 2 * i];
+	}
+	return ((int16_t)rx_buffer[6] << 8) | rx_buffer[7];
+}
+
 // TODO: Implement updateTime in python
 // Calculate the time the last update took for use in the quaternion filters
 // TODO: This doesn't really belong in this class.
 void MPU9250::updateTime()
 {
-	_cur_time = std::chrono::steady_clock::now();
+	double current = bus->now();
 	// Set integration time by time elapsed since last filter update
-	deltat = std::chrono::duration_cast<std::chrono::microseconds>(_cur_time - _last_time).count();
-	deltat /= 1000000.0;
-	_last_time = _cur_time;
+	deltat = lastUpdate < 0.0 ? 0.0 : current - lastUpdate;
+	lastUpdate = current;
 }
 
 
@@ -157,6 +192,15 @@ void MPU9250::initAK8963(double * destination)
 	destination[0] =  (double)(rx_buffer[0] - 128)/256. + 1.;
 	destination[1] =  (double)(rx_buffer[1] - 128)/256. + 1.;
 	destination[2] =  (double)(rx_buffer[2] - 128)/256. + 1.;
+
+	startAK8963();
+}
+
+// Start the continuous measurements of the magnetometer
+// The sensitivity adjustment does not have to be read again for that, so a saved one can be used
+void MPU9250::startAK8963()
+{
+	// The mode can only be changed from the power down mode
 	writeByte(AK8963_ADDRESS, AK8963_CNTL, 0x00); // Power down magnetometer
 	usleep(10000);
 
@@ -248,6 +292,72 @@ void MPU9250::initMPU9250()
 }
 
 
+// Stream the accelerometer, temperature and gyroscope samples through the FIFO
+// at FIFO_BASE_RATE / (1 + rateDivider) Hz
+void MPU9250::enableFifo(uint8_t rateDivider)
+{
+	writeByte(MPU9250_ADDRESS, FIFO_EN, 0x00); // Stop filling the FIFO while it is set up
+	writeByte(MPU9250_ADDRESS, SMPLRT_DIV, rateDivider);
+	// Enable the data ready (bit 0) and FIFO overflow (bit 4) interrupts
+	writeByte(MPU9250_ADDRESS, INT_ENABLE, 0x11);
+	resetFifo();
+	// Enable the temperature (bit 7), gyroscope (bits 6:4) and accelerometer (bit 3) samples
+	// They are stored in register order, FIFO_SAMPLE_SIZE bytes per sample
+	writeByte(MPU9250_ADDRESS, FIFO_EN, 0xF8);
+}
+
+void MPU9250::disableFifo()
+{
+	writeByte(MPU9250_ADDRESS, FIFO_EN, 0x00);
+	writeByte(MPU9250_ADDRESS, USER_CTRL, 0x00); // Disable the FIFO, keep the I2C master off for the bypass
+	writeByte(MPU9250_ADDRESS, INT_ENABLE, 0x01);
+}
+
+// Empty the FIFO, which also realigns it on a sample boundary
+void MPU9250::resetFifo()
+{
+	writeByte(MPU9250_ADDRESS, USER_CTRL, 0x04); // Reset the FIFO (bit 2)
+	writeByte(MPU9250_ADDRESS, USER_CTRL, 0x40); // Enable the FIFO (bit 6)
+}
+
+// Check and clear the FIFO overflow flag, reading INT_STATUS also clears the data ready flag
+bool MPU9250::fifoOverflowed()
+{
+	return (readByte(MPU9250_ADDRESS, INT_STATUS) & 0x10) != 0;
+}
+
+// Number of bytes waiting in the FIFO
+uint16_t MPU9250::readFifoCount()
+{
+	uint8_t data[2];
+	readBytes(MPU9250_ADDRESS, FIFO_COUNTH, 2, &data[0]);
+	return ((uint16_t)(data[0] & 0x1F) << 8) | data[1]; // 13 bit count
+}
+
+// Read up to maxSamples complete samples from the FIFO into destination,
+// seven values per sample: accelerometer x, y, z, temperature, gyroscope x, y, z
+// Returns the number of samples read
+uint16_t MPU9250::readFifo(int16_t * destination, uint16_t maxSamples)
+{
+	// Burst size in whole samples, readBytes reads at most 255 bytes at once
+	const uint16_t chunk = 255 / FIFO_SAMPLE_SIZE;
+	uint8_t data[chunk * FIFO_SAMPLE_SIZE];
+
+	uint16_t samples = readFifoCount() / FIFO_SAMPLE_SIZE;
+	if (samples > maxSamples)
+		samples = maxSamples;
+
+	for (uint16_t done = 0; done < samples; )
+	{
+		uint16_t count = samples - done < chunk ? samples - done : chunk;
+		readBytes(MPU9250_ADDRESS, FIFO_R_W, count * FIFO_SAMPLE_SIZE, &data[0]);
+		for (uint16_t i = 0; i < count * 7; i++)
+			destination[(done * 7) + i] = ((int16_t)data[2 * i] << 8) | data[2 * i + 1];
+		done += count;
+	}
+	return samples;
+}
+
 // Function which accumulates gyro and accelerometer data after device
 // initialization. It calculates the average of the at-rest readings and then
 // loads the resulting offsets into accelerometer and gyro bias registers.
@@ -293,8 +403,8 @@ void MPU9250::calibrateMPU9250(double * gyroBias, double * accelBias)
 	// Set accelerometer full-scale to 2 g, maximum sensitivity
 	writeByte(MPU9250_ADDRESS, ACCEL_CONFIG, 0x00);
 
-	uint16_t  gyrosensitivity  = 131;   // = 131 LSB/degrees/sec
-	uint16_t  accelsensitivity = 16384; // = 16384 LSB/g
+	uint16_t  gyrosensitivity  = CAL_GYRO_SENSITIVITY;
+	uint16_t  accelsensitivity = CAL_ACCEL_SENSITIVITY;
 
 	// Configure FIFO to capture accelerometer and gyro data for bias calculation
 	writeByte(MPU9250_ADDRESS, USER_CTRL, 0x40);  // Enable FIFO
@@ -352,6 +462,27 @@ void MPU9250::calibrateMPU9250(double * gyroBias, double * accelBias)
 		accel_bias[2] += (int32_t) accelsensitivity;
 	}
 
+	writeGyroOffsets(gyro_bias);
+
+	// Output scaled gyro biases for display in the main program
+	gyroBias[0] = (double) gyro_bias[0]/(double) gyrosensitivity;
+	gyroBias[1] = (double) gyro_bias[1]/(double) gyrosensitivity;
+	gyroBias[2] = (double) gyro_bias[2]/(double) gyrosensitivity;
+
+	writeAccelOffsets(accel_bias);
+
+	// Output scaled accelerometer biases for display in the main program
+	accelBias[0] = (double)accel_bias[0]/(double)accelsensitivity;
+	accelBias[1] = (double)accel_bias[1]/(double)accelsensitivity;
+	accelBias[2] = (double)accel_bias[2]/(double)accelsensitivity;
+}
+
+
+// Push gyroscope biases, in counts at 131 LSB/(degrees/s), to the hardware offset registers
+void MPU9250::writeGyroOffsets(const int32_t * gyro_bias)
+{
+	uint8_t data[6];
+
 	// Construct the gyro biases for push to the hardware gyro bias registers,
 	// which are reset to zero upon device startup.
 	// Divide by 4 to get 32.9 LSB per deg/s to conform to expected bias input
@@ -371,11 +502,14 @@ void MPU9250::calibrateMPU9250(double * gyroBias, double * accelBias)
 	writeByte(MPU9250_ADDRESS, YG_OFFSET_L, data[3]);
 	writeByte(MPU9250_ADDRESS, ZG_OFFSET_H, data[4]);
 	writeByte(MPU9250_ADDRESS, ZG_OFFSET_L, data[5]);
+}
 
-	// Output scaled gyro biases for display in the main program
-	gyroBias[0] = (double) gyro_bias[0]/(double) gyrosensitivity;
-	gyroBias[1] = (double) gyro_bias[1]/(double) gyrosensitivity;
-	gyroBias[2] = (double) gyro_bias[2]/(double) gyrosensitivity;
+// Push accelerometer biases, in counts at 16384 LSB/g, to the hardware offset registers
+// The registers must hold their factory trim, as they do after a reset
+void MPU9250::writeAccelOffsets(const int32_t * accel_bias)
+{
+	uint8_t data[6];
+	uint16_t ii;
 
 	// Construct the accelerometer biases for push to the hardware accelerometer
 	// bias registers. These registers contain factory trim values which must be
@@ -443,13 +577,37 @@ void MPU9250::calibrateMPU9250(double * gyroBias, double * accelBias)
 	writeByte(MPU9250_ADDRESS, YA_OFFSET_L, data[3]);
 	writeByte(MPU9250_ADDRESS, ZA_OFFSET_H, data[4]);
 	writeByte(MPU9250_ADDRESS, ZA_OFFSET_L, data[5]);
+}
 
-	// Output scaled accelerometer biases for display in the main program
-	accelBias[0] = (double)accel_bias[0]/(double)accelsensitivity;
-	accelBias[1] = (double)accel_bias[1]/(double)accelsensitivity;
-	accelBias[2] = (double)accel_bias[2]/(double)accelsensitivity;
+// Load the biases of an earlier calibration into the hardware offset registers, without measuring them again
+// The device is reset first, so initMPU9250 has to be called afterwards, as after calibrateMPU9250
+void MPU9250::loadBiases(const double * gyroDest, const double * accelDest)
+{
+	int32_t gyro_bias[3], accel_bias[3];
+
+	// Reset the device, which restores the factory trim of the accelerometer offset registers
+	writeByte(MPU9250_ADDRESS, PWR_MGMT_1, READ_FLAG);
+	usleep(100000);
+
+	for (int i = 0; i < 3; i++)
+	{
+		gyro_bias[i] = (int32_t)lround(gyroDest[i] * CAL_GYRO_SENSITIVITY);
+		accel_bias[i] = (int32_t)lround(accelDest[i] * CAL_ACCEL_SENSITIVITY);
+		gyroBias[i] = gyroDest[i];
+		accelBias[i] = accelDest[i];
+	}
+	writeGyroOffsets(gyro_bias);
+	writeAccelOffsets(accel_bias);
 }
 
+// Read the registers identifying the sensor: WHO_AM_I and the factory self-test codes
+// of the gyroscope and the accelerometer, which are programmed into every chip
+void MPU9250::readIdentity(uint8_t * destination)
+{
+	destination[0] = readByte(MPU9250_ADDRESS, WHO_AM_I_MPU9250);
+	readBytes(MPU9250_ADDRESS, SELF_TEST_X_GYRO, 3, &destination[1]);
+	readBytes(MPU9250_ADDRESS, SELF_TEST_X_ACCEL, 3, &destination[4]);
+}
 
 // Accelerometer and gyroscope self test; check calibration wrt factory settings
 // Should return percent deviation from factory trim values, +/- 14 or less
@@ -665,49 +823,17 @@ void MPU9250::magCalMPU9250(double * bias_dest, double * scale_dest)
 }
 
 
-int8_t MPU9250::i2cAddr(int devAddress)
-{
-	if( ioctl(i2c_descriptor, I2C_SLAVE, devAddress) < 0 )
-	{
-		throw "Error accessing I2C bus.";
-		return -1;
-	}
-	return 0;
-}
-
 uint8_t MPU9250::writeByte(uint8_t devAddress, uint8_t registerAddress, uint8_t data)
 {
-	i2cAddr(devAddress);
-
-	int bytes_written;
-	int8_t buf[2];
-
-	buf[0] = registerAddress;
-	buf[1] = data;
-
-	bytes_written = write(i2c_descriptor, buf, 2);
-	if(bytes_written == -1)
-		throw "Problem with writing to I2C";
-
-	return bytes_written;
+	bus->write(devAddress, registerAddress, data);
+	return 2;
 }
 
 // Read a byte from the given register address from device using I2C
 uint8_t MPU9250::readByte(uint8_t devAddress, uint8_t registerAddress)
 {
-	i2cAddr(devAddress);
-	uint8_t buf[2] = {registerAddress};
-	if((write(i2c_descriptor, buf, 1)) != 1)
-	{
-		throw "Error communicating on I2C.";
-	}
-
-	if( read(i2c_descriptor, buf, 1) != 1 )
-	{
-		throw "Failed to read from I2C bus.";
-		return 2;
-	}
-
+	uint8_t buf[1];
+	readBytes(devAddress, registerAddress, 1, buf);
 	return buf[0];
 }
 
@@ -715,19 +841,9 @@ uint8_t MPU9250::readByte(uint8_t devAddress, uint8_t registerAddress)
 uint8_t MPU9250::readBytes(uint8_t devAddress, uint8_t registerAddress, uint8_t count,
 		uint8_t *dest)
 {
-	i2cAddr(devAddress);
-	uint8_t buf[1] = {registerAddress};
-	uint8_t bytes_read;
-
-	if((write(i2c_descriptor, buf, 1)) != 1)
-	{
-		throw "Error communicating on I2C.";
-	}
-
 	if(!dest)
-		bytes_read = read(i2c_descriptor, rx_buffer, count);
-	else
-		bytes_read = read(i2c_descriptor, dest, count);
+		dest = rx_buffer;
 
-	return bytes_read;
+	bus->read(devAddress, registerAddress, count, dest);
+	return count;
 }
@@ -13,12 +13,9 @@
 #include <cmath>
 #include <unistd.h>
 #include <chrono>
-#include <fcntl.h>
-#include <sys/ioctl.h>
 #include <stdint.h>
-#include <linux/i2c.h>
-#include <linux/i2c-dev.h>
 #include "MPU9250_Constants.h"
+#include "I2CBus.h"
 
 
 // Using the MPU-9250 breakout board, ADO is set to 0
@@ -36,15 +33,27 @@
 #define READ_FLAG 0x80
 #define DEG_TO_RAD 0.0174532925
 #define RAD_TO_DEG 57.295779513
+#define TEMP_SENSITIVITY 333.87  // Temperature LSB per degree Celsius
+#define TEMP_OFFSET 21.0  // Temperature in Celsius at a reading of zero
+
+#define CAL_GYRO_SENSITIVITY 131  // LSB per degree/s at the 250 degrees/s range used by the calibration
+#define CAL_ACCEL_SENSITIVITY 16384  // LSB per g at the 2 g range used by the calibration
+#define IDENTITY_SIZE 7  // Bytes returned by readIdentity
+
+#define FIFO_SIZE 512  // Bytes the FIFO holds
+#define FIFO_SAMPLE_SIZE 14  // Accelerometer, temperature and gyroscope, in register order
+#define FIFO_BASE_RATE 1000.0  // Hz, the sample rate is divided from it by 1 + SMPLRT_DIV
 
 class MPU9250
 {
 private:
 	uint8_t rx_buffer[15]; // Save the received bytes
-	int i2c_descriptor; // I2C file descriptor is saved
-	char *i2c_bus = (char*)"/dev/i2c-1"; // Choose what I2C bus you want
+	LinuxI2CBus hardware{"/dev/i2c-1"}; // Choose what I2C bus you want
+	I2CBus *bus = &hardware; // The bus in use, the hardware one or a capture
+	double lastUpdate = -1.0; // Time of the last updateTime, -1 before the first one
 
-	int8_t i2cAddr(int address); // Start a device communication
+	void writeGyroOffsets(const int32_t *);
+	void writeAccelOffsets(const int32_t *);
 protected:
 	// Set initial input parameters
 	enum Ascale
@@ -106,24 +115,41 @@ public:
 		  accelBias[3] = {0, 0, 0},
 		  magBias[3]   = {0, 0, 0},
 		  magScale[3]  = {0, 0, 0};
+	// Soft iron correction of the magnetometer, applied after the bias, identity until calibrated
+	double magMatrix[3][3] = {{1, 0, 0}, {0, 1, 0}, {0, 0, 1}};
 	double selfTest[6];
 	// Stores the 16-bit signed accelerometer sensor output
 	int16_t accelCount[3];
 
 	// Public method declarations
 	MPU9250();
+	void setBus(I2CBus *);
+	I2CBus &hardwareBus();
+	double now();
 	void getMres();
 	void getGres();
 	void getAres();
 	void readAccelData(int16_t *);
 	void readGyroData(int16_t *);
-	void readMagData(int16_t *);
+	bool readMagData(int16_t *);  // Returns false and leaves the counts unchanged when no new data is ready
+	void scaleMagData(const int16_t *, double *);
 	int16_t readTempData();
+	int16_t readMotionData(int16_t *, int16_t *);
+
+	void enableFifo(uint8_t rateDivider);
+	void disableFifo();
+	void resetFifo();
+	bool fifoOverflowed();
+	uint16_t readFifoCount();
+	uint16_t readFifo(int16_t *, uint16_t);
 
 	void updateTime();
 	void initAK8963(double *);
+	void startAK8963();
 	void initMPU9250();
 	void calibrateMPU9250(double * gyroBias, double * accelBias);
+	void loadBiases(const double * gyroBias, const double * accelBias);
+	void readIdentity(uint8_t * destination);
 	void MPU9250SelfTest(double * destination);
 	void magCalMPU9250(double * dest1, double * dest2);
 	uint8_t readByte(uint8_t address, uint8_t regAddress);
@@ -1,14 +1,44 @@
-#include <python3.5/Python.h>
+#include <Python.h>
+#include <memory>
+#include <algorithm>
 #include "MPU9250.h"
+#include "Sampler.h"
+#include "FifoStream.h"
+#include "ReplayBus.h"
 #include "../Quaternion/quaternionFilters.h"
 
 // static PyObject *mpuError; // Define an exception object for the module, it is a good idea to do it in every module
 MPU9250 mpu; // Create the mpu object to use in functions
+std::mutex bus_mutex; // Held for every access to the sensor, shared with the sampling thread
+Sampler sampler(mpu, bus_mutex); // Background sampling thread
+FifoStream fifo(mpu, bus_mutex); // Streaming through the hardware FIFO
+std::unique_ptr<ReplayBus> replay; // Capture replayed in place of the sensor, if any
+std::unique_ptr<RecordingBus> recording; // Capture being recorded from the sensor, if any
+
+// Holds the bus with the GIL released, so the other Python threads run while this one waits for the bus or uses it
+// No Python object may be used while it exists. An exception thrown in its scope releases it before the handler runs.
+class BusLock
+{
+private:
+	PyThreadState *state;
+
+public:
+	BusLock() : state(PyEval_SaveThread())
+	{
+		bus_mutex.lock();
+	}
+	~BusLock()
+	{
+		bus_mutex.unlock();
+		PyEval_RestoreThread(state);
+	}
+};
 
 static PyObject* initMPU9250(PyObject* self)
 {
 	try
 	{
+		BusLock lock;
 		mpu.initMPU9250();
 	}
 	catch(const char *msg)
@@ -16,16 +46,30 @@ static PyObject* initMPU9250(PyObject* self)
 		PyErr_Format(PyExc_OSError, "OSError: %s", msg);
 		return NULL;
 	}
-	return Py_None;
+	Py_RETURN_NONE;
 }
 
-static PyObject* initAK8963(PyObject* self)
+static PyObject* initAK8963(PyObject* self, PyObject* args)
 {
-	PyObject* fact_values = PyList_New((Py_ssize_t)3);
+	double factory[3];
+	bool saved = PyTuple_Size(args) > 0;
+	if(!PyArg_ParseTuple(args, "|(ddd)", &factory[0], &factory[1], &factory[2]))
+		return NULL;
 
 	try
 	{
-		mpu.initAK8963(mpu.factoryMagCalibration);
+		BusLock lock;
+		if(saved)
+		{
+			// A saved sensitivity adjustment, the fuse ROM is not read again
+			for(int i = 0; i < 3; i++)
+				mpu.factoryMagCalibration[i] = factory[i];
+			mpu.startAK8963();
+		}
+		else
+			mpu.initAK8963(mpu.factoryMagCalibration);
+		for(int i = 0; i < 3; i++)
+			factory[i] = mpu.factoryMagCalibration[i];
 	}
 	catch(const char *msg)
 	{
@@ -33,21 +77,26 @@ static PyObject* initAK8963(PyObject* self)
 		return NULL;
 	}
 
+	PyObject* fact_values = PyList_New((Py_ssize_t)3);
 	for(int i = 0; i < 3; i++)
-		PyList_SetItem(fact_values, (Py_ssize_t)i, Py_BuildValue("d", mpu.factoryMagCalibration[i]));
+		PyList_SetItem(fact_values, (Py_ssize_t)i, Py_BuildValue("d", factory[i]));
 
 	return fact_values;
 }
 
 static PyObject* calibrateMPU9250(PyObject* self)
 {
-	PyObject* gyroBias = PyList_New((Py_ssize_t)3);
-	PyObject* accelBias = PyList_New((Py_ssize_t)3);
-	PyObject* biasList = PyList_New((Py_ssize_t)2);
+	double gyro[3], accel[3];
 
 	try
 	{
+		BusLock lock; // The calibration averages the sensor for a while
 		mpu.calibrateMPU9250(mpu.gyroBias, mpu.accelBias);
+		for(int i = 0; i < 3; i++)
+		{
+			gyro[i] = mpu.gyroBias[i];
+			accel[i] = mpu.accelBias[i];
+		}
 	}
 	catch(const char *msg)
 	{
@@ -55,10 +104,13 @@ static PyObject* calibrateMPU9250(PyObject* self)
 		return NULL;
 	}
 
+	PyObject* gyroBias = PyList_New((Py_ssize_t)3);
+	PyObject* accelBias = PyList_New((Py_ssize_t)3);
+	PyObject* biasList = PyList_New((Py_ssize_t)2);
 	for(int i = 0; i < 3; i++)
 	{
-		PyList_SetItem(gyroBias, (Py_ssize_t)i, Py_BuildValue("d", mpu.gyroBias[i]));
-		PyList_SetItem(accelBias, (Py_ssize_t)i, Py_BuildValue("d", mpu.accelBias[i]));
+		PyList_SetItem(gyroBias, (Py_ssize_t)i, Py_BuildValue("d", gyro[i]));
+		PyList_SetItem(accelBias, (Py_ssize_t)i, Py_BuildValue("d", accel[i]));
 	}
 	PyList_SetItem(biasList, (Py_ssize_t)0, gyroBias);
 	PyList_SetItem(biasList, (Py_ssize_t)1, accelBias);
@@ -66,15 +118,59 @@ static PyObject* calibrateMPU9250(PyObject* self)
 	return biasList;
 }
 
+static PyObject* loadBiases(PyObject* self, PyObject* args)
+{
+	double gyroBias[3], accelBias[3];
+	if(!PyArg_ParseTuple(args, "(ddd)(ddd)", &gyroBias[0], &gyroBias[1], &gyroBias[2],
+			&accelBias[0], &accelBias[1], &accelBias[2]))
+		return NULL;
+
+	try
+	{
+		BusLock lock; // The device is reset first
+		mpu.loadBiases(gyroBias, accelBias);
+	}
+	catch(const char *msg)
+	{
+		PyErr_Format(PyExc_OSError, "OSError: %s", msg);
+		return NULL;
+	}
+
+	Py_RETURN_NONE;
+}
+
+static PyObject* getSensorId(PyObject* self)
+{
+	uint8_t identity[IDENTITY_SIZE];
+
+	try
+	{
+		BusLock lock;
+		mpu.readIdentity(identity);
+	}
+	catch(const char *msg)
+	{
+		PyErr_Format(PyExc_OSError, "OSError: %s", msg);
+		return NULL;
+	}
+
+	return PyUnicode_FromFormat("%02X-%02X%02X%02X%02X%02X%02X", identity[0], identity[1], identity[2],
+			identity[3], identity[4], identity[5], identity[6]);
+}
+
 static PyObject* magCalMPU9250(PyObject* self)
 {
-	PyObject* magBias = PyList_New((Py_ssize_t)3);
-	PyObject* magScale = PyList_New((Py_ssize_t)3);
-	PyObject* biasList = PyList_New((Py_ssize_t)2);
+	double bias[3], scale[3];
 
 	try
 	{
+		BusLock lock; // The sensor has to be waved around for about 15 seconds
 		mpu.magCalMPU9250(mpu.magBias, mpu.magScale);
+		for(int i = 0; i < 3; i++)
+		{
+			bias[i] = mpu.magBias[i];
+			scale[i] = mpu.magScale[i];
+		}
 	}
 	catch(const char *msg)
 	{
@@ -82,10 +178,13 @@ static PyObject* magCalMPU9250(PyObject* self)
 		return NULL;
 	}
 
+	PyObject* magBias = PyList_New((Py_ssize_t)3);
+	PyObject* magScale = PyList_New((Py_ssize_t)3);
+	PyObject* biasList = PyList_New((Py_ssize_t)2);
 	for(int i = 0; i < 3; i++)
 	{
-		PyList_SetItem(magBias, (Py_ssize_t)i, Py_BuildValue("d", mpu.magBias[i]));
-		PyList_SetItem(magScale, (Py_ssize_t)i, Py_BuildValue("d", mpu.magScale[i]));
+		PyList_SetItem(magBias, (Py_ssize_t)i, Py_BuildValue("d", bias[i]));
+		PyList_SetItem(magScale, (Py_ssize_t)i, Py_BuildValue("d", scale[i]));
 	}
 	PyList_SetItem(biasList, (Py_ssize_t)0, magBias);
 	PyList_SetItem(biasList, (Py_ssize_t)1, magScale);
@@ -95,11 +194,14 @@ static PyObject* magCalMPU9250(PyObject* self)
 
 static PyObject* MPU9250SelfTest(PyObject* self)
 {
-	PyObject* test_results = PyList_New((Py_ssize_t)6);
+	double results[6];
 
 	try
 	{
+		BusLock lock;
 		mpu.MPU9250SelfTest(mpu.selfTest);
+		for(int i = 0; i < 6; i++)
+			results[i] = mpu.selfTest[i];
 	}
 	catch(const char *msg)
 	{
@@ -107,31 +209,107 @@ static PyObject* MPU9250SelfTest(PyObject* self)
 		return NULL;
 	}
 
+	PyObject* test_results = PyList_New((Py_ssize_t)6);
 	for(int i = 0; i < 6; i++)
-		PyList_SetItem(test_results, (Py_ssize_t)i, Py_BuildValue("d", mpu.selfTest[i]));
+		PyList_SetItem(test_results, (Py_ssize_t)i, Py_BuildValue("d", results[i]));
 
 	return test_results;
 }
 
 static PyObject* getAres(PyObject* self)
 {
-	mpu.getAres();
+	double resolution;
+	{
+		BusLock lock;
+		mpu.getAres();
+		resolution = mpu.aRes;
+	}
 
-	return Py_BuildValue("d", mpu.aRes);
+	return Py_BuildValue("d", resolution);
 }
 
 static PyObject* getGres(PyObject* self)
 {
-	mpu.getGres();
+	double resolution;
+	{
+		BusLock lock;
+		mpu.getGres();
+		resolution = mpu.gRes;
+	}
 
-	return Py_BuildValue("d", mpu.gRes);
+	return Py_BuildValue("d", resolution);
 }
 
 static PyObject* getMres(PyObject* self)
 {
-	mpu.getMres();
+	double resolution;
+	{
+		BusLock lock;
+		mpu.getMres();
+		resolution = mpu.mRes;
+	}
+
+	return Py_BuildValue("d", resolution);
+}
+
+
+/*
+ * Magnetometer calibration section
+ */
+
+// Scale from the raw magnetometer counts to milliGauss, before the bias and the soft iron matrix
+static PyObject* getMagScale(PyObject* self)
+{
+	double scale[3];
+	{
+		BusLock lock;
+		for(int i = 0; i < 3; i++)
+			scale[i] = mpu.mRes * mpu.factoryMagCalibration[i];
+	}
+
+	return Py_BuildValue("(ddd)", scale[0], scale[1], scale[2]);
+}
+
+static PyObject* setMagCalibration(PyObject* self, PyObject* args)
+{
+	double bias[3], matrix[3][3];
+	if(!PyArg_ParseTuple(args, "(ddd)((ddd)(ddd)(ddd))", &bias[0], &bias[1], &bias[2],
+			&matrix[0][0], &matrix[0][1], &matrix[0][2],
+			&matrix[1][0], &matrix[1][1], &matrix[1][2],
+			&matrix[2][0], &matrix[2][1], &matrix[2][2]))
+		return NULL;
+
+	// Taken with the bus, so the sampling thread never converts a sample with half of the calibration
+	{
+		BusLock lock;
+		for(int i = 0; i < 3; i++)
+		{
+			mpu.magBias[i] = bias[i];
+			for(int j = 0; j < 3; j++)
+				mpu.magMatrix[i][j] = matrix[i][j];
+		}
+	}
+
+	Py_RETURN_NONE;
+}
+
+static PyObject* getMagCalibration(PyObject* self)
+{
+	double bias[3], matrix[3][3];
+	{
+		BusLock lock;
+		for(int i = 0; i < 3; i++)
+		{
+			bias[i] = mpu.magBias[i];
+			for(int j = 0; j < 3; j++)
+				matrix[i][j] = mpu.magMatrix[i][j];
+		}
+	}
 
-	return Py_BuildValue("d", mpu.mRes);
+	return Py_BuildValue("((ddd)((ddd)(ddd)(ddd)))", bias[0], bias[1], bias[2],
+			matrix[0][0], matrix[0][1], matrix[0][2],
+			matrix[1][0], matrix[1][1], matrix[1][2],
+			matrix[2][0], matrix[2][1], matrix[2][2]);
 }
 
 
@@ -140,11 +318,14 @@ static PyObject* getMres(PyObject* self)
  */
 static PyObject* readAccelDataRaw(PyObject* self)
 {
-	PyObject* raw_data = PyList_New((Py_ssize_t)3);
+	int16_t counts[3];
 
 	try
 	{
+		BusLock lock;
 		mpu.readAccelData(mpu.accelCount);
+		for(int i = 0; i < 3; i++)
+			counts[i] = mpu.accelCount[i];
 	}
 	catch(const char *msg)
 	{
@@ -152,17 +333,24 @@ static PyObject* readAccelDataRaw(PyObject* self)
 		return NULL;
 	}
 
+	PyObject* raw_data = PyList_New((Py_ssize_t)3);
 	for(int i = 0; i < 3; i++)
-		PyList_SetItem(raw_data, (Py_ssize_t)i, Py_BuildValue("d", mpu.accelCount[i]));
+		PyList_SetItem(raw_data, (Py_ssize_t)i, Py_BuildValue("d", (double)counts[i]));
 
 	return raw_data;
 }
 
 static PyObject* readAccelData(PyObject* self)
 {
+	double values[3];
+
 	try
 	{
+		BusLock lock;
 		mpu.readAccelData(mpu.accelCount);
+		mpu.ax = values[0] = (double)mpu.accelCount[0] * mpu.aRes;
+		mpu.ay = values[1] = (double)mpu.accelCount[1] * mpu.aRes;
+		mpu.az = values[2] = (double)mpu.accelCount[2] * mpu.aRes;
 	}
 	catch(const char *msg)
 	{
@@ -170,20 +358,19 @@ static PyObject* readAccelData(PyObject* self)
 		return NULL;
 	}
 
-	mpu.ax = (double)mpu.accelCount[0] * mpu.aRes;
-	mpu.ay = (double)mpu.accelCount[1] * mpu.aRes;
-	mpu.az = (double)mpu.accelCount[2] * mpu.aRes;
-
-	return Py_BuildValue("ddd", mpu.ax, mpu.ay, mpu.az);
+	return Py_BuildValue("ddd", values[0], values[1], values[2]);
 }
 
 static PyObject* readGyroDataRaw(PyObject* self)
 {
-	PyObject* raw_data = PyList_New((Py_ssize_t)3);
+	int16_t counts[3];
 
 	try
 	{
+		BusLock lock;
 		mpu.readGyroData(mpu.gyroCount);
+		for(int i = 0; i < 3; i++)
+			counts[i] = mpu.gyroCount[i];
 	}
 	catch(const char *msg)
 	{
@@ -191,17 +378,24 @@ static PyObject* readGyroDataRaw(PyObject* self)
 		return NULL;
 	}
 
+	PyObject* raw_data = PyList_New((Py_ssize_t)3);
 	for(int i = 0; i < 3; i++)
-		PyList_SetItem(raw_data, (Py_ssize_t)i, Py_BuildValue("d", mpu.gyroCount[i]));
+		PyList_SetItem(raw_data, (Py_ssize_t)i, Py_BuildValue("d", (double)counts[i]));
 
 	return raw_data;
 }
 
 static PyObject* readGyroData(PyObject* self)
 {
+	double values[3];
+
 	try
 	{
+		BusLock lock;
 		mpu.readGyroData(mpu.gyroCount);
+		mpu.gx = values[0] = (double)mpu.gyroCount[0] * mpu.gRes;
+		mpu.gy = values[1] = (double)mpu.gyroCount[1] * mpu.gRes;
+		mpu.gz = values[2] = (double)mpu.gyroCount[2] * mpu.gRes;
 	}
 	catch(const char *msg)
 	{
@@ -209,20 +403,19 @@ static PyObject* readGyroData(PyObject* self)
 		return NULL;
 	}
 
-	mpu.gx = (double)mpu.gyroCount[0] * mpu.gRes;
-	mpu.gy = (double)mpu.gyroCount[1] * mpu.gRes;
-	mpu.gz = (double)mpu.gyroCount[2] * mpu.gRes;
-
-	return Py_BuildValue("ddd", mpu.gx, mpu.gy, mpu.gz);
+	return Py_BuildValue("ddd", values[0], values[1], values[2]);
 }
 
 static PyObject* readMagDataRaw(PyObject* self)
 {
-	PyObject* raw_data = PyList_New((Py_ssize_t)3);
+	int16_t counts[3];
 
 	try
 	{
+		BusLock lock;
 		mpu.readMagData(mpu.magCount);
+		for(int i = 0; i < 3; i++)
+			counts[i] = mpu.magCount[i];
 	}
 	catch(const char *msg)
 	{
@@ -230,17 +423,25 @@ static PyObject* readMagDataRaw(PyObject* self)
 		return NULL;
 	}
 
+	PyObject* raw_data = PyList_New((Py_ssize_t)3);
 	for(int i = 0; i < 3; i++)
-		PyList_SetItem(raw_data, (Py_ssize_t)i, Py_BuildValue("d", mpu.magCount[i]));
+		PyList_SetItem(raw_data, (Py_ssize_t)i, Py_BuildValue("d", (double)counts[i]));
 
 	return raw_data;
 }
 
 static PyObject* readMagData(PyObject* self)
 {
+	double mag[3];
+
 	try
 	{
+		BusLock lock;
 		mpu.readMagData(mpu.magCount);
+		mpu.scaleMagData(mpu.magCount, mag);
+		mpu.mx = mag[0];
+		mpu.my = mag[1];
+		mpu.mz = mag[2];
 	}
 	catch(const char *msg)
 	{
@@ -248,14 +449,7 @@ static PyObject* readMagData(PyObject* self)
 		return NULL;
 	}
 
-	mpu.mx = (double)mpu.magCount[0] * mpu.mRes
-			* mpu.factoryMagCalibration[0] - mpu.magBias[0];
-	mpu.my = (double)mpu.magCount[1] * mpu.mRes
-			* mpu.factoryMagCalibration[1] - mpu.magBias[1];
-	mpu.mz = (double)mpu.magCount[2] * mpu.mRes
-			* mpu.factoryMagCalibration[2] - mpu.magBias[2];
-
-	return Py_BuildValue("ddd", mpu.mx, mpu.my, mpu.mz);
+	return Py_BuildValue("ddd", mag[0], mag[1], mag[2]);
 }
 
 static PyObject* readTempDataRaw(PyObject* self)
@@ -264,7 +458,8 @@ static PyObject* readTempDataRaw(PyObject* self)
 
 	try
 	{
-                temperature = mpu.readTempData();
+		BusLock lock;
+		temperature = mpu.readTempData();
 	}
 	catch(const char *msg)
 	{
@@ -278,45 +473,459 @@ static PyObject* readTempDataRaw(PyObject* self)
 static PyObject* getData(PyObject* self)
 {
 	double* q_val = NULL;
-	if(mpu.readByte(MPU9250_ADDRESS, INT_STATUS) & 0x01)
+	double values[13];
+
+	try
 	{
-		mpu.readAccelData(mpu.accelCount);
+		// The filter state is shared by the callers too, so it is updated with the bus held
+		BusLock lock;
+		if(mpu.readByte(MPU9250_ADDRESS, INT_STATUS) & 0x01)
+		{
+			// Accelerometer, temperature and gyroscope in one burst
+			mpu.tempCount = mpu.readMotionData(mpu.accelCount, mpu.gyroCount);
 
-		mpu.ax = (double)mpu.accelCount[0] * mpu.aRes;
-		mpu.ay = (double)mpu.accelCount[1] * mpu.aRes;
-		mpu.az = (double)mpu.accelCount[2] * mpu.aRes;
+			mpu.ax = (double)mpu.accelCount[0] * mpu.aRes;
+			mpu.ay = (double)mpu.accelCount[1] * mpu.aRes;
+			mpu.az = (double)mpu.accelCount[2] * mpu.aRes;
 
-		mpu.readGyroData(mpu.gyroCount);
+			mpu.gx = (double)mpu.gyroCount[0] * mpu.gRes;
+			mpu.gy = (double)mpu.gyroCount[1] * mpu.gRes;
+			mpu.gz = (double)mpu.gyroCount[2] * mpu.gRes;
 
-		mpu.gx = (double)mpu.gyroCount[0] * mpu.gRes;
-		mpu.gy = (double)mpu.gyroCount[1] * mpu.gRes;
-		mpu.gz = (double)mpu.gyroCount[2] * mpu.gRes;
+			mpu.temperature = (double)mpu.tempCount / TEMP_SENSITIVITY + TEMP_OFFSET;
 
-		mpu.readMagData(mpu.magCount);
+			mpu.readMagData(mpu.magCount);
+
+			double mag[3];
+			mpu.scaleMagData(mpu.magCount, mag);
+			mpu.mx = mag[0];
+			mpu.my = mag[1];
+			mpu.mz = mag[2];
+		}
+
+		mpu.updateTime();
+		MahonyQuaternionUpdate(mpu.ax, mpu.ay, mpu.az,
+				mpu.gx * DEG_TO_RAD, mpu.gy * DEG_TO_RAD, mpu.gz * DEG_TO_RAD,
+				mpu.my, mpu.mx, mpu.mz, mpu.deltat);
+		q_val = getQ();
 
-		mpu.mx = (double)mpu.magCount[0] * mpu.mRes
-						* mpu.factoryMagCalibration[0] - mpu.magBias[0];
-		mpu.my = (double)mpu.magCount[1] * mpu.mRes
-						* mpu.factoryMagCalibration[1] - mpu.magBias[1];
-		mpu.mz = (double)mpu.magCount[2] * mpu.mRes
-						* mpu.factoryMagCalibration[2] - mpu.magBias[2];
+
+		mpu.yaw   = atan2(2.0 * (q_val[1] * q_val[2] + q_val[0] * q_val[3]),
+						q_val[0] * q_val[0] + q_val[1]
+							* q_val[1] - q_val[2] * q_val[2] - q_val[3] * q_val[3]) * RAD_TO_DEG;
+		mpu.pitch = -asin(2.0 * (q_val[1] * q_val[3] - q_val[0] * q_val[2])) * RAD_TO_DEG;
+		mpu.roll  = atan2(2.0 * (q_val[0] * q_val[1] + q_val[2] * q_val[3]),
+						q_val[0] * q_val[0] - q_val[1]
+							* q_val[1] - q_val[2] * q_val[2] + q_val[3] * q_val[3]) * RAD_TO_DEG;
+
+		// The orientation followed by the sensor values it was computed from
+		double current[13] = {mpu.yaw, mpu.pitch, mpu.roll, mpu.ax, mpu.ay, mpu.az,
+				mpu.gx, mpu.gy, mpu.gz, mpu.mx, mpu.my, mpu.mz, mpu.temperature};
+		std::copy(current, current + 13, values);
+	}
+	catch(const char *msg)
+	{
+		PyErr_Format(PyExc_OSError, "OSError: %s", msg);
+		return NULL;
 	}
-	mpu.updateTime();
-	MahonyQuaternionUpdate(mpu.ax, mpu.ay, mpu.az,
-			mpu.gx * DEG_TO_RAD, mpu.gy * DEG_TO_RAD, mpu.gz * DEG_TO_RAD,
-			mpu.my, mpu.mx, mpu.mz, mpu.deltat);
-	q_val = getQ();
 
+	return Py_BuildValue("(ddddddddddddd)", values[0], values[1], values[2], values[3], values[4], values[5],
+			values[6], values[7], values[8], values[9], values[10], values[11], values[12]);
+}
 
-	mpu.yaw   = atan2(2.0 * (q_val[1] * q_val[2] + q_val[0] * q_val[3]),
-					q_val[0] * q_val[0] + q_val[1]
-						* q_val[1] - q_val[2] * q_val[2] - q_val[3] * q_val[3]) * RAD_TO_DEG;
-	mpu.pitch = -asin(2.0 * (q_val[1] * q_val[3] - q_val[0] * q_val[2])) * RAD_TO_DEG;
-	mpu.roll  = atan2(2.0 * (q_val[0] * q_val[1] + q_val[2] * q_val[3]),
-					q_val[0] * q_val[0] - q_val[1]
-						* q_val[1] - q_val[2] * q_val[2] + q_val[3] * q_val[3]) * RAD_TO_DEG;
+/*
+ * Background sampling section
+ */
+
+// Samples drained from the ring, exposed through the buffer protocol
+// as a 2D array of doubles with one row of SAMPLE_FIELDS values per sample
+typedef struct
+{
+	PyObject_HEAD
+	ImuSample *samples;
+	Py_ssize_t shape[2];
+	Py_ssize_t strides[2];
+} SampleBufferObject;
+
+static void SampleBuffer_dealloc(SampleBufferObject* self)
+{
+	PyMem_Free(self->samples);
+	Py_TYPE(self)->tp_free((PyObject*)self);
+}
+
+static int SampleBuffer_getbuffer(SampleBufferObject* self, Py_buffer* view, int flags)
+{
+	view->obj = (PyObject*)self;
+	Py_INCREF(self);
+	view->buf = (void*)self->samples;
+	view->len = self->shape[0] * SAMPLE_FIELDS * sizeof(double);
+	view->readonly = 0;
+	view->itemsize = sizeof(double);
+	view->format = (flags & PyBUF_FORMAT) ? (char*)"d" : NULL;
+	view->ndim = 2;
+	view->shape = (flags & PyBUF_ND) ? self->shape : NULL;
+	view->strides = (flags & PyBUF_STRIDES) ? self->strides : NULL;
+	view->suboffsets = NULL;
+	view->internal = NULL;
+	return 0;
+}
+
+static Py_ssize_t SampleBuffer_length(SampleBufferObject* self)
+{
+	return self->shape[0];
+}
+
+static PyBufferProcs SampleBuffer_as_buffer = {(getbufferproc)SampleBuffer_getbuffer, NULL};
+static PySequenceMethods SampleBuffer_as_sequence = {(lenfunc)SampleBuffer_length};
+static PyTypeObject SampleBufferType = {PyVarObject_HEAD_INIT(NULL, 0) "mpu9250.SampleBuffer"};
+
+// Create a buffer with room for count samples
+static SampleBufferObject* newSampleBuffer(size_t count)
+{
+	SampleBufferObject* buffer = PyObject_New(SampleBufferObject, &SampleBufferType);
+	if(buffer == NULL)
+		return NULL;
+	buffer->samples = (ImuSample*)PyMem_Malloc(count > 0 ? count * sizeof(ImuSample) : 1);
+	if(buffer->samples == NULL)
+	{
+		Py_DECREF(buffer);
+		PyErr_NoMemory();
+		return NULL;
+	}
+	buffer->shape[0] = (Py_ssize_t)count;
+	buffer->shape[1] = SAMPLE_FIELDS;
+	buffer->strides[0] = sizeof(ImuSample);
+	buffer->strides[1] = sizeof(double);
+	return buffer;
+}
+
+static PyObject* startSampling(PyObject* self, PyObject* args)
+{
+	double rate;
+	Py_ssize_t capacity = 4096;
+	if(!PyArg_ParseTuple(args, "d|n", &rate, &capacity))
+		return NULL;
+	if(rate <= 0.0 || capacity <= 0)
+	{
+		PyErr_SetString(PyExc_ValueError, "The rate and the capacity must be positive");
+		return NULL;
+	}
+
+	Py_BEGIN_ALLOW_THREADS // Stopping a running sampler waits for its thread
+	sampler.start(rate, (size_t)capacity);
+	Py_END_ALLOW_THREADS
 
-	return Py_BuildValue("ddd", mpu.yaw, mpu.pitch, mpu.roll);
+	Py_RETURN_NONE;
+}
+
+static PyObject* stopSampling(PyObject* self)
+{
+	Py_BEGIN_ALLOW_THREADS
+	sampler.stop();
+	Py_END_ALLOW_THREADS
+
+	Py_RETURN_NONE;
+}
+
+static PyObject* readSamples(PyObject* self, PyObject* args)
+{
+	Py_ssize_t max = 0;
+	if(!PyArg_ParseTuple(args, "|n", &max))
+		return NULL;
+
+	size_t count = sampler.available();
+	if(max > 0 && (size_t)max < count)
+		count = (size_t)max;
+
+	SampleBufferObject* buffer = newSampleBuffer(count);
+	if(buffer == NULL)
+		return NULL;
+	buffer->shape[0] = (Py_ssize_t)sampler.read(buffer->samples, count); // Never more than were available
+
+	return (PyObject*)buffer;
+}
+
+static PyObject* startMagTap(PyObject* self)
+{
+	sampler.startMagTap();
+
+	Py_RETURN_NONE;
+}
+
+static PyObject* stopMagTap(PyObject* self)
+{
+	sampler.stopMagTap();
+
+	Py_RETURN_NONE;
+}
+
+static PyObject* readMagTap(PyObject* self)
+{
+	MagCounts readings[MAG_TAP_CAPACITY];
+	size_t count = sampler.readMagTap(readings, MAG_TAP_CAPACITY);
+
+	PyObject* list = PyList_New((Py_ssize_t)count);
+	if(list == NULL)
+		return NULL;
+	for(size_t i = 0; i < count; i++)
+	{
+		PyObject* item = Py_BuildValue("(hhh)", readings[i].x, readings[i].y, readings[i].z);
+		if(item == NULL)
+		{
+			Py_DECREF(list);
+			return NULL;
+		}
+		PyList_SET_ITEM(list, (Py_ssize_t)i, item);
+	}
+
+	return list;
+}
+
+static PyObject* samplingStats(PyObject* self)
+{
+	return Py_BuildValue("(OKKKn)", sampler.running() ? Py_True : Py_False,
+			(unsigned long long)sampler.produced, (unsigned long long)sampler.dropped,
+			(unsigned long long)sampler.errors, (Py_ssize_t)sampler.available());
+}
+
+
+/*
+ * FIFO streaming section
+ */
+
+static PyObject* configureFifo(PyObject* self, PyObject* args)
+{
+	double rate, actual = 0.0;
+	if(!PyArg_ParseTuple(args, "d", &rate))
+		return NULL;
+	if(rate <= 0.0)
+	{
+		PyErr_SetString(PyExc_ValueError, "The rate must be positive");
+		return NULL;
+	}
+
+	const char *error = NULL;
+	Py_BEGIN_ALLOW_THREADS
+	try
+	{
+		actual = fifo.configure(rate);
+	}
+	catch(const char *msg)
+	{
+		error = msg;
+	}
+	Py_END_ALLOW_THREADS
+	if(error != NULL)
+	{
+		PyErr_Format(PyExc_OSError, "OSError: %s", error);
+		return NULL;
+	}
+
+	return Py_BuildValue("d", actual);
+}
+
+static PyObject* disableFifo(PyObject* self)
+{
+	const char *error = NULL;
+	Py_BEGIN_ALLOW_THREADS
+	try
+	{
+		fifo.disable();
+	}
+	catch(const char *msg)
+	{
+		error = msg;
+	}
+	Py_END_ALLOW_THREADS
+	if(error != NULL)
+	{
+		PyErr_Format(PyExc_OSError, "OSError: %s", error);
+		return NULL;
+	}
+
+	Py_RETURN_NONE;
+}
+
+static PyObject* readFifo(PyObject* self)
+{
+	if(!fifo.enabled)
+	{
+		PyErr_SetString(PyExc_RuntimeError, "The FIFO is not configured, call configureFifo first");
+		return NULL;
+	}
+
+	std::vector<ImuSample> samples;
+	const char *error = NULL;
+	Py_BEGIN_ALLOW_THREADS
+	try
+	{
+		fifo.read(samples);
+	}
+	catch(const char *msg)
+	{
+		error = msg;
+	}
+	Py_END_ALLOW_THREADS
+	if(error != NULL)
+	{
+		PyErr_Format(PyExc_OSError, "OSError: %s", error);
+		return NULL;
+	}
+
+	SampleBufferObject* buffer = newSampleBuffer(samples.size());
+	if(buffer == NULL)
+		return NULL;
+	std::copy(samples.begin(), samples.end(), buffer->samples);
+
+	return (PyObject*)buffer;
+}
+
+static PyObject* fifoStats(PyObject* self)
+{
+	return Py_BuildValue("(OKK)", fifo.enabled ? Py_True : Py_False,
+			(unsigned long long)fifo.samples, (unsigned long long)fifo.overflows);
+}
+
+
+/*
+ * Capture section
+ */
+
+static PyObject* openReplay(PyObject* self, PyObject* args, PyObject* kwargs)
+{
+	const char *path;
+	double speed = 0.0;
+	int loop = 0;
+	static const char *keywords[] = {"path", "speed", "loop", NULL};
+	if(!PyArg_ParseTupleAndKeywords(args, kwargs, "s|dp", (char**)keywords, &path, &speed, &loop))
+		return NULL;
+	if(speed < 0.0)
+	{
+		PyErr_SetString(PyExc_ValueError, "The speed must be positive, or 0 to replay as fast as possible");
+		return NULL;
+	}
+
+	bool recorded = false;
+	const char *error = NULL;
+	try
+	{
+		BusLock lock;
+		if(recording)
+			recorded = true;
+		else
+		{
+			std::unique_ptr<ReplayBus> opened(new ReplayBus(path, speed, loop != 0));
+			mpu.setBus(opened.get());
+			replay = std::move(opened); // The previous replay, if any, is closed
+		}
+	}
+	catch(const char *msg)
+	{
+		error = msg;
+	}
+	if(recorded)
+	{
+		PyErr_SetString(PyExc_RuntimeError, "A capture is being recorded, call stopRecording first");
+		return NULL;
+	}
+	if(error != NULL)
+	{
+		PyErr_Format(PyExc_OSError, "OSError: %s: %s", error, path);
+		return NULL;
+	}
+
+	Py_RETURN_NONE;
+}
+
+static PyObject* closeReplay(PyObject* self)
+{
+	{
+		BusLock lock;
+		if(replay)
+		{
+			mpu.setBus(NULL);
+			replay.reset();
+		}
+	}
+
+	Py_RETURN_NONE;
+}
+
+static PyObject* startRecording(PyObject* self, PyObject* args)
+{
+	const char *path;
+	if(!PyArg_ParseTuple(args, "s", &path))
+		return NULL;
+
+	bool replayed = false;
+	const char *error = NULL;
+	try
+	{
+		BusLock lock;
+		if(replay)
+			replayed = true;
+		else
+		{
+			mpu.setBus(NULL);
+			recording.reset(); // The previous recording, if any, is closed
+			recording.reset(new RecordingBus(mpu.hardwareBus(), path));
+			mpu.setBus(recording.get());
+		}
+	}
+	catch(const char *msg)
+	{
+		error = msg;
+	}
+	if(replayed)
+	{
+		PyErr_SetString(PyExc_RuntimeError, "A capture is being replayed, call closeReplay first");
+		return NULL;
+	}
+	if(error != NULL)
+	{
+		PyErr_Format(PyExc_OSError, "OSError: %s: %s", error, path);
+		return NULL;
+	}
+
+	Py_RETURN_NONE;
+}
+
+static PyObject* stopRecording(PyObject* self)
+{
+	unsigned long long records = 0;
+	{
+		BusLock lock;
+		if(recording)
+		{
+			records = recording->records;
+			mpu.setBus(NULL);
+			recording.reset(); // Writes the buffered records
+		}
+	}
+
+	return Py_BuildValue("K", records);
+}
+
+static PyObject* captureStats(PyObject* self)
+{
+	const char *source = "hardware";
+	unsigned long long transfers = 0, loops = 0;
+	{
+		BusLock lock;
+		if(replay)
+		{
+			source = "replay";
+			transfers = replay->reads;
+			loops = replay->loops;
+		}
+		else if(recording)
+		{
+			source = "recording";
+			transfers = recording->records;
+		}
+	}
+
+	return Py_BuildValue("(sKK)", source, transfers, loops);
 }
 
 static PyMethodDef mpu_methods[] =
@@ -324,13 +933,27 @@ static PyMethodDef mpu_methods[] =
 	// TODO: Add comments below
 	// "PythonName" C-function Name, argument presentation, description
 	{"initMPU9250", (PyCFunction)initMPU9250, METH_NOARGS, ""},
-	{"initAK8963", (PyCFunction)initAK8963, METH_NOARGS, ""},
+	{"initAK8963", (PyCFunction)initAK8963, METH_VARARGS,
+		"initAK8963(factory=None): Start the magnetometer and return its factory sensitivity adjustment\n"
+		"A saved adjustment can be given, so it is not read from the fuse ROM again"},
 	{"calibrateMPU9250", (PyCFunction)calibrateMPU9250, METH_NOARGS, ""},
+	{"loadBiases", (PyCFunction)loadBiases, METH_VARARGS,
+		"loadBiases(gyroBias, accelBias): Reset the device and load the biases returned by an earlier "
+		"calibrateMPU9250\nCall initMPU9250 afterwards"},
+	{"getSensorId", (PyCFunction)getSensorId, METH_NOARGS,
+		"Return the identity of the sensor, from its WHO_AM_I register and its factory self-test codes"},
 	{"magCalMPU9250", (PyCFunction)magCalMPU9250, METH_NOARGS, ""},
 	{"MPU9250SelfTest", (PyCFunction)MPU9250SelfTest, METH_NOARGS, ""},
 	{"getAres", (PyCFunction)getAres, METH_NOARGS, ""},
 	{"getGres", (PyCFunction)getGres, METH_NOARGS, ""},
 	{"getMres", (PyCFunction)getMres, METH_NOARGS, ""},
+	{"getMagScale", (PyCFunction)getMagScale, METH_NOARGS,
+		"Return the milliGauss per count of each magnetometer axis, factory sensitivity adjustment included"},
+	{"setMagCalibration", (PyCFunction)setMagCalibration, METH_VARARGS,
+		"setMagCalibration(bias, matrix): Set the hard iron bias in milliGauss and the 3x3 soft iron matrix\n"
+		"Every magnetometer reading becomes matrix * (counts * getMagScale() - bias)"},
+	{"getMagCalibration", (PyCFunction)getMagCalibration, METH_NOARGS,
+		"Return the (bias, matrix) of the magnetometer calibration"},
 	{"readAccelDataRaw", (PyCFunction)readAccelDataRaw, METH_NOARGS, ""},
 	{"readAccelData", (PyCFunction)readAccelData, METH_NOARGS, ""},
 	{"readGyroDataRaw", (PyCFunction)readGyroDataRaw, METH_NOARGS, ""},
@@ -338,7 +961,41 @@ static PyMethodDef mpu_methods[] =
 	{"readMagDataRaw", (PyCFunction)readMagDataRaw, METH_NOARGS, ""},
 	{"readMagData", (PyCFunction)readMagData, METH_NOARGS, ""},
 	{"readTempDataRaw", (PyCFunction)readTempDataRaw, METH_NOARGS, ""},
-	{"getData", (PyCFunction)getData, METH_NOARGS, ""},
+	{"getData", (PyCFunction)getData, METH_NOARGS,
+		"Update the orientation and return (yaw, pitch, roll, ax, ay, az, gx, gy, gz, mx, my, mz, temperature)"},
+	{"startSampling", (PyCFunction)startSampling, METH_VARARGS,
+		"startSampling(rate, capacity=4096): Sample the sensor at rate Hz in a background thread"},
+	{"stopSampling", (PyCFunction)stopSampling, METH_NOARGS, "Stop the background sampling thread"},
+	{"readSamples", (PyCFunction)readSamples, METH_VARARGS,
+		"readSamples(max=0): Drain up to max samples, all of them if 0, as a SampleBuffer of shape (N, 11)\n"
+		"Columns: timestamp, ax, ay, az, gx, gy, gz, mx, my, mz, temperature"},
+	{"configureFifo", (PyCFunction)configureFifo, METH_VARARGS,
+		"configureFifo(rate): Stream the samples through the hardware FIFO at up to 1000 Hz, return the actual rate"},
+	{"disableFifo", (PyCFunction)disableFifo, METH_NOARGS, "Stop streaming through the FIFO"},
+	{"readFifo", (PyCFunction)readFifo, METH_NOARGS,
+		"Read every sample queued in the FIFO as a SampleBuffer, with timestamps reconstructed from the sample period\n"
+		"An overflow discards the queued samples and is counted in fifoStats"},
+	{"fifoStats", (PyCFunction)fifoStats, METH_NOARGS,
+		"Return (enabled, samples, overflows) of the FIFO streaming"},
+	{"startMagTap", (PyCFunction)startMagTap, METH_NOARGS,
+		"Copy the new magnetometer readings of the background sampling to the tap, without taking the samples"},
+	{"stopMagTap", (PyCFunction)stopMagTap, METH_NOARGS, "Stop copying the magnetometer readings to the tap"},
+	{"readMagTap", (PyCFunction)readMagTap, METH_NOARGS,
+		"Return the raw counts (x, y, z) of the magnetometer readings copied to the tap since the last call"},
+	{"samplingStats", (PyCFunction)samplingStats, METH_NOARGS,
+		"Return (running, produced, dropped, errors, available) of the background sampling"},
+	{"openReplay", (PyCFunction)openReplay, METH_VARARGS | METH_KEYWORDS,
+		"openReplay(path, speed=0.0, loop=False): Answer the sensor reads from a capture file instead of the bus\n"
+		"The capture is replayed at speed times its recorded pace, or as fast as possible if 0, and the sensor "
+		"times are the recorded ones"},
+	{"closeReplay", (PyCFunction)closeReplay, METH_NOARGS, "Stop replaying, and use the I2C bus again"},
+	{"startRecording", (PyCFunction)startRecording, METH_VARARGS,
+		"startRecording(path): Record every transfer with the sensor into a capture file, for openReplay"},
+	{"stopRecording", (PyCFunction)stopRecording, METH_NOARGS,
+		"Stop recording and close the capture file, return the number of transfers recorded"},
+	{"captureStats", (PyCFunction)captureStats, METH_NOARGS,
+		"Return (mode, transfers, loops): 'hardware', 'replay' with the reads and loops replayed, or 'recording' "
+		"with the transfers recorded"},
 	{NULL, NULL, 0, NULL} //Sentinel, tell the API that we finished defining table
 };
 
@@ -356,5 +1013,22 @@ static struct PyModuleDef mpu9250Module =
 // A reference is created
 PyMODINIT_FUNC PyInit_mpu9250(void)
 {
-	return PyModule_Create(&mpu9250Module);
+	PyObject* module;
+
+	SampleBufferType.tp_basicsize = sizeof(SampleBufferObject);
+	SampleBufferType.tp_flags = Py_TPFLAGS_DEFAULT;
+	SampleBufferType.tp_doc = "Samples of the background sampling, supports the buffer protocol";
+	SampleBufferType.tp_dealloc = (destructor)SampleBuffer_dealloc;
+	SampleBufferType.tp_as_buffer = &SampleBuffer_as_buffer;
+	SampleBufferType.tp_as_sequence = &SampleBuffer_as_sequence;
+	if(PyType_Ready(&SampleBufferType) < 0)
+		return NULL;
+
+	module = PyModule_Create(&mpu9250Module);
+	if(module == NULL)
+		return NULL;
+
+	Py_INCREF(&SampleBufferType);
+	PyModule_AddObject(module, "SampleBuffer", (PyObject*)&SampleBufferType);
+	return module;
 }
@@ -0,0 +1,177 @@
+#include <string.h>
+#include <fcntl.h>
+#include <thread>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include "ReplayBus.h"
+
+static const char CAPTURE_MAGIC[4] = {'M', 'P', 'U', 'C'};
+
+RecordingBus::RecordingBus(I2CBus &bus, const char *path) : bus(bus)
+{
+	file = fopen(path, "wb");
+	if(file == NULL)
+		throw "Failed to create the capture file";
+	setvbuf(file, NULL, _IOFBF, 1 << 16); // The records are small, write them in large blocks
+
+	uint8_t header[CAPTURE_HEADER_SIZE] = {0};
+	memcpy(header, CAPTURE_MAGIC, sizeof(CAPTURE_MAGIC));
+	header[4] = CAPTURE_VERSION & 0xFF;
+	header[5] = CAPTURE_VERSION >> 8;
+	if(fwrite(header, 1, sizeof(header), file) != sizeof(header))
+	{
+		fclose(file);
+		throw "Failed to write the capture file";
+	}
+	start = std::chrono::steady_clock::now();
+}
+
+RecordingBus::~RecordingBus()
+{
+	fclose(file);
+}
+
+void RecordingBus::append(uint8_t kind, uint8_t device, uint8_t reg, uint8_t count, const uint8_t *data)
+{
+	uint64_t nanoseconds = std::chrono::duration_cast<std::chrono::nanoseconds>(
+			std::chrono::steady_clock::now() - start).count();
+	uint8_t header[CAPTURE_RECORD_SIZE];
+	for(int i = 0; i < 8; i++)
+		header[i] = (nanoseconds >> (8 * i)) & 0xFF;
+	header[8] = kind;
+	header[9] = device;
+	header[10] = reg;
+	header[11] = count;
+	if(fwrite(header, 1, sizeof(header), file) != sizeof(header) || fwrite(data, 1, count, file) != count)
+		throw "Failed to write the capture file";
+	records++;
+}
+
+void RecordingBus::write(uint8_t device, uint8_t reg, uint8_t data)
+{
+	bus.write(device, reg, data);
+	append(CAPTURE_WRITE, device, reg, 1, &data);
+}
+
+void RecordingBus::read(uint8_t device, uint8_t reg, uint8_t count, uint8_t *dest)
+{
+	bus.read(device, reg, count, dest);
+	append(CAPTURE_READ, device, reg, count, dest);
+}
+
+double RecordingBus::now()
+{
+	return bus.now();
+}
+
+
+ReplayBus::ReplayBus(const char *path, double speed, bool loop) : speed(speed), loop(loop)
+{
+	int descriptor = open(path, O_RDONLY);
+	if(descriptor < 0)
+		throw "Failed to open the capture file";
+	struct stat status;
+	if(fstat(descriptor, &status) < 0 || status.st_size < CAPTURE_HEADER_SIZE)
+	{
+		close(descriptor);
+		throw "Not an MPU9250 capture file";
+	}
+	size = (size_t)status.st_size;
+	void *mapping = mmap(NULL, size, PROT_READ, MAP_PRIVATE, descriptor, 0);
+	close(descriptor); // The mapping stays valid without the descriptor
+	if(mapping == MAP_FAILED)
+		throw "Failed to map the capture file";
+	data = (const uint8_t*)mapping;
+	madvise(mapping, size, MADV_SEQUENTIAL);
+
+	if(memcmp(data, CAPTURE_MAGIC, sizeof(CAPTURE_MAGIC)) != 0 || (data[4] | data[5] << 8) != CAPTURE_VERSION)
+	{
+		munmap(mapping, size);
+		throw "Not an MPU9250 capture file, or of another version";
+	}
+	start = std::chrono::steady_clock::now();
+}
+
+ReplayBus::~ReplayBus()
+{
+	munmap((void*)data, size);
+}
+
+// Step to the next record, returns false at the end of the capture
+// A record cut short, as the last one of an interrupted recording may be, is the end
+bool ReplayBus::next(size_t &record, uint8_t &kind, uint8_t &device, uint8_t &reg, uint8_t &count)
+{
+	if(position + CAPTURE_RECORD_SIZE > size)
+		return false;
+	count = data[position + 11];
+	if(position + CAPTURE_RECORD_SIZE + count > size)
+		return false;
+	record = position;
+	kind = data[position + 8];
+	device = data[position + 9];
+	reg = data[position + 10];
+	position += CAPTURE_RECORD_SIZE + count;
+	return true;
+}
+
+double ReplayBus::recordTime(size_t record) const
+{
+	uint64_t nanoseconds = 0;
+	for(int i = 0; i < 8; i++)
+		nanoseconds |= (uint64_t)data[record + i] << (8 * i);
+	return (double)nanoseconds / 1e9;
+}
+
+// The writes of the driver are not checked against the capture
+void ReplayBus::write(uint8_t device, uint8_t reg, uint8_t data)
+{
+}
+
+// Answer with the next read of the same register in the capture
+// The transfers in between are skipped, so reads the driver no longer makes do not stop the replay
+void ReplayBus::read(uint8_t device, uint8_t reg, uint8_t count, uint8_t *dest)
+{
+	size_t record;
+	uint8_t kind, recordDevice, recordReg, recordCount;
+	double last = time - offset; // Recorded time of the last read
+	bool wrapped = false;
+	while(true)
+	{
+		if(!next(record, kind, recordDevice, recordReg, recordCount))
+		{
+			if(!loop || wrapped)
+				throw "The capture has no more reads of the register";
+			// Continue the timeline after the end, so the intervals stay positive
+			offset += last + CAPTURE_LOOP_GAP;
+			last = 0.0;
+			position = CAPTURE_HEADER_SIZE;
+			wrapped = true;
+			loops++;
+			continue;
+		}
+		if(kind == CAPTURE_READ)
+			last = recordTime(record);
+		if(kind == CAPTURE_READ && recordDevice == device && recordReg == reg && recordCount == count)
+			break;
+	}
+
+	memcpy(dest, &data[record + CAPTURE_RECORD_SIZE], count);
+	time = offset + recordTime(record);
+	reads++;
+	if(speed > 0.0)
+	{
+		auto elapsed = std::chrono::duration_cast<std::chrono::steady_clock::duration>(
+				std::chrono::duration<double>(time / speed));
+		auto current = std::chrono::steady_clock::now();
+		// After a long stall, like the waits of the initialization, continue from now instead of catching up with a burst
+		if(start + elapsed + std::chrono::duration<double>(CAPTURE_MAX_LAG) < current)
+			start = current - elapsed;
+		std::this_thread::sleep_until(start + elapsed);
+	}
+}
+
+double ReplayBus::now()
+{
+	return time;
+}
@@ -0,0 +1,76 @@
+/*
+ Register level captures of the MPU9250 bus.
+ A RecordingBus passes every transfer on to the real bus and appends it to a
+ capture file. A ReplayBus maps a capture into memory and answers the reads
+ from it, so the driver, the filters and everything above them run off the
+ Raspberry, with the same data every time.
+
+ Capture format, little endian:
+   header: "MPUC", uint16 version, uint16 reserved
+   record: uint64 nanoseconds from the start of the recording, uint8 kind
+           (0 read, 1 write), uint8 device, uint8 register, uint8 count,
+           followed by count data bytes
+ */
+#ifndef _REPLAY_BUS_H_
+#define _REPLAY_BUS_H_
+
+#include <chrono>
+#include <stdio.h>
+#include <stddef.h>
+#include <stdint.h>
+#include "I2CBus.h"
+
+#define CAPTURE_VERSION 1
+#define CAPTURE_HEADER_SIZE 8
+#define CAPTURE_RECORD_SIZE 12  // Record header, before the data bytes
+#define CAPTURE_READ 0
+#define CAPTURE_WRITE 1
+#define CAPTURE_LOOP_GAP 0.001  // Seconds between the last record and the first one of the next loop
+#define CAPTURE_MAX_LAG 0.1  // Seconds a real time replay may fall behind before it stops catching up
+
+class RecordingBus : public I2CBus
+{
+private:
+	I2CBus &bus;
+	FILE *file;
+	std::chrono::steady_clock::time_point start;
+
+	void append(uint8_t kind, uint8_t device, uint8_t reg, uint8_t count, const uint8_t *data);
+
+public:
+	uint64_t records = 0;
+
+	RecordingBus(I2CBus &bus, const char *path);
+	~RecordingBus();
+	void write(uint8_t device, uint8_t reg, uint8_t data);
+	void read(uint8_t device, uint8_t reg, uint8_t count, uint8_t *dest);
+	double now();
+};
+
+class ReplayBus : public I2CBus
+{
+private:
+	const uint8_t *data = NULL;
+	size_t size = 0;
+	size_t position = CAPTURE_HEADER_SIZE; // Offset of the next record to replay
+	double offset = 0.0; // Seconds added to the recorded times, grows with every loop
+	double time = 0.0; // Recorded time of the last replayed read
+	double speed; // Playback speed, 0 to replay as fast as possible
+	bool loop; // Start again at the end of the capture
+	std::chrono::steady_clock::time_point start;
+
+	bool next(size_t &record, uint8_t &kind, uint8_t &device, uint8_t &reg, uint8_t &count);
+	double recordTime(size_t record) const;
+
+public:
+	uint64_t reads = 0;
+	uint64_t loops = 0;
+
+	ReplayBus(const char *path, double speed, bool loop);
+	~ReplayBus();
+	void write(uint8_t device, uint8_t reg, uint8_t data);
+	void read(uint8_t device, uint8_t reg, uint8_t count, uint8_t *dest);
+	double now();
+};
+
+#endif // _REPLAY_BUS_H_
@@ -0,0 +1,72 @@
+/*
+ Lock-free ring buffer for one producer thread and one consumer thread.
+ The producer is the sampling thread, the consumer is the Python thread draining
+ the samples. Neither of them ever waits for the other.
+ */
+#ifndef _SAMPLE_RING_H_
+#define _SAMPLE_RING_H_
+
+#include <atomic>
+#include <vector>
+#include <cstddef>
+
+template <typename T>
+class SampleRing
+{
+private:
+	std::vector<T> buffer;
+	size_t mask;  // Capacity - 1, the capacity is a power of two
+	// Padded onto separate cache lines, so the two threads do not invalidate each other
+	char pad0[64];
+	std::atomic<size_t> head; // Next slot to write, only moved by the producer
+	char pad1[64];
+	std::atomic<size_t> tail; // Next slot to read, only moved by the consumer
+
+public:
+	// The capacity is rounded up to a power of two
+	explicit SampleRing(size_t capacity) : head(0), tail(0)
+	{
+		size_t size = 1;
+		while(size < capacity)
+			size <<= 1;
+		buffer.resize(size);
+		mask = size - 1;
+	}
+
+	size_t capacity() const
+	{
+		return mask + 1;
+	}
+
+	// Number of items waiting to be read
+	size_t size() const
+	{
+		return head.load(std::memory_order_acquire) - tail.load(std::memory_order_acquire);
+	}
+
+	// Producer side, returns false without writing when the ring is full
+	bool push(const T &item)
+	{
+		size_t current = head.load(std::memory_order_relaxed);
+		if(current - tail.load(std::memory_order_acquire) > mask)
+			return false;
+		buffer[current & mask] = item;
+		head.store(current + 1, std::memory_order_release); // Publish the item
+		return true;
+	}
+
+	// Consumer side, copies up to max items to dest and returns how many were copied
+	size_t pop(T *dest, size_t max)
+	{
+		size_t current = tail.load(std::memory_order_relaxed);
+		size_t count = head.load(std::memory_order_acquire) - current;
+		if(count > max)
+			count = max;
+		for(size_t i = 0; i < count; i++)
+			dest[i] = buffer[(current + i) & mask];
+		tail.store(current + count, std::memory_order_release); // Free the slots for the producer
+		return count;
+	}
+};
+
+#endif // _SAMPLE_RING_H_
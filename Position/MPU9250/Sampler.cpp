@@ -0,0 +1,131 @@
+#include "Sampler.h"
+
+Sampler::Sampler(MPU9250 &mpu, std::mutex &bus) : mpu(mpu), bus(bus), stopping(false),
+	period(0), magTap(MAG_TAP_CAPACITY), tapping(false), produced(0), dropped(0), errors(0)
+{
+}
+
+Sampler::~Sampler()
+{
+	stop();
+}
+
+// Start sampling at rate Hz into a new ring holding at least capacity samples
+// A running sampler is stopped first, and the samples not yet read are discarded
+void Sampler::start(double rate, size_t capacity)
+{
+	stop();
+	ring.reset(new SampleRing<ImuSample>(capacity));
+	period = std::chrono::nanoseconds((int64_t)(1e9 / rate));
+	produced = 0;
+	dropped = 0;
+	errors = 0;
+	stopping = false;
+	thread = std::thread(&Sampler::run, this);
+}
+
+void Sampler::stop()
+{
+	stopping = true;
+	if(thread.joinable())
+		thread.join();
+}
+
+bool Sampler::running() const
+{
+	return thread.joinable();
+}
+
+size_t Sampler::available() const
+{
+	return ring ? ring->size() : 0;
+}
+
+// Only one thread may read at a time, the module calls it with the GIL held
+size_t Sampler::read(ImuSample *dest, size_t max)
+{
+	return ring ? ring->pop(dest, max) : 0;
+}
+
+// Copy every new magnetometer reading to the tap as well, for a consumer that must not drain the samples
+// The readings left from an earlier tap are dropped first
+void Sampler::startMagTap()
+{
+	MagCounts stale[64];
+	while(magTap.pop(stale, 64) > 0)
+		;
+	tapping = true;
+}
+
+void Sampler::stopMagTap()
+{
+	tapping = false;
+}
+
+// Raw counts of the new magnetometer readings since the last call, oldest first
+// Only one thread may read the tap at a time, independently of the reader of the samples
+size_t Sampler::readMagTap(MagCounts *dest, size_t max)
+{
+	return magTap.pop(dest, max);
+}
+
+void Sampler::run()
+{
+	int16_t magCount[3] = {0, 0, 0}; // Kept between the samples, the magnetometer updates slower
+	auto deadline = std::chrono::steady_clock::now();
+
+	while(!stopping)
+	{
+		ImuSample current;
+		if(!sample(current, magCount))
+			errors++;
+		else if(ring->push(current))
+			produced++;
+		else
+			dropped++; // Nobody drained the ring in time
+
+		// The deadlines are absolute, so a late sample does not delay the next ones
+		// After a long stall, restart from now instead of catching up with a burst
+		deadline += period;
+		auto now = std::chrono::steady_clock::now();
+		if(deadline < now)
+			deadline = now;
+		std::this_thread::sleep_until(deadline);
+	}
+}
+
+// Read one sample from the sensor, returns false if the bus failed
+bool Sampler::sample(ImuSample &dest, int16_t *magCount)
+{
+	int16_t accelCount[3], gyroCount[3], tempCount;
+	bool fresh;
+
+	try
+	{
+		std::lock_guard<std::mutex> lock(bus);
+		tempCount = mpu.readMotionData(accelCount, gyroCount); // One burst for the three of them
+		fresh = mpu.readMagData(magCount); // Left unchanged when no new data is ready
+
+		dest.timestamp = mpu.now();
+		dest.ax = (double)accelCount[0] * mpu.aRes;
+		dest.ay = (double)accelCount[1] * mpu.aRes;
+		dest.az = (double)accelCount[2] * mpu.aRes;
+		dest.gx = (double)gyroCount[0] * mpu.gRes;
+		dest.gy = (double)gyroCount[1] * mpu.gRes;
+		dest.gz = (double)gyroCount[2] * mpu.gRes;
+		double mag[3];
+		mpu.scaleMagData(magCount, mag);
+		dest.mx = mag[0];
+		dest.my = mag[1];
+		dest.mz = mag[2];
+	}
+	catch(const char *msg)
+	{
+		return false;
+	}
+	dest.temperature = (double)tempCount / TEMP_SENSITIVITY + TEMP_OFFSET;
+	if(fresh && tapping)
+		magTap.push(MagCounts{magCount[0], magCount[1], magCount[2]}); // Lost if the tap is not read in time
+
+	return true;
+}
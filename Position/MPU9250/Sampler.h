@@ -0,0 +1,59 @@
+/*
+ Background sampling of the MPU9250 in a native thread.
+ The thread reads the sensor at a fixed rate into a lock-free ring buffer, from
+ which Python drains the samples in batches. Python is not involved in the
+ sampling loop, so the rate stays steady whatever the interpreter is doing.
+ */
+#ifndef _SAMPLER_H_
+#define _SAMPLER_H_
+
+#include <mutex>
+#include <atomic>
+#include <thread>
+#include <memory>
+#include <stdint.h>
+#include "MPU9250.h"
+#include "ImuSample.h"
+#include "SampleRing.h"
+
+#define MAG_TAP_CAPACITY 1024  // Readings kept by the magnetometer tap, 10 s of the magnetometer at 100 Hz
+
+// Raw magnetometer counts, as copied to the magnetometer tap
+struct MagCounts
+{
+	int16_t x, y, z;
+};
+
+class Sampler
+{
+private:
+	MPU9250 &mpu;
+	std::mutex &bus;  // Held for every access to the sensor
+	std::thread thread;
+	std::atomic<bool> stopping;
+	std::unique_ptr<SampleRing<ImuSample>> ring;
+	std::chrono::nanoseconds period;
+	SampleRing<MagCounts> magTap;  // Second consumer of the magnetometer, kept for the whole life of the sampler
+	std::atomic<bool> tapping;  // Whether the new magnetometer readings are copied to the tap
+
+	void run();
+	bool sample(ImuSample &dest, int16_t *magCount);
+
+public:
+	std::atomic<uint64_t> produced;  // Samples written to the ring
+	std::atomic<uint64_t> dropped;  // Samples lost because the ring was full
+	std::atomic<uint64_t> errors;  // Failed sensor reads
+
+	Sampler(MPU9250 &mpu, std::mutex &bus);
+	~Sampler();
+	void start(double rate, size_t capacity);
+	void stop();
+	bool running() const;
+	size_t available() const;
+	size_t read(ImuSample *dest, size_t max);
+	void startMagTap();
+	void stopMagTap();
+	size_t readMagTap(MagCounts *dest, size_t max);
+};
+
+#endif // _SAMPLER_H_
@@ -0,0 +1,179 @@
+"""Magnetometer calibration of the MPU9250, without stopping the controller
+
+The magnetometer readings of a sensor turned in every direction lie on an ellipsoid, shifted by the hard iron bias and
+stretched by the soft iron distortion. The readings are collected in a background thread while the requests are served,
+then the ellipsoid is fitted by least squares in a worker process, so the fit does not compete with the controller for
+the interpreter. The resulting bias and matrix are loaded into the ``mpu9250`` extension, which applies them to every
+magnetometer reading, the background sampling and the FIFO stream included.
+"""
+
+import time
+import logging
+import threading
+import multiprocessing
+from concurrent import futures
+
+DEFAULT_DURATION = 30.0  # Seconds of collection, while the sensor is turned around
+POLL_RATE = 20.0  # Reads per second, above the 8 Hz of the magnetometer so no reading is missed
+MIN_SAMPLES = 50  # Fewer distinct readings are not enough to fit the nine parameters reliably
+MAX_AXIS_RATIO = 2.0  # Larger ratios of the ellipsoid axes mean the sensor was not turned in every direction
+
+IDLE = "IDLE"
+COLLECTING = "COLLECTING"
+FITTING = "FITTING"
+DONE = "DONE"
+FAILED = "FAILED"
+
+
+def fit_ellipsoid(points):
+    """Fit an ellipsoid to the magnetometer readings
+
+    The quadric ``p^T A p + 2 b^T p = 1`` is fitted by linear least squares, on readings centered and scaled for the
+    conditioning of the problem. Its center is the hard iron bias, and the matrix maps the ellipsoid onto a sphere of
+    the mean radius, so the field strength is kept.
+
+    Args:
+        points: Sequence of the (x, y, z) readings in milliGauss, before any calibration
+
+    Returns:
+        tuple: The bias as a list of 3 values, the 3x3 matrix as a list of lists, and the RMS of the relative radius
+        error of the corrected readings
+
+    Raises:
+        ValueError: If there are too few readings, or they do not describe an ellipsoid
+    """
+    import numpy  # Imported here, since it is only needed in the worker process
+
+    points = numpy.asarray(points, dtype=float)
+    if points.ndim != 2 or points.shape[1] != 3:
+        raise ValueError("The readings must be a list of (x, y, z) values")
+    if len(points) < MIN_SAMPLES:
+        raise ValueError("Only %d readings, at least %d are needed" % (len(points), MIN_SAMPLES))
+
+    offset = points.mean(axis=0)
+    scale = numpy.abs(points - offset).max()
+    if scale == 0.0:
+        raise ValueError("The readings do not change")
+    x, y, z = ((points - offset) / scale).T
+
+    design = numpy.column_stack((x * x, y * y, z * z, 2.0 * x * y, 2.0 * x * z, 2.0 * y * z, 2.0 * x, 2.0 * y, 2.0 * z))
+    coefficients = numpy.linalg.lstsq(design, numpy.ones(len(x)), rcond=None)[0]
+    a, b, c, d, e, f, g, h, i = coefficients
+    quadric = numpy.array([[a, d, e], [d, b, f], [e, f, c]])
+    center = -numpy.linalg.solve(quadric, [g, h, i])
+
+    # Around its center the ellipsoid is (p - center)^T A (p - center) = 1 + center^T A center
+    eigenvalues, eigenvectors = numpy.linalg.eigh(quadric / (1.0 + center @ quadric @ center))
+    if numpy.any(eigenvalues <= 0.0):
+        raise ValueError("The readings do not lie on an ellipsoid")
+    radii = 1.0 / numpy.sqrt(eigenvalues)
+    if radii.max() > MAX_AXIS_RATIO * radii.min():
+        raise ValueError("The sensor was not turned in every direction")
+
+    matrix = eigenvectors @ numpy.diag(radii.mean() / radii) @ eigenvectors.T
+    bias = center * scale + offset
+    corrected = numpy.linalg.norm((points - bias) @ matrix.T, axis=1)
+    residual = numpy.sqrt(numpy.mean((corrected / corrected.mean() - 1.0) ** 2))
+    return bias.tolist(), matrix.tolist(), float(residual)
+
+
+class MagCalibration:
+    """A magnetometer calibration run: collection in a thread, then the fit in a worker process
+
+    The status and the result can be read from any thread.
+    """
+
+    def __init__(self, imu, duration: float = DEFAULT_DURATION, on_done=None):
+        """
+        Args:
+            imu: The ``mpu9250`` extension module, with the sensor initialized
+            duration (float): Seconds of collection
+            on_done: Called with the bias and the matrix in the background thread, once they are loaded into the
+                extension
+        """
+        self.log = logging.getLogger(__name__)
+        self.imu = imu
+        self.duration = duration
+        self.on_done = on_done
+        self.state = IDLE
+        self.samples = 0  # Distinct readings collected
+        self.residual = None  # RMS of the relative radius error after the calibration
+        self.result = None  # Bias and matrix loaded into the extension
+        self._thread = None
+
+    def start(self):
+        """Start the calibration in a background thread
+
+        Returns:
+            threading.Thread: The started thread
+        """
+        self.state = COLLECTING
+        self._thread = threading.Thread(target=self._run, name="MagCalibration", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def running(self):
+        return self.state in (COLLECTING, FITTING)
+
+    def format(self):
+        """Build the status response
+
+        Returns:
+            str: ``MAGCAL_STATUS`` followed by the state, the number of readings and the residual error in percent,
+            or -1 until it is known
+        """
+        residual = -1.0 if self.residual is None else self.residual * 100.0
+        return "MAGCAL_STATUS_%s_%d_%.2f\n" % (self.state, self.samples, residual)
+
+    def _run(self):
+        try:
+            points = self._collect()
+            self.state = FITTING
+            # A spawned process starts without the threads and the sensor handles of the controller
+            with futures.ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                bias, matrix, self.residual = pool.submit(fit_ellipsoid, points).result()
+            self.imu.setMagCalibration(bias, matrix)
+        except Exception:
+            self.log.exception("Magnetometer calibration failed. See traceback.")
+            self.state = FAILED
+            return
+        self.result = (bias, matrix)
+        self.state = DONE
+        self.log.info("Magnetometer calibrated from %d readings, bias %s, residual %.2f %%" %
+                      (self.samples, bias, self.residual * 100.0))
+        if self.on_done is not None:
+            self.on_done(bias, matrix)
+
+    def _collect(self):
+        """Read the magnetometer until the collection time is over
+
+        While the background sampling of the extension runs, the readings are taken from its magnetometer tap, so the
+        collection does not compete with the sampling thread for the bus, and the samples stay in the ring for their
+        own reader. Otherwise the magnetometer is read directly.
+
+        A direct reading is kept only if it differs from the previous one, since the extension returns the last counts
+        again while the magnetometer has no new data. The tap only holds the new readings.
+
+        Returns:
+            list: The readings in milliGauss, without any bias or matrix applied
+        """
+        scale = self.imu.getMagScale()
+        points = []
+        last = None
+        period = 1.0 / POLL_RATE
+        deadline = time.monotonic() + self.duration
+        self.imu.startMagTap()
+        try:
+            while time.monotonic() < deadline:
+                if self.imu.samplingStats()[0]:
+                    readings = self.imu.readMagTap()
+                else:
+                    counts = self.imu.readMagDataRaw()
+                    readings = [counts] if counts != last else []
+                    last = counts
+                points.extend([count * factor for count, factor in zip(counts, scale)] for counts in readings)
+                self.samples = len(points)
+                time.sleep(period)
+        finally:
+            self.imu.stopMagTap()
+        return points
@@ -0,0 +1,226 @@
+import time
+import logging
+import threading
+from Core.Networking import BinaryProtocol
+from Position import MagCalibration, CalibrationCache
+
+RA_STEPS_PER_HOUR = 43200.0  # Steps of the RA motor for one hour of hour angle
+DEC_STEPS_PER_DEGREE = 10000.0  # Steps of the DEC motor for one degree of declination
+TEMP_SENSITIVITY = 333.87  # Temperature LSB per degree Celsius of the MPU9250
+TEMP_OFFSET = 21.0  # Temperature in Celsius at a reading of zero
+
+
+def _hour_angle(ra_steps):
+    """Convert the RA step count to the hour angle, wrapped in the range of a day"""
+    ha = ra_steps / RA_STEPS_PER_HOUR
+    if ha < 0.0:
+        ha = 23.9997 - abs(ha)
+    elif ha >= 23.997:
+        ha = ha - 23.997
+    return ha
+
+
+class PositionCore:
+    """Position model and telemetry publishing, shared by the Qt and the asyncio runtimes
+
+    The class using it provides the ``posUpdateSig`` signal and calls :meth:`_sample` at the telemetry rate.
+    """
+
+    def _setup_position(self, tcpClient, cfg_data):
+        self.tcpClient = tcpClient
+        self.cfg = cfg_data
+
+        # Position model as (hour angle, declination, RA steps, DEC steps). It is replaced as a whole on every update,
+        # so it can be read from any thread without a lock. The steps are read from the settings only here.
+        steps = cfg_data.get_steps()
+        self._model = (_hour_angle(float(steps[0])), float(steps[1]) / DEC_STEPS_PER_DEGREE, int(steps[0]),
+                       int(steps[1]))
+
+        # Telemetry is published at a fixed rate, by sampling the step counts of the motors
+        self.step_source = None  # Returns the current RA and DEC steps, set when the motors are initialized
+        self.rate = cfg_data.get_telemetry_rate()  # Updates per second
+        self.threshold = cfg_data.get_telemetry_threshold()  # Minimum change in steps of either axis to publish
+        self.heartbeat = cfg_data.get_telemetry_heartbeat()  # Maximum seconds between two updates, even if unchanged
+        self._published = (None, None, 0.0)  # RA steps, DEC steps and time of the last published update
+
+        self.imu = None  # The mpu9250 extension, once the sensor is initialized
+        self.imu_id = None  # Identity of the sensor, the key of its saved calibration
+        self.imu_cache = None  # Saved calibrations, opened with the sensor
+        self.mag_calibration = None  # Last magnetometer calibration run
+        self.imu_recalibration = None  # Thread measuring the gyroscope and accelerometer biases again, if started
+
+        self.log = logging.getLogger(__name__)  # Initialize the logger
+
+    def init_imu(self):
+        """Initialize the MPU9250 sensor. Runs in a background thread at startup, if the IMU is enabled.
+
+        The calibration saved for the sensor is loaded into the driver. If there is none for the current temperature,
+        or it is too old, the sensor is calibrated again in another background thread, once it is initialized.
+        """
+        import mpu9250  # Imported here, since the extension is only built on the Raspberry
+        cache = CalibrationCache.CalibrationCache(self.cfg.get_imu_calibration_cache(),
+                                                  self.cfg.get_imu_calibration_max_age())
+        sensor = mpu9250.getSensorId()
+        mpu9250.initMPU9250()
+        temperature = mpu9250.readTempDataRaw() / TEMP_SENSITIVITY + TEMP_OFFSET
+        saved, stale = cache.lookup(sensor, temperature)
+        if "gyro_bias" in saved:
+            mpu9250.loadBiases(saved["gyro_bias"], saved["accel_bias"])
+            mpu9250.initMPU9250()  # Loading the biases resets the device
+        if "factory_mag" in saved:
+            mpu9250.initAK8963(saved["factory_mag"])
+        else:
+            cache.store_factory_mag(sensor, mpu9250.initAK8963())
+        mpu9250.getAres()
+        mpu9250.getGres()
+        mpu9250.getMres()
+        if "mag_bias" in saved:
+            mpu9250.setMagCalibration(saved["mag_bias"], saved["mag_matrix"])
+        self.log.info("IMU %s initialized at %.1f C, saved calibration: %s" %
+                      (sensor, temperature, ", ".join(sorted(saved)) or "none"))
+
+        self.imu_id = sensor
+        self.imu_cache = cache
+        self.imu = mpu9250
+        if stale:
+            self.imu_recalibration = threading.Thread(target=self._recalibrate_imu, name="IMUCalibration", daemon=True)
+            self.imu_recalibration.start()
+
+    def _recalibrate_imu(self):
+        """Measure the gyroscope and accelerometer biases again and save them. Runs in a background thread.
+
+        The sensor must be still meanwhile. The calibration resets the device, so it is initialized again afterwards.
+        """
+        imu = self.imu
+        try:
+            gyro_bias, accel_bias = imu.calibrateMPU9250()
+            imu.initMPU9250()  # The magnetometer is a separate chip, it keeps running through the reset
+            temperature = imu.readTempDataRaw() / TEMP_SENSITIVITY + TEMP_OFFSET
+            self.imu_cache.store_biases(self.imu_id, temperature, gyro_bias, accel_bias)
+        except Exception:
+            self.log.exception("IMU calibration failed. See traceback.")
+            return
+        self.log.info("IMU calibrated at %.1f C, gyroscope bias %s, accelerometer bias %s" %
+                      (temperature, gyro_bias, accel_bias))
+
+    def calibrate_mag(self, duration: float = MagCalibration.DEFAULT_DURATION):
+        """Start a magnetometer calibration in the background, while the sensor is turned in every direction
+
+        Args:
+            duration (float): Seconds of collection of the magnetometer readings
+
+        Returns:
+            bool: False if the sensor is not initialized, or a calibration of the sensor is already running
+        """
+        if self.imu is None or (self.mag_calibration is not None and self.mag_calibration.running()):
+            return False
+        if self.imu_recalibration is not None and self.imu_recalibration.is_alive():
+            return False  # It holds the bus for seconds and resets the device, the readings would be stale
+        self.mag_calibration = MagCalibration.MagCalibration(self.imu, duration, self._save_mag_calibration)
+        self.mag_calibration.start()
+        return True
+
+    def _save_mag_calibration(self, bias, matrix):
+        """Keep the result of a magnetometer calibration for the next starts"""
+        self.imu_cache.store_mag(self.imu_id, bias, matrix)
+
+    def mag_calibration_status(self):
+        """Status response of the last magnetometer calibration, see :meth:`MagCalibration.MagCalibration.format`"""
+        if self.mag_calibration is None:
+            return "MAGCAL_STATUS_%s_0_-1.00\n" % MagCalibration.IDLE
+        return self.mag_calibration.format()
+
+    def dataSend(self, type: str, steps: int):
+        """
+        Sends position information alongside with the step number.
+        :param type: What is the motor that is triggering this signal
+        :param steps: Number of steps sent from the signal trigger
+        :return: Nothing
+        """
+        self.update_steps(type, steps)
+        self._publish(time.time())
+
+    def set_step_source(self, step_source):
+        """Provide the function sampled for the current step counts
+
+        Args:
+            step_source: Returns the current RA and DEC steps, without blocking
+        """
+        self.step_source = step_source
+
+    def _refresh(self):
+        """Bring the position model up to date with the step counts of the motors, without publishing it
+
+        Returns:
+            tuple: The model, as hour angle, declination, RA steps and DEC steps
+        """
+        if self.step_source is None:
+            return self._model
+        ra_steps, dec_steps = self.step_source()
+        if ra_steps != self._model[2]:
+            self.update_steps("RASTEPS", ra_steps)
+        if dec_steps != self._model[3]:
+            self.update_steps("DECSTEPS", dec_steps)
+        return self._model
+
+    def _sample(self):
+        """Timer tick: update the model, and publish it if it changed enough or the heartbeat is due"""
+        if self.step_source is None:
+            return
+        ra_steps, dec_steps = self._refresh()[2:]  # Kept current on every tick, even if it is not published
+        now = time.time()
+        last_ra, last_dec, last_time = self._published
+        if last_ra is not None and abs(ra_steps - last_ra) < self.threshold and \
+                abs(dec_steps - last_dec) < self.threshold and now - last_time < self.heartbeat:
+            return
+        self._publish(now)
+
+    def _publish(self, timestamp: float):
+        """Send the current model, with the time it was sampled"""
+        ha, dec, ra_steps, dec_steps = self._model
+        self._published = (ra_steps, dec_steps, timestamp)
+        self.posUpdateSig.emit([ha, dec, ra_steps, dec_steps, timestamp])  # Published to the subscribed clients
+        string = BinaryProtocol.format_ascii("DISHPOS", ha, dec, ra_steps, dec_steps, timestamp)
+        self.tcpClient.sendTelemetry.emit("DISHPOS", string)  # Coalesced with any unsent position
+
+    def update_steps(self, type: str, steps: int):
+        """Update the position model with a new step count of one motor
+
+        Only the angle of the motor that moved is converted again.
+
+        Args:
+            type (str): ``RASTEPS`` or ``DECSTEPS``, as sent by the motor step signal
+            steps (int): Total step count of the motor from home
+
+        Returns:
+            tuple: The updated model, as hour angle, declination, RA steps and DEC steps
+        """
+        ha, dec, ra_steps, dec_steps = self._model
+        if type == "RASTEPS":
+            model = (_hour_angle(float(steps)), dec, int(steps), dec_steps)
+        elif type == "DECSTEPS":
+            model = (ha, float(steps) / DEC_STEPS_PER_DEGREE, ra_steps, int(steps))
+        else:
+            return self._model
+        self._model = model  # Single reference assignment, so readers never see a partial update
+        return model
+
+    def getPosition(self):
+        # TODO Test the accuracy and reliability of the angle calculations
+        '''
+        acc = mpu9250.readAccelData()  # Get the acceleration data from the sensor
+        roll = math.atan2(acc[1], acc[2])  # Calculate roll
+        pitch = math.atan2(-acc[0], math.sqrt(acc[1]*acc[1] + acc[2]*acc[2]))  # Calculate pitch
+        return [math.degrees(pitch), math.degrees(roll)]  # Roll is the declination and pitch is the hour angle
+        '''
+        model = self._refresh()  # Also current between the telemetry ticks, or when the telemetry is disabled
+        return [model[0], model[1]]
+
+    def getSteps(self):
+        """Get the step counts of the motors from the position model
+
+        Returns:
+            list: RA and DEC steps from home
+        """
+        model = self._refresh()
+        return [model[2], model[3]]
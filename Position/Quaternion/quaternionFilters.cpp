@@ -12,8 +12,8 @@
 
 // These are the free parameters in the Mahony filter and fusion scheme, Kp
 // for proportional feedback, Ki for integral
-#define Kp 2.0f * 5.0f
-#define Ki 0.0f
+#define DEFAULT_KP 2.0f * 5.0f
+#define DEFAULT_KI 0.0f
 
 static double GyroMeasError = PI * (40.0f / 180.0f);
 // gyroscope measurement drift in rad/s/s (start at 0.0 deg/s/s)
@@ -31,19 +31,42 @@ static double GyroMeasDrift = PI * (0.0f  / 180.0f);
 // the faster the solution converges, usually at the expense of accuracy.
 // In any case, this is the free parameter in the Madgwick filtering and
 // fusion scheme.
-static double beta = sqrt(3.0f / 4.0f) * GyroMeasError;   // Compute beta
+static double DefaultBeta = sqrt(3.0f / 4.0f) * GyroMeasError;   // Compute beta
 // Compute zeta, the other free parameter in the Madgwick scheme usually
 // set to a small or zero value
-static double zeta = sqrt(3.0f / 4.0f) * GyroMeasDrift;
+static double DefaultZeta = sqrt(3.0f / 4.0f) * GyroMeasDrift;
 
-// Vector to hold integral error for Mahony method
-static double eInt[3] = {0.0f, 0.0f, 0.0f};
-// Vector to hold quaternion
-static double q[4] = {1.0f, 0.0f, 0.0f, 0.0f};
+// State used by the functions without a state argument
+static FilterState defaultState = {{1.0f, 0.0f, 0.0f, 0.0f}, {0.0f, 0.0f, 0.0f},
+                                   DefaultBeta, DefaultZeta, DEFAULT_KP, DEFAULT_KI};
 
-void MadgwickQuaternionUpdate(double ax, double ay, double az, double gx, double gy, double gz,
-                              double mx, double my, double mz, double deltat)
+// Set the default gains and the initial quaternion
+void initFilterState(FilterState *state)
+{
+  state->beta = DefaultBeta;
+  state->zeta = DefaultZeta;
+  state->Kp = DEFAULT_KP;
+  state->Ki = DEFAULT_KI;
+  resetFilterState(state);
+}
+
+// Set the initial quaternion and clear the integral error, keeping the gains
+void resetFilterState(FilterState *state)
 {
+  state->q[0] = 1.0f;
+  state->q[1] = 0.0f;
+  state->q[2] = 0.0f;
+  state->q[3] = 0.0f;
+  state->eInt[0] = 0.0f;
+  state->eInt[1] = 0.0f;
+  state->eInt[2] = 0.0f;
+}
+
+void MadgwickUpdate(FilterState *state, double ax, double ay, double az, double gx, double gy, double gz,
+                    double mx, double my, double mz, double deltat)
+{
+  double *q = state->q;
+  double beta = state->beta;
   // short name local variable for readability
   double q1 = q[0], q2 = q[1], q3 = q[2], q4 = q[3];
   double norm;
@@ -139,9 +162,12 @@ void MadgwickQuaternionUpdate(double ax, double ay, double az, double gx, double
 
 // Similar to Madgwick scheme but uses proportional and integral filtering on
 // the error between estimated reference vectors and measured ones.
-void MahonyQuaternionUpdate(double ax, double ay, double az, double gx, double gy, double gz,
-                            double mx, double my, double mz, double deltat)
+void MahonyUpdate(FilterState *state, double ax, double ay, double az, double gx, double gy, double gz,
+                  double mx, double my, double mz, double deltat)
 {
+  double *q = state->q;
+  double *eInt = state->eInt;
+  double Kp = state->Kp, Ki = state->Ki;
   // short name local variable for readability
   double q1 = q[0], q2 = q[1], q3 = q[2], q4 = q[3];
   double norm;
@@ -232,4 +258,18 @@ void MahonyQuaternionUpdate(double ax, double ay, double az, double gx, double g
   q[3] = q4 * norm;
 }
 
-double * getQ () { return q; }
+void MadgwickQuaternionUpdate(double ax, double ay, double az, double gx, double gy, double gz,
+                              double mx, double my, double mz, double deltat)
+{
+  MadgwickUpdate(&defaultState, ax, ay, az, gx, gy, gz, mx, my, mz, deltat);
+}
+
+void MahonyQuaternionUpdate(double ax, double ay, double az, double gx, double gy, double gz,
+                            double mx, double my, double mz, double deltat)
+{
+  MahonyUpdate(&defaultState, ax, ay, az, gx, gy, gz, mx, my, mz, deltat);
+}
+
+FilterState * getDefaultState () { return &defaultState; }
+
+double * getQ () { return defaultState.q; }
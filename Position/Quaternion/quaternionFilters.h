@@ -5,6 +5,25 @@
 
 #include <math.h> // Needed for the sqrt function
 
+// State and gains of a filter, the functions below without a state use a default one
+struct FilterState
+{
+    double q[4];     // Quaternion
+    double eInt[3];  // Integral error of the Mahony method
+    double beta;     // Gain of the Madgwick method
+    double zeta;     // Gyroscope drift gain of the Madgwick method, not used yet
+    double Kp;       // Proportional gain of the Mahony method
+    double Ki;       // Integral gain of the Mahony method
+};
+
+extern void initFilterState(FilterState *state);
+extern void resetFilterState(FilterState *state);
+extern void MadgwickUpdate(FilterState *state, double ax, double ay, double az, double gx, double gy,
+                           double gz, double mx, double my, double mz, double deltat);
+extern void MahonyUpdate(FilterState *state, double ax, double ay, double az, double gx, double gy,
+                         double gz, double mx, double my, double mz, double deltat);
+extern FilterState * getDefaultState(void);
+
 extern void MadgwickQuaternionUpdate(double ax, double ay, double az, double gx, double gy,
                                      double gz, double mx, double my, double mz,
                                      double deltat);
@@ -1,4 +1,7 @@
-#include <python3.5/Python.h>
+#include <Python.h>
+#include <new>
+#include <mutex>
+#include <string.h>
 #include "quaternionFilters.h"
 
 /* The quaternion code wa taken from an Arduino library made by SparkFun
@@ -51,12 +54,319 @@ static PyObject* quaternion_madgwickQuaternion(PyObject* self, PyObject* args)
     return Py_BuildValue("dddd", quaterValues[0], quaterValues[1], quaterValues[2], quaterValues[3]);
 }
 
+typedef void (*FilterUpdate)(FilterState*, double, double, double, double, double, double, double, double, double,
+                             double);
+
+// Get a C contiguous buffer of doubles from obj, with ndim dimensions and, for 2 dimensions, the given number of
+// columns. Sets the error and returns -1 if it is not one
+static int getDoubleBuffer(PyObject* obj, Py_buffer* view, int flags, int ndim, Py_ssize_t columns, const char* name)
+{
+    if(PyObject_GetBuffer(obj, view, flags | PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) < 0)
+        return -1;
+
+    const char* format = view->format;
+    if(format != NULL && (format[0] == '@' || format[0] == '=' || format[0] == '<'))
+        format++; // Native or little endian, the Raspberry is little endian
+    if(view->itemsize != sizeof(double) || (format != NULL && strcmp(format, "d") != 0))
+    {
+        PyBuffer_Release(view);
+        PyErr_Format(PyExc_TypeError, "%s must be an array of doubles", name);
+        return -1;
+    }
+    if(view->ndim != ndim || (ndim == 2 && view->shape[1] != columns))
+    {
+        PyBuffer_Release(view);
+        if(ndim == 2)
+            PyErr_Format(quatmodError, "%s must be a 2 dimensional array of N x %zd values", name, columns);
+        else
+            PyErr_Format(quatmodError, "%s must be a 1 dimensional array of N values", name);
+        return -1;
+    }
+    return 0;
+}
+
+// Run a filter over N samples: samples is N x 9 (ax, ay, az, gx, gy, gz, mx, my, mz), dt holds
+// the N integration intervals or is a single number for all of them, and out receives the N x 4 quaternions
+// With a lock, the GIL is released and the lock held while the filter runs, otherwise the GIL protects the state
+static PyObject* quaternionBatch(PyObject* args, FilterState* state, FilterUpdate update, std::mutex* lock)
+{
+    PyObject *samplesObj, *dtObj, *outObj;
+    Py_buffer samples, dt, out;
+    Py_ssize_t count;
+    double constantDt = 0.0;
+    bool dtArray;
+
+    if(!PyArg_ParseTuple(args, "OOO", &samplesObj, &dtObj, &outObj))
+        return NULL;
+
+    if(getDoubleBuffer(samplesObj, &samples, PyBUF_ND, 2, 9, "samples") < 0)
+        return NULL;
+    count = samples.shape[0];
+
+    dtArray = PyObject_CheckBuffer(dtObj);
+    if(dtArray)
+    {
+        if(getDoubleBuffer(dtObj, &dt, PyBUF_ND, 1, 0, "dt") < 0)
+        {
+            PyBuffer_Release(&samples);
+            return NULL;
+        }
+        if(dt.shape[0] != count)
+        {
+            PyBuffer_Release(&samples);
+            PyBuffer_Release(&dt);
+            PyErr_SetString(quatmodError, "dt must hold one value per sample");
+            return NULL;
+        }
+    }
+    else
+    {
+        constantDt = PyFloat_AsDouble(dtObj);
+        if(constantDt == -1.0 && PyErr_Occurred())
+        {
+            PyBuffer_Release(&samples);
+            return NULL;
+        }
+    }
+
+    if(getDoubleBuffer(outObj, &out, PyBUF_ND | PyBUF_WRITABLE, 2, 4, "out") < 0 || out.shape[0] != count)
+    {
+        if(!PyErr_Occurred())
+        {
+            PyBuffer_Release(&out);
+            PyErr_SetString(quatmodError, "out must have one row per sample");
+        }
+        PyBuffer_Release(&samples);
+        if(dtArray)
+            PyBuffer_Release(&dt);
+        return NULL;
+    }
+
+    const double *values = (const double*)samples.buf;
+    const double *intervals = dtArray ? (const double*)dt.buf : NULL;
+    double *quaternions = (double*)out.buf;
+    PyThreadState *threadState = NULL;
+    if(lock != NULL)
+    {
+        threadState = PyEval_SaveThread();
+        lock->lock();
+    }
+    for(Py_ssize_t i = 0; i < count; i++)
+    {
+        const double *v = &values[i * 9];
+        update(state, v[0], v[1], v[2], v[3], v[4], v[5], v[6], v[7], v[8], dtArray ? intervals[i] : constantDt);
+        for(int j = 0; j < 4; j++)
+            quaternions[i * 4 + j] = state->q[j];
+    }
+    if(lock != NULL)
+    {
+        lock->unlock();
+        PyEval_RestoreThread(threadState);
+    }
+
+    PyBuffer_Release(&samples);
+    if(dtArray)
+        PyBuffer_Release(&dt);
+    PyBuffer_Release(&out);
+    Py_RETURN_NONE;
+}
+
+static PyObject* quaternion_mahonyQuaternionBatch(PyObject* self, PyObject* args)
+{
+    return quaternionBatch(args, getDefaultState(), MahonyUpdate, NULL);
+}
+
+static PyObject* quaternion_madgwickQuaternionBatch(PyObject* self, PyObject* args)
+{
+    return quaternionBatch(args, getDefaultState(), MadgwickUpdate, NULL);
+}
+
+/*
+ * Filter objects, each one with its own state and gains
+ */
+
+typedef struct
+{
+    PyObject_HEAD
+    FilterState state;
+    FilterUpdate update;
+    int madgwick;  // 1 for Madgwick's method, 0 for Mahony's
+    std::mutex *lock;  // Held while the state is used, the GIL is released during the updates
+} FilterObject;
+
+static PyObject* Filter_new(PyTypeObject* type, PyObject* args, PyObject* kwds)
+{
+    FilterObject* self = (FilterObject*)type->tp_alloc(type, 0);
+    if(self == NULL)
+        return NULL;
+    self->lock = new (std::nothrow) std::mutex();
+    if(self->lock == NULL)
+    {
+        Py_DECREF(self);
+        return PyErr_NoMemory();
+    }
+    initFilterState(&self->state);
+    self->update = MahonyUpdate;
+    return (PyObject*)self;
+}
+
+static int Filter_init(FilterObject* self, PyObject* args, PyObject* kwds)
+{
+    static const char* kwlist[] = {"method", "kp", "ki", "beta", "zeta", NULL};
+    const char* method = "mahony";
+    FilterState* state = &self->state;
+
+    initFilterState(state);
+    if(!PyArg_ParseTupleAndKeywords(args, kwds, "|sdddd", (char**)kwlist, &method,
+                                    &state->Kp, &state->Ki, &state->beta, &state->zeta))
+        return -1;
+    if(strcmp(method, "mahony") == 0)
+        self->madgwick = 0;
+    else if(strcmp(method, "madgwick") == 0)
+        self->madgwick = 1;
+    else
+    {
+        PyErr_Format(quatmodError, "Unknown filter method '%s', expected 'mahony' or 'madgwick'", method);
+        return -1;
+    }
+    self->update = self->madgwick ? MadgwickUpdate : MahonyUpdate;
+    return 0;
+}
+
+static void Filter_dealloc(FilterObject* self)
+{
+    delete self->lock;
+    Py_TYPE(self)->tp_free((PyObject*)self);
+}
+
+static PyObject* Filter_update(FilterObject* self, PyObject* args)
+{
+    double ax, ay, az, gx, gy, gz, mx, my, mz, deltat;
+    double quaterValues[4];
+
+    if(!PyArg_ParseTuple(args, "dddddddddd", &ax, &ay, &az, &gx, &gy, &gz, &mx, &my, &mz, &deltat))
+        return NULL;
+
+    Py_BEGIN_ALLOW_THREADS
+    {
+        std::lock_guard<std::mutex> guard(*self->lock);
+        self->update(&self->state, ax, ay, az, gx, gy, gz, mx, my, mz, deltat);
+        memcpy(quaterValues, self->state.q, sizeof(quaterValues));
+    }
+    Py_END_ALLOW_THREADS
+
+    return Py_BuildValue("dddd", quaterValues[0], quaterValues[1], quaterValues[2], quaterValues[3]);
+}
+
+static PyObject* Filter_updateBatch(FilterObject* self, PyObject* args)
+{
+    return quaternionBatch(args, &self->state, self->update, self->lock);
+}
+
+static PyObject* Filter_reset(FilterObject* self)
+{
+    Py_BEGIN_ALLOW_THREADS // A batch update may hold the lock for a while
+    {
+        std::lock_guard<std::mutex> guard(*self->lock);
+        resetFilterState(&self->state);
+    }
+    Py_END_ALLOW_THREADS
+    Py_RETURN_NONE;
+}
+
+static PyObject* Filter_getQ(FilterObject* self, void* closure)
+{
+    double quaterValues[4];
+    Py_BEGIN_ALLOW_THREADS
+    {
+        std::lock_guard<std::mutex> guard(*self->lock);
+        memcpy(quaterValues, self->state.q, sizeof(quaterValues));
+    }
+    Py_END_ALLOW_THREADS
+    return Py_BuildValue("dddd", quaterValues[0], quaterValues[1], quaterValues[2], quaterValues[3]);
+}
+
+static PyObject* Filter_getMethod(FilterObject* self, void* closure)
+{
+    return PyUnicode_FromString(self->madgwick ? "madgwick" : "mahony");
+}
+
+// Getter and setter of a gain, the closure is its offset in the state
+static PyObject* Filter_getGain(FilterObject* self, void* closure)
+{
+    double gain;
+    Py_BEGIN_ALLOW_THREADS
+    {
+        std::lock_guard<std::mutex> guard(*self->lock);
+        gain = *(double*)((char*)&self->state + (size_t)closure);
+    }
+    Py_END_ALLOW_THREADS
+    return PyFloat_FromDouble(gain);
+}
+
+static int Filter_setGain(FilterObject* self, PyObject* value, void* closure)
+{
+    if(value == NULL)
+    {
+        PyErr_SetString(PyExc_AttributeError, "The gains cannot be deleted");
+        return -1;
+    }
+    double gain = PyFloat_AsDouble(value);
+    if(gain == -1.0 && PyErr_Occurred())
+        return -1;
+    Py_BEGIN_ALLOW_THREADS
+    {
+        std::lock_guard<std::mutex> guard(*self->lock);
+        *(double*)((char*)&self->state + (size_t)closure) = gain;
+    }
+    Py_END_ALLOW_THREADS
+    return 0;
+}
+
+static PyMethodDef Filter_methods[] =
+{
+    {"update", (PyCFunction)Filter_update, METH_VARARGS,
+        "update(ax, ay, az, gx, gy, gz, mx, my, mz, deltat): Update the filter with a sample, return the quaternion"},
+    {"updateBatch", (PyCFunction)Filter_updateBatch, METH_VARARGS,
+        "updateBatch(samples, dt, out): Update the filter with N samples, same arguments as mahonyQuaternionBatch"},
+    {"reset", (PyCFunction)Filter_reset, METH_NOARGS, "Set the initial quaternion again, keeping the gains"},
+    {NULL, NULL, 0, NULL}
+};
+
+static PyGetSetDef Filter_getset[] =
+{
+    {(char*)"q", (getter)Filter_getQ, NULL, (char*)"The current quaternion", NULL},
+    {(char*)"method", (getter)Filter_getMethod, NULL, (char*)"'mahony' or 'madgwick'", NULL},
+    {(char*)"kp", (getter)Filter_getGain, (setter)Filter_setGain, (char*)"Proportional gain of Mahony's method",
+        (void*)offsetof(FilterState, Kp)},
+    {(char*)"ki", (getter)Filter_getGain, (setter)Filter_setGain, (char*)"Integral gain of Mahony's method",
+        (void*)offsetof(FilterState, Ki)},
+    {(char*)"beta", (getter)Filter_getGain, (setter)Filter_setGain, (char*)"Gain of Madgwick's method",
+        (void*)offsetof(FilterState, beta)},
+    {(char*)"zeta", (getter)Filter_getGain, (setter)Filter_setGain, (char*)"Gyroscope drift gain of Madgwick's method",
+        (void*)offsetof(FilterState, zeta)},
+    {NULL, NULL, NULL, NULL, NULL}
+};
+
+static PyTypeObject FilterType = {PyVarObject_HEAD_INIT(NULL, 0) "quaternion.Filter"};
+
 static PyMethodDef quaternion_methods[] = 
 {
     // "PythonName" C-function Name, argument presentation, description
     //METH_VARARGS is always there
     {"mahonyQuaternion", quaternion_mahonyQuaternion, METH_VARARGS, "Calculate the quternion using Mahony's method"},
     {"madgwickQuaternion", quaternion_madgwickQuaternion, METH_VARARGS, "Calculate the quternion using Madgwick's method"},
+    {"mahonyQuaternionBatch", quaternion_mahonyQuaternionBatch, METH_VARARGS,
+        "mahonyQuaternionBatch(samples, dt, out): Run Mahony's method over N samples\n"
+        "samples is an N x 9 array of doubles (ax, ay, az, gx, gy, gz, mx, my, mz), dt an array of N intervals or a "
+        "single interval, and the N x 4 array out receives the quaternion after each sample. The gyroscope values "
+        "are in rad/s\n"
+        "A SampleBuffer of the mpu9250 module cannot be passed as it is: it is N x 11, with the timestamp first and "
+        "the temperature last, and its gyroscope values are in degrees/s. Take columns 1 to 9 and convert the "
+        "gyroscope ones, like mpu9250.getData does"},
+    {"madgwickQuaternionBatch", quaternion_madgwickQuaternionBatch, METH_VARARGS,
+        "madgwickQuaternionBatch(samples, dt, out): Run Madgwick's method over N samples, same arguments as "
+        "mahonyQuaternionBatch"},
     {NULL, NULL, 0, NULL} //Sentinel, tell the API that we finished defining table
 };
 
@@ -74,5 +384,28 @@ static struct PyModuleDef quatModule =
 // A reference is created
 PyMODINIT_FUNC PyInit_quaternion(void)
 {
-    return PyModule_Create(&quatModule);
+    FilterType.tp_basicsize = sizeof(FilterObject);
+    FilterType.tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE;
+    FilterType.tp_doc = "Filter(method='mahony', kp=10.0, ki=0.0, beta=..., zeta=0.0)\n"
+                        "An orientation filter with its own state and gains. The updates release the GIL, so "
+                        "filters can run in parallel from several threads.";
+    FilterType.tp_new = Filter_new;
+    FilterType.tp_init = (initproc)Filter_init;
+    FilterType.tp_dealloc = (destructor)Filter_dealloc;
+    FilterType.tp_methods = Filter_methods;
+    FilterType.tp_getset = Filter_getset;
+    if(PyType_Ready(&FilterType) < 0)
+        return NULL;
+
+    PyObject* module = PyModule_Create(&quatModule);
+    if(module == NULL)
+        return NULL;
+
+    Py_INCREF(&FilterType);
+    PyModule_AddObject(module, "Filter", (PyObject*)&FilterType);
+
+    quatmodError = PyErr_NewException("quaternion.error", PyExc_ValueError, NULL);
+    Py_INCREF(quatmodError);
+    PyModule_AddObject(module, "error", quatmodError);
+    return module;
 }
@@ -0,0 +1,309 @@
+"""Pure Python implementation of the Madgwick and Mahony orientation filters
+
+It follows the C code of the ``quaternion`` extension operation by operation, so both give the same results to the
+last bit, and the filters can be tested and profiled without building the extension. The constants are computed as
+the C code computes them, including its single precision literals.
+
+:class:`QuaternionFilter` is one filter, updated one sample at a time. :class:`FilterArray` runs many independent
+filters at once, one per row of NumPy arrays, for example one per sensor or one per recording being replayed.
+"""
+
+import math
+import struct
+
+
+def _float32(value: float):
+    """Round to single precision, like a ``float`` literal or expression of the C code"""
+    return struct.unpack('f', struct.pack('f', value))[0]
+
+
+def _reciprocal(value: float):
+    """``1.0 / value``, giving infinity for zero as the C code does instead of raising"""
+    return 1.0 / value if value != 0.0 else math.inf
+
+
+PI = 3.14159265  # The constant of quaternionFilters.h
+_SQRT_3_4 = _float32(math.sqrt(0.75))  # sqrt(3.0f / 4.0f) is computed in single precision
+GYRO_MEAS_ERROR = PI * _float32(40.0 / 180.0)  # Gyroscope measurement error in rad/s
+GYRO_MEAS_DRIFT = PI * _float32(0.0 / 180.0)  # Gyroscope measurement drift in rad/s/s
+DEFAULT_BETA = _SQRT_3_4 * GYRO_MEAS_ERROR  # Gain of the Madgwick method
+DEFAULT_ZETA = _SQRT_3_4 * GYRO_MEAS_DRIFT  # Gyroscope drift gain of the Madgwick method, not used yet
+DEFAULT_KP = 2.0 * 5.0  # Proportional gain of the Mahony method
+DEFAULT_KI = 0.0  # Integral gain of the Mahony method
+
+METHODS = ("mahony", "madgwick")
+
+
+def _madgwick_step(q, ax, ay, az, gx, gy, gz, mx, my, mz, deltat, beta, sqrt, reciprocal):
+    """One Madgwick update with normalised measurements, on numbers or on arrays
+
+    Returns:
+        tuple: The new quaternion
+    """
+    q1, q2, q3, q4 = q
+
+    # Auxiliary variables to avoid repeated arithmetic
+    _2q1 = 2.0 * q1
+    _2q2 = 2.0 * q2
+    _2q3 = 2.0 * q3
+    _2q4 = 2.0 * q4
+    _2q1q3 = 2.0 * q1 * q3
+    _2q3q4 = 2.0 * q3 * q4
+    q1q1 = q1 * q1
+    q1q2 = q1 * q2
+    q1q3 = q1 * q3
+    q1q4 = q1 * q4
+    q2q2 = q2 * q2
+    q2q3 = q2 * q3
+    q2q4 = q2 * q4
+    q3q3 = q3 * q3
+    q3q4 = q3 * q4
+    q4q4 = q4 * q4
+
+    # Reference direction of Earth's magnetic field
+    _2q1mx = 2.0 * q1 * mx
+    _2q1my = 2.0 * q1 * my
+    _2q1mz = 2.0 * q1 * mz
+    _2q2mx = 2.0 * q2 * mx
+    hx = mx * q1q1 - _2q1my * q4 + _2q1mz * q3 + mx * q2q2 + _2q2 * my * q3 + \
+        _2q2 * mz * q4 - mx * q3q3 - mx * q4q4
+    hy = _2q1mx * q4 + my * q1q1 - _2q1mz * q2 + _2q2mx * q3 - my * q2q2 + my * q3q3 + _2q3 * mz * q4 - my * q4q4
+    _2bx = sqrt(hx * hx + hy * hy)
+    _2bz = -_2q1mx * q3 + _2q1my * q2 + mz * q1q1 + _2q2mx * q4 - mz * q2q2 + _2q3 * my * q4 - mz * q3q3 + mz * q4q4
+    _4bx = 2.0 * _2bx
+    _4bz = 2.0 * _2bz
+
+    # Gradient decent algorithm corrective step
+    s1 = -_2q3 * (2.0 * q2q4 - _2q1q3 - ax) + _2q2 * (2.0 * q1q2 + _2q3q4 - ay) - _2bz * q3 * (
+        _2bx * (0.5 - q3q3 - q4q4) + _2bz * (q2q4 - q1q3) - mx) + (-_2bx * q4 + _2bz * q2) * (
+        _2bx * (q2q3 - q1q4) + _2bz * (q1q2 + q3q4) - my) + _2bx * q3 * (
+        _2bx * (q1q3 + q2q4) + _2bz * (0.5 - q2q2 - q3q3) - mz)
+    s2 = _2q4 * (2.0 * q2q4 - _2q1q3 - ax) + _2q1 * (2.0 * q1q2 + _2q3q4 - ay) - 4.0 * q2 * (
+        1.0 - 2.0 * q2q2 - 2.0 * q3q3 - az) + _2bz * q4 * (_2bx * (0.5 - q3q3 - q4q4) + _2bz * (q2q4 - q1q3) - mx) + (
+        _2bx * q3 + _2bz * q1) * (_2bx * (q2q3 - q1q4) + _2bz * (q1q2 + q3q4) - my) + (_2bx * q4 - _4bz * q2) * (
+        _2bx * (q1q3 + q2q4) + _2bz * (0.5 - q2q2 - q3q3) - mz)
+    s3 = -_2q1 * (2.0 * q2q4 - _2q1q3 - ax) + _2q4 * (2.0 * q1q2 + _2q3q4 - ay) - 4.0 * q3 * (
+        1.0 - 2.0 * q2q2 - 2.0 * q3q3 - az) + (-_4bx * q3 - _2bz * q1) * (
+        _2bx * (0.5 - q3q3 - q4q4) + _2bz * (q2q4 - q1q3) - mx) + (_2bx * q2 + _2bz * q4) * (
+        _2bx * (q2q3 - q1q4) + _2bz * (q1q2 + q3q4) - my) + (_2bx * q1 - _4bz * q3) * (
+        _2bx * (q1q3 + q2q4) + _2bz * (0.5 - q2q2 - q3q3) - mz)
+    s4 = _2q2 * (2.0 * q2q4 - _2q1q3 - ax) + _2q3 * (2.0 * q1q2 + _2q3q4 - ay) + (-_4bx * q4 + _2bz * q2) * (
+        _2bx * (0.5 - q3q3 - q4q4) + _2bz * (q2q4 - q1q3) - mx) + (-_2bx * q1 + _2bz * q3) * (
+        _2bx * (q2q3 - q1q4) + _2bz * (q1q2 + q3q4) - my) + _2bx * q2 * (
+        _2bx * (q1q3 + q2q4) + _2bz * (0.5 - q2q2 - q3q3) - mz)
+    norm = reciprocal(sqrt(s1 * s1 + s2 * s2 + s3 * s3 + s4 * s4))  # Normalise step magnitude
+    s1 = s1 * norm
+    s2 = s2 * norm
+    s3 = s3 * norm
+    s4 = s4 * norm
+
+    # Compute rate of change of quaternion
+    q_dot1 = 0.5 * (-q2 * gx - q3 * gy - q4 * gz) - beta * s1
+    q_dot2 = 0.5 * (q1 * gx + q3 * gz - q4 * gy) - beta * s2
+    q_dot3 = 0.5 * (q1 * gy - q2 * gz + q4 * gx) - beta * s3
+    q_dot4 = 0.5 * (q1 * gz + q2 * gy - q3 * gx) - beta * s4
+
+    # Integrate to yield quaternion
+    q1 = q1 + q_dot1 * deltat
+    q2 = q2 + q_dot2 * deltat
+    q3 = q3 + q_dot3 * deltat
+    q4 = q4 + q_dot4 * deltat
+    norm = reciprocal(sqrt(q1 * q1 + q2 * q2 + q3 * q3 + q4 * q4))  # Normalise quaternion
+    return q1 * norm, q2 * norm, q3 * norm, q4 * norm
+
+
+def _mahony_step(q, e_int, ax, ay, az, gx, gy, gz, mx, my, mz, deltat, kp, ki, sqrt, reciprocal):
+    """One Mahony update with normalised measurements, on numbers or on arrays
+
+    Returns:
+        tuple: The new quaternion and the new integral error
+    """
+    q1, q2, q3, q4 = q
+
+    # Auxiliary variables to avoid repeated arithmetic
+    q1q1 = q1 * q1
+    q1q2 = q1 * q2
+    q1q3 = q1 * q3
+    q1q4 = q1 * q4
+    q2q2 = q2 * q2
+    q2q3 = q2 * q3
+    q2q4 = q2 * q4
+    q3q3 = q3 * q3
+    q3q4 = q3 * q4
+    q4q4 = q4 * q4
+
+    # Reference direction of Earth's magnetic field
+    hx = 2.0 * mx * (0.5 - q3q3 - q4q4) + 2.0 * my * (q2q3 - q1q4) + 2.0 * mz * (q2q4 + q1q3)
+    hy = 2.0 * mx * (q2q3 + q1q4) + 2.0 * my * (0.5 - q2q2 - q4q4) + 2.0 * mz * (q3q4 - q1q2)
+    bx = sqrt((hx * hx) + (hy * hy))
+    bz = 2.0 * mx * (q2q4 - q1q3) + 2.0 * my * (q3q4 + q1q2) + 2.0 * mz * (0.5 - q2q2 - q3q3)
+
+    # Estimated direction of gravity and magnetic field
+    vx = 2.0 * (q2q4 - q1q3)
+    vy = 2.0 * (q1q2 + q3q4)
+    vz = q1q1 - q2q2 - q3q3 + q4q4
+    wx = 2.0 * bx * (0.5 - q3q3 - q4q4) + 2.0 * bz * (q2q4 - q1q3)
+    wy = 2.0 * bx * (q2q3 - q1q4) + 2.0 * bz * (q1q2 + q3q4)
+    wz = 2.0 * bx * (q1q3 + q2q4) + 2.0 * bz * (0.5 - q2q2 - q3q3)
+
+    # Error is cross product between estimated direction and measured direction of gravity
+    ex = (ay * vz - az * vy) + (my * wz - mz * wy)
+    ey = (az * vx - ax * vz) + (mz * wx - mx * wz)
+    ez = (ax * vy - ay * vx) + (mx * wy - my * wx)
+    if ki > 0.0:
+        e_int = (e_int[0] + ex, e_int[1] + ey, e_int[2] + ez)  # Accumulate integral error
+    else:
+        e_int = (0.0, 0.0, 0.0)  # Prevent integral wind up
+
+    # Apply feedback terms
+    gx = gx + kp * ex + ki * e_int[0]
+    gy = gy + kp * ey + ki * e_int[1]
+    gz = gz + kp * ez + ki * e_int[2]
+
+    # Integrate rate of change of quaternion
+    pa = q2
+    pb = q3
+    pc = q4
+    q1 = q1 + (-q2 * gx - q3 * gy - q4 * gz) * (0.5 * deltat)
+    q2 = pa + (q1 * gx + pb * gz - pc * gy) * (0.5 * deltat)
+    q3 = pb + (q1 * gy - pa * gz + pc * gx) * (0.5 * deltat)
+    q4 = pc + (q1 * gz + pa * gy - pb * gx) * (0.5 * deltat)
+
+    # Normalise quaternion
+    norm = reciprocal(sqrt(q1 * q1 + q2 * q2 + q3 * q3 + q4 * q4))
+    return (q1 * norm, q2 * norm, q3 * norm, q4 * norm), e_int
+
+
+def _check_method(method: str):
+    if method not in METHODS:
+        raise ValueError("Unknown filter method '%s', expected 'mahony' or 'madgwick'" % method)
+
+
+class QuaternionFilter:
+    """One orientation filter, the Python equivalent of ``quaternion.Filter``"""
+
+    def __init__(self, method: str = "mahony", kp: float = DEFAULT_KP, ki: float = DEFAULT_KI,
+                 beta: float = DEFAULT_BETA, zeta: float = DEFAULT_ZETA):
+        _check_method(method)
+        self.method = method
+        self.kp = kp
+        self.ki = ki
+        self.beta = beta
+        self.zeta = zeta
+        self.reset()
+
+    def reset(self):
+        """Set the initial quaternion and clear the integral error, keeping the gains"""
+        self.q = (1.0, 0.0, 0.0, 0.0)
+        self.e_int = (0.0, 0.0, 0.0)
+
+    def update(self, ax, ay, az, gx, gy, gz, mx, my, mz, deltat):
+        """Update the filter with a sample
+
+        Args:
+            ax, ay, az: Acceleration, in any unit
+            gx, gy, gz: Angular rate in rad/s
+            mx, my, mz: Magnetic field, in any unit
+            deltat: Seconds since the previous sample
+
+        Returns:
+            tuple: The quaternion
+        """
+        norm = math.sqrt(ax * ax + ay * ay + az * az)
+        if norm == 0.0:
+            return self.q  # Handle NaN
+        norm = 1.0 / norm
+        ax, ay, az = ax * norm, ay * norm, az * norm
+
+        norm = math.sqrt(mx * mx + my * my + mz * mz)
+        if norm == 0.0:
+            return self.q  # Handle NaN
+        norm = 1.0 / norm
+        mx, my, mz = mx * norm, my * norm, mz * norm
+
+        if self.method == "madgwick":
+            self.q = _madgwick_step(self.q, ax, ay, az, gx, gy, gz, mx, my, mz, deltat, self.beta, math.sqrt,
+                                    _reciprocal)
+        else:
+            self.q, self.e_int = _mahony_step(self.q, self.e_int, ax, ay, az, gx, gy, gz, mx, my, mz, deltat,
+                                              self.kp, self.ki, math.sqrt, _reciprocal)
+        return self.q
+
+    def update_batch(self, samples, dt, out=None):
+        """Update the filter with many samples, like ``quaternion.Filter.updateBatch``
+
+        Args:
+            samples: Sequence of N samples of 9 values: ax, ay, az, gx, gy, gz, mx, my, mz
+            dt: Sequence of N intervals in seconds, or a single interval for all of them
+            out: N x 4 array receiving the quaternion after each sample, or None for a new list
+
+        Returns:
+            The array of quaternions
+        """
+        if out is None:
+            out = [None] * len(samples)
+        intervals = dt if hasattr(dt, '__len__') else [dt] * len(samples)
+        for index, (sample, deltat) in enumerate(zip(samples, intervals)):
+            out[index] = self.update(*sample, deltat)
+        return out
+
+
+class FilterArray:
+    """Many independent orientation filters with the same method and gains, updated together with NumPy
+
+    Row ``i`` of every array belongs to filter ``i``. The results are the same as those of a
+    :class:`QuaternionFilter` per row.
+    """
+
+    def __init__(self, count: int, method: str = "mahony", kp: float = DEFAULT_KP, ki: float = DEFAULT_KI,
+                 beta: float = DEFAULT_BETA, zeta: float = DEFAULT_ZETA):
+        import numpy  # Only needed for the filter arrays
+        self._np = numpy
+        _check_method(method)
+        self.count = count
+        self.method = method
+        self.kp = kp
+        self.ki = ki
+        self.beta = beta
+        self.zeta = zeta
+        self.reset()
+
+    def reset(self):
+        np = self._np
+        self.q = np.zeros((self.count, 4))
+        self.q[:, 0] = 1.0
+        self.e_int = np.zeros((self.count, 3))
+
+    def update(self, samples, deltat):
+        """Update every filter with its sample
+
+        Args:
+            samples: Array of shape (count, 9), a sample per filter
+            deltat: Seconds since the previous sample, an array of one interval per filter or a single one
+
+        Returns:
+            numpy.ndarray: The quaternions, of shape (count, 4)
+        """
+        np = self._np
+        samples = np.asarray(samples, dtype=np.float64)
+        ax, ay, az, gx, gy, gz, mx, my, mz = samples.T
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            a_norm = np.sqrt(ax * ax + ay * ay + az * az)
+            m_norm = np.sqrt(mx * mx + my * my + mz * mz)
+            valid = (a_norm != 0.0) & (m_norm != 0.0)  # The other filters are left as they are
+            norm = 1.0 / a_norm
+            ax, ay, az = ax * norm, ay * norm, az * norm
+            norm = 1.0 / m_norm
+            mx, my, mz = mx * norm, my * norm, mz * norm
+
+            if self.method == "madgwick":
+                q = _madgwick_step(self.q.T, ax, ay, az, gx, gy, gz, mx, my, mz, deltat, self.beta, np.sqrt,
+                                   np.reciprocal)
+            else:
+                q, e_int = _mahony_step(self.q.T, self.e_int.T, ax, ay, az, gx, gy, gz, mx, my, mz, deltat,
+                                        self.kp, self.ki, np.sqrt, np.reciprocal)
+                e_int = np.stack([np.broadcast_to(value, (self.count,)) for value in e_int], axis=1)
+                self.e_int = np.where(valid[:, None], e_int, self.e_int)
+        self.q = np.where(valid[:, None], np.stack(q, axis=1), self.q)
+        return self.q
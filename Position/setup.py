@@ -1,11 +1,17 @@
-from distutils.core import setup, Extension
+try:
+    from setuptools import setup, Extension
+except ImportError:  # Older installations without setuptools
+    from distutils.core import setup, Extension
 
 quaternion_module = Extension('quaternion',
                               sources=['Quaternion/quaternionModule.cpp', 'Quaternion/quaternionFilters.cpp'],
                               extra_compile_args=['-std=c++11'])
 mpu_module = Extension('mpu9250',
-                       sources=['MPU9250/MPU9250module.cpp', 'MPU9250/MPU9250.cpp', 'Quaternion/quaternionFilters.cpp'],
-                       extra_compile_args=['-std=c++11'])
+                       sources=['MPU9250/MPU9250module.cpp', 'MPU9250/MPU9250.cpp', 'MPU9250/I2CBus.cpp',
+                                'MPU9250/ReplayBus.cpp', 'MPU9250/Sampler.cpp', 'MPU9250/FifoStream.cpp',
+                                'Quaternion/quaternionFilters.cpp'],
+                       extra_compile_args=['-std=c++11', '-pthread'],
+                       extra_link_args=['-pthread'])
 
 setup(name='Quaternion',
       version='1.0',
@@ -0,0 +1,72 @@
+import pytest
+from Core.Networking import BinaryProtocol
+from Core.Networking.BinaryProtocol import HEADER, MAX_PAYLOAD, TEXT, FrameDecoder
+
+
+def test_request_frame_is_decoded_to_the_ascii_tokens():
+    frame = BinaryProtocol.encode("TRNST", 1.5, -2.25)
+    assert len(frame) == HEADER.size + 16
+    assert FrameDecoder().feed(frame) == [("TRNST", ["TRNST", "RA", 1.5, "DEC", -2.25])]
+
+
+def test_request_without_fields_has_an_empty_payload():
+    frame = BinaryProtocol.encode("STOP")
+    assert frame == HEADER.pack(0, 0x05)
+    assert FrameDecoder().feed(frame) == [("STOP", ["STOP"])]
+
+
+def test_frame_fed_byte_by_byte():
+    frame = BinaryProtocol.encode("MANCONT_MOVE", 100.0, 5, -5)
+    decoder = FrameDecoder()
+    for byte in frame[:-1]:
+        assert decoder.feed(bytes([byte])) == []
+    assert decoder.feed(frame[-1:]) == [("MANCONT_MOVE", ["MANCONT", "MOVE", 100.0, 5, -5])]
+
+
+def test_several_frames_in_one_read_and_one_split_across_reads():
+    frames = BinaryProtocol.encode("Test") + BinaryProtocol.encode_text("SCALE") + BinaryProtocol.encode("TRNST", 1, 2)
+    decoder = FrameDecoder()
+    assert decoder.feed(frames[:-3]) == [("Test", ["Test"]), ("SCALE", None)]
+    assert decoder.feed(frames[-3:]) == [("TRNST", ["TRNST", "RA", 1.0, "DEC", 2.0])]
+
+
+def test_partial_header_waits_for_the_rest():
+    frame = BinaryProtocol.encode_text("Test")
+    decoder = FrameDecoder()
+    assert decoder.feed(frame[:1]) == []
+    assert decoder.feed(frame[1:]) == [("Test", None)]
+
+
+def test_text_frame_drops_the_new_line():
+    assert BinaryProtocol.encode_text("OK\n") == HEADER.pack(2, TEXT) + b"OK"
+
+
+def test_text_longer_than_the_length_field_is_cut():
+    frame = BinaryProtocol.encode_text("A" * (MAX_PAYLOAD + 10))
+    assert HEADER.unpack_from(frame) == (MAX_PAYLOAD, TEXT)
+    assert len(frame) == HEADER.size + MAX_PAYLOAD
+    assert FrameDecoder().feed(frame) == [("A" * MAX_PAYLOAD, None)]
+
+
+@pytest.mark.parametrize("bad_frame", [
+    HEADER.pack(4, 0x10) + b"\x00" * 4,  # TRNST with a payload of the wrong size
+    HEADER.pack(1, 0x7F) + b"\x00",  # Unknown type code
+    HEADER.pack(0, 0x43),  # A response type, never a request
+    HEADER.pack(2, TEXT) + b"\xff\xfe",  # Text that is not UTF-8
+])
+def test_invalid_frames_are_dropped_without_losing_the_framing(bad_frame):
+    decoder = FrameDecoder()
+    assert decoder.feed(bad_frame + BinaryProtocol.encode("STOP")) == [("STOP", ["STOP"])]
+
+
+def test_response_messages_have_no_request_tokens():
+    assert BinaryProtocol.format_ascii("STEPS-FROM-HOME", 10, -20) == "STEPS-FROM-HOME_10_-20\n"
+    frame = BinaryProtocol.encode("STEPS-FROM-HOME", 10, -20)
+    assert HEADER.unpack_from(frame) == (16, 0x42)
+
+
+def test_type_codes_and_names_are_unique():
+    codes = [code for code, *_ in BinaryProtocol._TABLE]
+    names = [name for _, name, *_ in BinaryProtocol._TABLE]
+    assert len(set(codes)) == len(codes) and TEXT not in codes
+    assert len(set(names)) == len(names)
@@ -0,0 +1,105 @@
+import re
+import pytest
+from Core.Handlers import CommandRegistry
+from Core.Handlers.CommandRegistry import NUMBER, INTEGER, UNKNOWN_RESPONSE
+
+
+@pytest.mark.parametrize("text", ["0", "-1", "+25", "3.", ".5", "-0.25", "1e3", "2.5E-3", "+.5e+2"])
+def test_number_accepts_decimal_numbers(text):
+    assert re.fullmatch(NUMBER, text)
+    float(text)  # Everything the pattern accepts converts
+
+
+@pytest.mark.parametrize("text", ["", ".", "-", "1.2.3", "1e", "e3", "0x10", "nan", "inf", "1_000", " 1"])
+def test_number_rejects_everything_else(text):
+    assert re.fullmatch(NUMBER, text) is None
+
+
+def test_integer_rejects_fractions():
+    assert re.fullmatch(INTEGER, "-12")
+    assert re.fullmatch(INTEGER, "1.5") is None
+
+
+@pytest.fixture
+def registry():
+    commands = CommandRegistry.CommandRegistry()
+    commands.calls = []
+
+    def record(*args):
+        commands.calls.append(args)
+        return "OK\n"
+
+    commands.register("STOP", record)
+    commands.register("MAGCAL", record, r'MAGCAL_%s' % NUMBER, ((1, float),))
+    commands.register("MAGCAL_STATUS", lambda: "STATUS\n")
+    commands.register("MANCONT", record, r'MANCONT_(MOVRA|MOVDEC|MOVE)_%s_%s_%s' % (NUMBER, INTEGER, INTEGER),
+                      ((1, str), (2, float), (3, int), (4, int)))
+    commands.register("TRNST", record, *CommandRegistry.labelled_fields("TRNST", 2))
+    commands.register("SKY-SCAN-MAP", record, schema=None)
+    commands.register("FAIL", lambda: 1 / 0)
+    return commands
+
+
+def test_arguments_are_converted_by_the_schema(registry):
+    assert registry.dispatch("MAGCAL_30") == "OK\n"
+    assert registry.dispatch("MANCONT_MOVDEC_-1.5e2_10_-3") == "OK\n"
+    assert registry.calls == [(30.0,), ("MOVDEC", -150.0, 10, -3)]
+
+
+@pytest.mark.parametrize("request_text", ["MAGCAL_abc", "MAGCAL_", "MAGCAL_30_60", "MAGCAL_30 ", "MANCONT_MOVUP_1_2_3",
+                                          "MANCONT_MOVE_1_2.5_3"])
+def test_requests_not_matching_the_pattern_are_malformed(registry, request_text):
+    command = request_text.partition("_")[0]
+    assert registry.dispatch(request_text) == "ERROR_MALFORMED_%s\n" % command
+    assert registry.calls == []
+    assert registry.stats[command].errors == 1
+
+
+def test_full_name_is_looked_up_before_the_prefix(registry):
+    assert registry.dispatch("MAGCAL_STATUS") == "STATUS\n"
+    assert registry.calls == []
+
+
+def test_command_without_pattern_must_match_exactly(registry):
+    assert registry.dispatch("STOP") == "OK\n"
+    assert registry.dispatch("STOP_NOW") == "ERROR_MALFORMED_STOP\n"
+    assert registry.calls == [()]
+
+
+def test_unknown_requests(registry):
+    assert registry.dispatch("MOVE") == UNKNOWN_RESPONSE
+    assert registry.dispatch("") == UNKNOWN_RESPONSE
+
+
+def test_labels_are_not_checked(registry):
+    assert registry.dispatch("TRNST_RA_1.5_DEC_-2") == "OK\n"
+    assert registry.dispatch("TRNST_X_3_Y_4") == "OK\n"
+    assert registry.dispatch("TRNST_RA_1.5") == "ERROR_MALFORMED_TRNST\n"
+    assert registry.calls == [(1.5, -2.0), (3.0, 4.0)]
+
+
+def test_without_schema_the_handler_gets_the_tokens(registry):
+    registry.dispatch("SKY-SCAN-MAP_1_2_3")
+    registry.dispatch("SKY-SCAN-MAP", ["SKY-SCAN-MAP", 1.0])
+    assert registry.calls == [(["SKY-SCAN-MAP", "1", "2", "3"],), (["SKY-SCAN-MAP", 1.0],)]
+
+
+def test_token_lists_skip_the_pattern(registry):
+    assert registry.dispatch("TRNST", ["TRNST", "RA", 1.0, "DEC", 2.0]) == "OK\n"
+    assert registry.dispatch("TRNST", ["TRNST", "RA", 1.0, "DEC"]) == "ERROR_MALFORMED_TRNST\n"
+    assert registry.calls == [(1.0, 2.0)]
+
+
+def test_failing_handler_is_reported_and_counted(registry):
+    assert registry.dispatch("FAIL") == "ERROR_FAILED_FAIL\n"
+    stats = registry.stats["FAIL"]
+    assert (stats.calls, stats.errors) == (1, 1)
+
+
+def test_stats_list_only_the_called_commands(registry):
+    registry.dispatch("STOP")
+    registry.dispatch("STOP")
+    fields = registry.format_stats().rstrip("\n").split("_")
+    assert fields[0] == "CMDSTATS"
+    assert fields[1:4] == ["STOP", "2", "0"]
+    assert len(fields) == 6
@@ -0,0 +1,92 @@
+import pytest
+from Core.Handlers import MotionPlanner, StepEngine
+
+PROFILES = (MotionPlanner.TRAPEZOIDAL, MotionPlanner.S_CURVE)
+
+
+def _frequency_ns(velocity):
+    return int(round(1e9 / velocity))
+
+
+@pytest.mark.parametrize("profile", PROFILES)
+def test_zero_steps_give_an_empty_schedule(profile):
+    assert len(MotionPlanner.plan(0, 200.0, 400.0, profile)) == 0
+
+
+@pytest.mark.parametrize("profile", PROFILES)
+@pytest.mark.parametrize("steps", (1, 2, 3, 4, 5))
+def test_very_short_moves_have_one_interval_per_step(profile, steps):
+    intervals = MotionPlanner.plan(steps, 200.0, 400.0, profile)
+    assert len(intervals) == steps
+    assert all(interval > 0 for interval in intervals)
+
+
+@pytest.mark.parametrize("profile", PROFILES)
+def test_single_step_is_done_at_the_maximum_velocity(profile):
+    # No room for a ramp, since the deceleration takes as many steps as the acceleration
+    assert list(MotionPlanner.plan(1, 200.0, 400.0, profile)) == [_frequency_ns(200.0)]
+
+
+@pytest.mark.parametrize("profile", PROFILES)
+@pytest.mark.parametrize("steps", (10, 11))
+def test_triangular_profile_is_symmetric_and_below_the_maximum_velocity(profile, steps):
+    # 10 steps at 400 steps/s^2 cannot reach 1000 steps/s, which needs 1250 steps of ramp
+    intervals = list(MotionPlanner.plan(steps, 1000.0, 400.0, profile))
+    assert len(intervals) == steps
+    assert intervals == intervals[::-1]
+    assert min(intervals) > _frequency_ns(1000.0)
+    # The peak velocity of the ramp is kept in the middle, it does not jump to the maximum velocity
+    assert intervals[steps // 2] == min(intervals)
+
+
+@pytest.mark.parametrize("profile", PROFILES)
+def test_ramps_never_exceed_the_maximum_velocity(profile):
+    intervals = MotionPlanner.plan(1000, 200.0, 400.0, profile)
+    assert len(intervals) == 1000
+    assert min(intervals) >= _frequency_ns(200.0) - 1  # Rounding of the ramp times
+    ramp = intervals[:50]  # 200^2 / (2 * 400) = 50 steps of trapezoidal ramp
+    assert all(earlier >= later for earlier, later in zip(ramp, ramp[1:]))
+    assert list(intervals[-50:]) == list(reversed(ramp))
+
+
+def test_s_curve_starts_slower_than_the_trapezoid():
+    # The acceleration of the S-curve starts at zero, so its first step takes longer
+    trapezoid = MotionPlanner.plan(1000, 200.0, 400.0, MotionPlanner.TRAPEZOIDAL)
+    s_curve = MotionPlanner.plan(1000, 200.0, 400.0, MotionPlanner.S_CURVE)
+    assert s_curve[0] > trapezoid[0]
+    assert sum(s_curve) > sum(trapezoid)
+
+
+def test_s_curve_ramp_times_increase():
+    times = MotionPlanner._s_curve_ramp(200.0, 400.0, 1000)
+    assert times
+    assert all(earlier < later for earlier, later in zip(times, times[1:]))
+
+
+def test_no_acceleration_gives_a_constant_schedule():
+    assert list(MotionPlanner.plan(-5, 100.0, 0.0)) == list(StepEngine.constant_schedule(100.0, 5))
+
+
+def test_invalid_arguments_raise():
+    with pytest.raises(ValueError):
+        MotionPlanner.plan(10, 0.0, 400.0)
+    with pytest.raises(ValueError):
+        MotionPlanner.plan(10, 200.0, 400.0, "linear")
+
+
+def test_line_of_a_single_axis_uses_its_own_limits():
+    limits = (MotionPlanner.AxisLimits(200.0, 400.0), MotionPlanner.AxisLimits(100.0, 100.0))
+    assert list(MotionPlanner.plan_line((500, 0), limits, (300.0, 300.0))) == \
+        list(MotionPlanner.plan(500, 200.0, 400.0))
+
+
+def test_line_is_limited_by_the_minor_axis():
+    # The DEC axis moves half as many steps, so the RA axis can go at most twice its limits
+    limits = (MotionPlanner.AxisLimits(200.0, 400.0), MotionPlanner.AxisLimits(50.0, 100.0))
+    intervals = MotionPlanner.plan_line((-1000, 500), limits, (200.0, 200.0))
+    assert list(intervals) == list(MotionPlanner.plan(1000, 100.0, 200.0))
+
+
+def test_line_without_steps_is_empty():
+    limits = (MotionPlanner.AxisLimits(200.0, 400.0),) * 2
+    assert len(MotionPlanner.plan_line((0, 0), limits, (200.0, 200.0))) == 0
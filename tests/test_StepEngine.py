@@ -0,0 +1,194 @@
+import sys
+import time
+import threading
+import pytest
+from Core.Handlers import StepEngine
+from Core.Handlers.StepEngine import RA_AXIS, DEC_AXIS
+
+INTERVAL_NS = 200000  # Short schedules, so the engine tests run quickly
+
+
+def _fire_all(directions, steps):
+    """Run a line job tick by tick and return the axes stepped on every tick"""
+    major = max(steps)
+    job = StepEngine._LineJob(directions, steps, [INTERVAL_NS] * major, 0)
+    ticks = []
+    for _ in range(major):
+        stepped = []
+        job.fire(lambda axis, direction: stepped.append((axis, direction)))
+        ticks.append(stepped)
+    return job, ticks
+
+
+@pytest.mark.parametrize("steps", [(10, 3), (3, 10), (7, 7), (1000, 1), (1000, 999), (5, 0), (1, 1), (12, 5)])
+def test_line_axes_end_on_the_same_tick(steps):
+    job, ticks = _fire_all((1, -1), steps)
+    counts = [sum(1 for tick in ticks for axis, _ in tick if axis == item) for item in (RA_AXIS, DEC_AXIS)]
+    assert counts == list(steps)
+    # The major axis steps on every tick, and the minor one on the last tick too, if it moves at all
+    assert all(any(axis == job.axis for axis, _ in tick) for tick in ticks)
+    assert (job.minor, (1, -1)[job.minor]) in ticks[-1] or steps[job.minor] == 0
+
+
+def test_line_minor_steps_are_evenly_spread():
+    job, ticks = _fire_all((1, 1), (12, 5))
+    minor_ticks = [index + 1 for index, tick in enumerate(ticks) if (job.minor, 1) in tick]
+    # Minor step j falls on the first tick where j * major <= tick * minor
+    assert minor_ticks == [-(-j * 12 // 5) for j in range(1, 6)]
+
+
+def test_line_major_axis_is_the_one_with_most_steps():
+    assert StepEngine._LineJob((1, 1), (3, 10), [1] * 10, 0).axis == DEC_AXIS
+    assert StepEngine._LineJob((1, 1), (10, 10), [1] * 10, 0).axis == RA_AXIS  # Ties go to RA
+
+
+class _Recorder:
+    """Step and done callbacks of an engine, counting the steps per axis"""
+
+    def __init__(self):
+        self.steps = [0, 0]
+        self.done = []
+        self.finished = threading.Event()
+        self.expected = 0
+
+    def step(self, axis, direction):
+        self.steps[axis] += direction
+
+    def on_done(self, axis):
+        self.done.append(axis)
+        if len(self.done) == self.expected:
+            self.finished.set()
+
+
+@pytest.fixture
+def engine():
+    recorder = _Recorder()
+    stepper = StepEngine.StepEngine(recorder.step, recorder.on_done, switch_interval=None)
+    stepper.recorder = recorder
+    stepper.start()
+    yield stepper
+    stepper.close()
+    stepper.join(1.0)
+
+
+def test_single_axis_jobs_run_independently(engine):
+    engine.recorder.expected = 2
+    engine.add_job(RA_AXIS, 1, StepEngine.constant_schedule(5000.0, 10))
+    engine.add_job(DEC_AXIS, -1, StepEngine.constant_schedule(2000.0, 4))
+    assert engine.recorder.finished.wait(5.0)
+    assert engine.recorder.steps == [10, -4]
+
+
+def test_halt_does_not_report_the_axes_as_done(engine):
+    engine.add_job(RA_AXIS, 1, StepEngine.constant_schedule(100.0, 1000))
+    engine.halt()
+    assert not engine.is_moving(RA_AXIS)
+    time.sleep(0.05)
+    assert engine.recorder.done == []
+
+
+def test_halt_waits_for_the_report_of_a_finished_axis(engine):
+    seen = []  # Axes reported as done when the halt returned
+    halter = threading.Thread(target=lambda: (engine.halt(), seen.append(list(engine.recorder.done))))
+
+    def step(axis, direction):
+        engine.recorder.step(axis, direction)
+        halter.start()  # Halts during the last step, so right before the axis is reported as done
+
+    on_done = engine.recorder.on_done
+    engine._step_callback = step
+    engine._done_callback = lambda axis: (time.sleep(0.02), on_done(axis))  # Leaves time for the halt to come first
+    engine.recorder.expected = 1
+    engine.add_job(RA_AXIS, 1, [INTERVAL_NS])
+    assert engine.recorder.finished.wait(5.0)
+    halter.join(5.0)
+    assert seen == [[RA_AXIS]]
+
+
+def test_done_callback_may_halt(engine):
+    engine.recorder.expected = 1
+    on_done = engine.recorder.on_done
+    engine._done_callback = lambda axis: (engine.halt(), on_done(axis))
+    engine.add_job(RA_AXIS, 1, StepEngine.constant_schedule(5000.0, 2))
+    engine.add_job(DEC_AXIS, 1, StepEngine.constant_schedule(1.0, 1000))
+    assert engine.recorder.finished.wait(5.0)
+    assert not engine.is_moving(DEC_AXIS)
+    assert engine.recorder.done == [RA_AXIS]
+
+
+def test_replaced_job_continues_from_the_new_schedule(engine):
+    engine.recorder.expected = 1
+    engine.add_job(RA_AXIS, 1, StepEngine.constant_schedule(1.0, 1000))  # First step only after a second
+    engine.add_job(RA_AXIS, -1, StepEngine.constant_schedule(5000.0, 3))
+    assert engine.recorder.finished.wait(5.0)
+    assert engine.recorder.steps == [-3, 0]
+    assert engine.recorder.done == [RA_AXIS]
+
+
+def test_switch_interval_is_lowered_only_while_moving():
+    default = sys.getswitchinterval()
+    recorder = _Recorder()
+    recorder.expected = 1
+    stepper = StepEngine.StepEngine(recorder.step, recorder.on_done, switch_interval=0.0002)
+    stepper.start()
+    try:
+        stepper.add_job(RA_AXIS, 1, StepEngine.constant_schedule(100.0, 10))
+        time.sleep(0.02)
+        assert sys.getswitchinterval() == pytest.approx(0.0002)
+        assert recorder.finished.wait(5.0)
+        time.sleep(0.02)
+        assert sys.getswitchinterval() == pytest.approx(default)
+    finally:
+        stepper.close()
+        sys.setswitchinterval(default)
+
+
+def test_switch_interval_is_kept_for_slow_schedules():
+    default = sys.getswitchinterval()
+    recorder = _Recorder()
+    stepper = StepEngine.StepEngine(recorder.step, recorder.on_done, switch_interval=0.0002)
+    stepper.start()
+    try:
+        stepper.add_job(RA_AXIS, 1, StepEngine.constant_schedule(12.0, 100))  # Tracking rate
+        time.sleep(0.02)
+        assert sys.getswitchinterval() == pytest.approx(default)
+        stepper.add_job(DEC_AXIS, 1, StepEngine.constant_schedule(100.0, 100))
+        time.sleep(0.02)
+        assert sys.getswitchinterval() == pytest.approx(0.0002)
+        stepper.halt()
+        stepper.add_job(RA_AXIS, 1, StepEngine.constant_schedule(12.0, 100))
+        time.sleep(0.02)
+        assert sys.getswitchinterval() == pytest.approx(default)
+    finally:
+        stepper.close()
+        sys.setswitchinterval(default)
+
+
+def test_line_job_finishes_both_axes(engine):
+    engine.recorder.expected = 2
+    engine.add_line_job((-1, 1), (20, 7), [INTERVAL_NS] * 20)
+    assert engine.recorder.finished.wait(5.0)
+    assert engine.recorder.steps == [-20, 7]
+    assert sorted(engine.recorder.done) == [RA_AXIS, DEC_AXIS]
+    assert not engine.is_moving(RA_AXIS) and not engine.is_moving(DEC_AXIS)
+
+
+def test_line_job_needs_one_interval_per_major_step(engine):
+    with pytest.raises(ValueError):
+        engine.add_line_job((1, 1), (20, 7), [INTERVAL_NS] * 19)
+
+
+def test_axis_of_a_line_job_cannot_be_replaced(engine):
+    engine.add_line_job((1, 1), (1000, 10), [10 ** 7] * 1000)
+    with pytest.raises(RuntimeError):
+        engine.add_job(DEC_AXIS, 1, [INTERVAL_NS])
+    assert engine.is_moving(RA_AXIS) and engine.is_moving(DEC_AXIS)
+    engine.halt()
+    assert not engine.is_moving(RA_AXIS) and not engine.is_moving(DEC_AXIS)
+    assert engine.recorder.done == []  # A halt does not report the axes as done
+
+
+def test_constant_schedule_needs_a_positive_frequency():
+    assert list(StepEngine.constant_schedule(1000.0, 3)) == [1000000] * 3
+    with pytest.raises(ValueError):
+        StepEngine.constant_schedule(0.0, 3)
@@ -0,0 +1,142 @@
+import os
+import pytest
+from Core.Configuration import StepJournal as journal_module
+from Core.Configuration.StepJournal import StepJournal, RECORD_SIZE
+
+HEADER_SIZE = journal_module._HEADER.size
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "steps.journal")
+
+
+def _open(path, **kwargs):
+    return StepJournal(path, flush_interval=3600.0, **kwargs)  # Flushed by the tests only
+
+
+def _recovered_state(path):
+    journal = _open(path)
+    state = journal.get()
+    journal.close()
+    return state
+
+
+def _write_states(path, states, **kwargs):
+    journal = _open(path, **kwargs)
+    for state in states:
+        journal.update(*state)
+        journal.flush()
+    journal.close()
+
+
+def test_new_journal_holds_only_the_header(path):
+    journal = _open(path)
+    assert not journal.recovered
+    assert journal.get() == (0, 0, 0)
+    journal.close()
+    assert os.path.getsize(path) == HEADER_SIZE
+
+
+def test_last_state_is_recovered(path):
+    _write_states(path, [(10, -20, 0), (11, -21, 1)])
+    journal = _open(path)
+    assert journal.recovered
+    assert journal.get() == (11, -21, 1)
+    journal.close()
+
+
+def test_unchanged_state_is_not_written(path):
+    journal = _open(path)
+    journal.update(1, 2, 0)
+    journal.flush()
+    journal.flush()
+    journal.close()
+    assert os.path.getsize(path) == HEADER_SIZE + RECORD_SIZE
+
+
+def test_torn_record_is_cut_off(path):
+    _write_states(path, [(1, 2, 0), (3, 4, 1)])
+    with open(path, "ab") as data:
+        data.write(journal_module._RECORD.pack(3, 5, 6, 0)[:7])  # A write interrupted by a power loss
+
+    journal = _open(path)
+    assert journal.get() == (3, 4, 1)
+    assert os.path.getsize(path) == HEADER_SIZE + 2 * RECORD_SIZE
+    journal.update(ra=7)
+    journal.flush()  # Appended right after the last intact record
+    journal.close()
+    assert _recovered_state(path) == (7, 4, 1)
+
+
+def test_corrupted_record_discards_everything_after_it(path):
+    _write_states(path, [(1, 1, 0), (2, 2, 0), (3, 3, 0)])
+    with open(path, "r+b") as data:
+        data.seek(HEADER_SIZE + RECORD_SIZE + 9)  # Inside the RA steps of the second record
+        data.write(b"\xff")
+
+    journal = _open(path)
+    assert journal.recovered
+    assert journal.get() == (1, 1, 0)
+    journal.close()
+    assert os.path.getsize(path) == HEADER_SIZE + RECORD_SIZE
+
+
+def test_first_record_corrupted_recovers_nothing(path):
+    _write_states(path, [(1, 1, 0)])
+    with open(path, "r+b") as data:
+        data.seek(HEADER_SIZE + RECORD_SIZE - 1)  # Last byte of the CRC
+        last = data.read(1)
+        data.seek(-1, os.SEEK_CUR)
+        data.write(bytes([last[0] ^ 0xFF]))
+
+    journal = _open(path)
+    assert not journal.recovered
+    assert journal.get() == (0, 0, 0)
+    journal.close()
+
+
+def test_invalid_file_is_replaced(path):
+    with open(path, "wb") as data:
+        data.write(b"<Steps RA=\"1\"/>")
+    journal = _open(path)
+    assert not journal.recovered
+    journal.close()
+    with open(path, "rb") as data:
+        assert data.read() == journal_module._HEADER.pack(journal_module.JOURNAL_MAGIC, journal_module.JOURNAL_VERSION)
+
+
+def test_compaction_keeps_only_the_latest_state(path):
+    states = [(step, -step, step % 2) for step in range(1, 11)]
+    _write_states(path, states, max_records=4)
+    assert os.path.getsize(path) <= HEADER_SIZE + 4 * RECORD_SIZE
+    assert not os.path.exists(path + ".tmp")
+
+    journal = _open(path, max_records=4)
+    assert journal.get() == states[-1]
+    assert journal._sequence == len(states)  # The sequence continues through the compactions
+    journal.close()
+
+
+def test_compaction_happens_when_the_journal_is_full(path):
+    _write_states(path, [(step, 0, 0) for step in range(1, 4)], max_records=3)
+    assert os.path.getsize(path) == HEADER_SIZE + 3 * RECORD_SIZE
+    _write_states(path, [(4, 0, 0)], max_records=3)
+    assert os.path.getsize(path) == HEADER_SIZE + RECORD_SIZE
+    assert _recovered_state(path) == (4, 0, 0)
+
+
+def test_flush_after_close_does_nothing(path):
+    journal = _open(path)
+    journal.close()
+    journal.update(5, 6, 1)
+    journal.flush()
+    assert os.path.getsize(path) == HEADER_SIZE
+
+
+def test_flush_interval_is_clamped(path):
+    journal = StepJournal(path, flush_interval=0)
+    try:
+        assert journal.flush_interval == journal_module.MIN_FLUSH_INTERVAL
+    finally:
+        journal.close()